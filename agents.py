@@ -2,23 +2,49 @@ import os
 import re
 import json
 import random
-import hdbscan
+import threading
 import numpy as np
 from utils import utils
 from pathlib import Path
 from config import config
 from dotenv import load_dotenv
-from api_clients import get_weather_for_point
-from routing_client import route_between_points
-from langchain.chat_models import init_chat_model
+from api_clients import get_weather_for_points, OPENWEATHER_API_KEY
+from routing_client import route_between_points, routes_between_points, haversine_legs
+from spatial_index import SpatialIndex
+from order_table import OrderTable
+from leg_features import LegFeatureJoiner
+from speed_profiles import get_speed_profiles, city_for_point
+from clustering import get_incremental_clusterer, cluster_cache, cluster_cache_key, label_colors, cluster_labels_large, balance_zones
+from route_solver import order_deliveries, split_deliveries, order_deliveries_tw, has_time_windows, parse_window
 from datetime import datetime, timedelta, timezone
-from models import load_model, train_and_save_model
+from models import load_model, train_and_save_model, per_tree_predictions
+from model_registry import get_registry
+from llm_executor import get_llm_executor, run_sync
 load_dotenv()
 
 
-# llm = init_chat_model(model = os.getenv("GROQ_MODEL_NAME"), model_provider = "groq")
-llm = init_chat_model(model = "openai/gpt-oss-20b", model_provider = "groq")
-# llm = init_chat_model(model = os.getenv("GEMINI_MODEL_NAME"), model_provider = "google_genai")
+_llm = None
+_llm_lock = threading.Lock()
+
+def get_llm():
+    """
+    Process-wide chat model, created on first use so importing the agents does not load langchain
+    or the provider SDK (pages that never call the LLM never pay for it).
+    """
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            from langchain.chat_models import init_chat_model
+            # _llm = init_chat_model(model = os.getenv("GROQ_MODEL_NAME"), model_provider = "groq")
+            _llm = init_chat_model(model = config.LLM_MODEL, model_provider = config.LLM_PROVIDER)
+            # _llm = init_chat_model(model = os.getenv("GEMINI_MODEL_NAME"), model_provider = "google_genai")
+    return _llm
+
+def __getattr__(name):
+    # agents.llm keeps working for code written against the old module-level client
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 class ClusteringAgent:
     def __init__(self, location):
@@ -38,6 +64,8 @@ class ClusteringAgent:
         Returns:
             dict: {cluster_id: [coordinates]} and list of labels for each point.
         """
+        import hdbscan
+
         # Convert coordinates to radians for Haversine metric
         coords_radians = np.radians(np.array(coordinates))
 
@@ -62,7 +90,7 @@ class ClusteringAgent:
         return clusters, cluster_labels
     
 
-    def cluster_delivery_points_hdbscan(self, deliveries, min_cluster_size = 3, eps_km = 5):
+    def cluster_delivery_points_hdbscan(self, deliveries, min_cluster_size = 3, eps_km = 5, incremental = False, balanced = False, use_cache = True):
         """
         Cluster delivery points using HDBSCAN with Haversine distance.
 
@@ -70,6 +98,12 @@ class ClusteringAgent:
             deliveries (list of dict): List of delivery dictionaries, each containing 'lat' and 'lon' keys.
             min_cluster_size (int): Minimum cluster size.
             eps_km (float): Approximate neighborhood size in kilometers (used to set min_samples).
+            incremental (bool): Label only orders not seen before against the location's last fit
+                                (refits when drift crosses config.CLUSTER_REFIT_*); False forces a full refit.
+            balanced (bool): Split zones over config.ZONE_MAX_STOPS orders / config.ZONE_MAX_VOLUME package units
+                             and attach outliers to the nearest zone with room.
+            use_cache (bool): Reuse the labels of an earlier run on the same orders and parameters; False (Re-Cluster)
+                              always clusters again and refreshes the cached result.
 
         Returns:
             tuple:
@@ -77,28 +111,7 @@ class ClusteringAgent:
                 cluster_labels (list): Cluster label for each delivery (in same order as input)
         """
 
-        # --- Extract coordinates ---
-        coordinates = [(d["lat"], d["lon"]) for d in deliveries]
-        coords_radians = np.radians(np.array(coordinates))
-
-        # --- Perform HDBSCAN clustering ---
-        clusterer = hdbscan.HDBSCAN(
-            min_cluster_size=min_cluster_size,
-            min_samples=1,
-            metric="haversine",
-            cluster_selection_epsilon=eps_km / 6371.0,  # Convert km to radians
-        )
-
-        cluster_labels = clusterer.fit_predict(coords_radians)
-
-        # --- Define color palette ---
-        colors_list = ["purple", "orange", "darkblue", "pink", "cadetblue", "gray", "lightgreen"]
-        unique_labels = set(cluster_labels)
-        colors = {
-            label: colors_list[label % len(colors_list)]
-            for label in unique_labels if label != -1
-        }
-        colors[-1] = "black"  # Outlier cluster
+        cluster_labels, colors = self._labels(deliveries, min_cluster_size, eps_km, incremental, balanced, use_cache)
 
         # --- Group full delivery dicts by cluster label ---
         clusters = {}
@@ -112,20 +125,163 @@ class ClusteringAgent:
 
         return clusters, deliveries
 
+    def cluster_table(self, orders, min_cluster_size = 3, eps_km = 5, incremental = False, balanced = False, use_cache = True):
+        """
+        Cluster an order_table.OrderTable in place (its cluster column); same options as cluster_delivery_points_hdbscan.
+        Convert at the UI edge with orders.to_clusters().
+
+        Returns:
+            OrderTable: the same table, labelled
+        """
+        cluster_labels, _ = self._labels(orders, min_cluster_size, eps_km, incremental, balanced, use_cache)
+        return orders.set_labels(cluster_labels)
+
+    def _labels(self, deliveries, min_cluster_size, eps_km, incremental, balanced, use_cache):
+        """
+        Label array and label -> color map for delivery dicts or an OrderTable.
+        """
+        if hasattr(deliveries, "coords"):  # OrderTable
+            coordinates = deliveries.coords()
+            volumes = deliveries.volumes().tolist()
+        else:
+            coordinates = [(d["lat"], d["lon"]) for d in deliveries]
+            volumes = [config.PACKAGE_SIZE_UNITS.get(d.get("package_size", "medium"), 1) for d in deliveries]
+
+        # --- Reuse the result for identical orders and parameters (shared across reruns and sessions) ---
+        zone_bounds = (config.ZONE_MAX_STOPS, config.ZONE_MAX_VOLUME, volumes) if balanced else None
+        cache_key = cluster_cache_key(coordinates, min_cluster_size, eps_km, zone_bounds)
+        result = cluster_cache.get(cache_key) if use_cache else None
+
+        if result is None:
+            # --- Perform HDBSCAN clustering (the fitted model is kept per location for incremental updates) ---
+            if len(deliveries) > config.CLUSTER_LARGE_THRESHOLD:
+                cluster_labels = self.cluster_labels(coordinates, min_cluster_size, eps_km)
+            elif incremental:
+                cluster_labels = get_incremental_clusterer(self.location, min_cluster_size, eps_km).update(deliveries)
+            else:
+                cluster_labels = get_incremental_clusterer(self.location, min_cluster_size, eps_km).fit(deliveries)
+            if balanced:
+                cluster_labels = balance_zones(coordinates, cluster_labels, volumes)
+            cluster_labels.setflags(write = False)  # shared through the cache
+            result = {"labels": cluster_labels, "colors": label_colors(cluster_labels)}
+            cluster_cache.set(cache_key, result)
+
+        return result["labels"], result["colors"]
+
+    def cluster_labels(self, coordinates, min_cluster_size = 3, eps_km = 5):
+        """
+        Large-volume clustering that leaves the input untouched.
+
+        Parameters:
+            coordinates (array-like or list of dict): (lat, lon) pairs, or delivery dicts with 'lat' and 'lon' keys.
+            min_cluster_size (int): Minimum cluster size.
+            eps_km (float): Neighborhood size in kilometers (cluster_selection_epsilon).
+
+        Returns:
+            np.ndarray: int32 cluster label per point (-1 = outlier), in input order
+        """
+        if hasattr(coordinates, "coords"):  # OrderTable
+            coordinates = coordinates.coords()
+        elif len(coordinates) and isinstance(coordinates[0], dict):
+            coordinates = [(d["lat"], d["lon"]) for d in coordinates]
+        return cluster_labels_large(coordinates, min_cluster_size, eps_km)
+
 
 class PlannerAgent:
     """
-    Uses LLM to interpret constraints and produce a prioritized order for deliveries.
+    Produces a visit order for deliveries.
+    method "solver" (default) orders stops with the local TSP heuristic in route_solver;
+    method "llm" uses the LLM to interpret operator constraints.
+    llm / executor: chat model and llm_executor.LLMExecutor to use (default: the shared client and executor)
     """
-    def __init__(self, model="gpt-4o"):
+    def __init__(self, model="gpt-4o", method="solver", llm = None, executor = None):
         self.model = model
+        self.method = method
+        self.llm = llm
+        self.executor = executor
 
-    def prioritize(self, deliveries, operator_instructions = ""):
+    def prioritize(self, deliveries, operator_instructions = "", depot = None):
         """
         deliveries: list of dicts with keys id, priority, address, lat, lon
-        operator_instructions: string with additional constraints
+        operator_instructions: string with additional constraints (used by the "llm" method)
+        depot: (lat, lon) the route starts and ends at, e.g. from utils.assign_nearest_depot_to_clusters
         Returns: ordered list of delivery ids
         """
+        if self.method == "solver":
+            if depot is not None and has_time_windows(deliveries):
+                # respect window_start / window_end delivery slots
+                ordered = [i for route in order_deliveries_tw(deliveries, depot) for i in route]
+            else:
+                ordered = order_deliveries(deliveries, depot)
+            print(f"Solver suggestion: {ordered}")
+            return ordered
+        return self.prioritize_llm(deliveries, operator_instructions)
+
+    def assign_vehicles(self, deliveries, depot, n_vehicles = None, capacity = config.VEHICLE_CAPACITY):
+        """
+        Split a zone's deliveries across vehicles (capacitated VRP) and order each vehicle's stops.
+        deliveries: list of dicts with keys id, lat, lon, package_size
+        depot: (lat, lon) all vehicles start and end at
+        n_vehicles: maximum number of vehicles; None lets the solver pick the fleet size
+        capacity: vehicle capacity in package_size units (config.PACKAGE_SIZE_UNITS)
+        Deliveries with window_start / window_end are routed with the time-window solver.
+        Returns: list of ordered delivery id lists, one per vehicle
+        """
+        if has_time_windows(deliveries):
+            vehicle_orders = order_deliveries_tw(deliveries, depot, n_vehicles = n_vehicles, capacity = capacity)
+        else:
+            vehicle_orders = split_deliveries(deliveries, depot, n_vehicles, capacity)
+        print(f"Solver vehicle split: {vehicle_orders}")
+        return vehicle_orders
+
+    def prioritize_llm(self, deliveries, operator_instructions = "", use_cache = True, deadline_s = None):
+        """
+        deliveries: list of dicts with keys id, priority, address, lat, lon
+        operator_instructions: string with additional constraints
+        use_cache: answer a prompt seen before (same deliveries and instructions) from the LLM response cache
+        deadline_s: give up on the LLM after this long (default config.LLM_CALL_DEADLINE_S)
+        Returns: ordered list of delivery ids suggested by the LLM (priority sort on failure or timeout)
+        """
+        return self.prioritize_llm_batch([(deliveries, operator_instructions)], use_cache = use_cache, deadline_s = deadline_s)[0]
+
+    def prioritize_llm_batch(self, jobs, use_cache = True, deadline_s = None):
+        """
+        Blocking wrapper around prioritize_llm_batch_async.
+        """
+        return run_sync(self.prioritize_llm_batch_async(jobs, use_cache = use_cache, deadline_s = deadline_s))
+
+    async def prioritize_llm_batch_async(self, jobs, use_cache = True, deadline_s = None):
+        """
+        LLM ordering for several zones at once: the prompts run concurrently through llm_executor (provider
+        rate limits, per-call deadline), so one slow reply no longer holds up the others.
+        jobs: list of (deliveries, operator_instructions), e.g. one per zone
+        Returns: list of ordered id lists in job order; a job whose call fails, times out or cannot get quota
+        before its deadline gets the priority sort
+        """
+        try:
+            llm = self.llm or get_llm()
+        except Exception as e:
+            print(f"LLM unavailable: {e}")
+            return [self._priority_sort(deliveries) for deliveries, _ in jobs]
+        prompts = [[{"role":"user","content":self._llm_prompt(deliveries, instructions)}] for deliveries, instructions in jobs]
+        print(f"Invoking LLM for {len(prompts)} prompt(s)")
+        executor = self.executor or get_llm_executor()
+        results = await executor.invoke_all_async(llm, prompts, deadline_s = deadline_s, use_cache = use_cache)
+        orders = []
+        for (deliveries, _), result in zip(jobs, results):
+            if result["text"] is None:
+                print(f"LLM call {result['status']} after {result['elapsed_s']}s")
+                orders.append(self._priority_sort(deliveries))
+                continue
+            try:
+                orders.append(self._parse_llm_order(result["text"]))
+            except Exception as e:
+                print(str(e))
+                orders.append(self._priority_sort(deliveries))
+        return orders
+
+    @staticmethod
+    def _llm_prompt(deliveries, operator_instructions):
         # Build a short prompt with deliveries summary
         # prompt = "You are an operations planner. Rank deliveries with ids and reasons based on priority, location proximity and operator instructions.\n"
         prompt = "You are an operations planner. Rank deliveries based on location proximity and operator instructions. Provide the shortest route possible.\n"
@@ -134,84 +290,192 @@ class PlannerAgent:
             # prompt += f"- id:{d['id']}, priority:{d.get('priority','medium')}, lat:{d['lat']}, lon:{d['lon']}, package_size:{d.get('package_size','medium')}\n"
             prompt += f"- id:{d['id']}, lat:{d['lat']}, lon:{d['lon']}, package_size:{d.get('package_size','medium')}\n"
         prompt += "\nReturn a JSON array of ids in optimized visit order."
-        try:
-            print("Invoking LLM")
-            resp = llm.invoke([{"role":"user","content":prompt}])
-            print(f"Response Generated: {str(resp.content)}")
-            text = str(resp.content).strip()
-            # text = str(resp["content"]).strip()
-            # attempt to parse json out of text
-            m = re.search(r'(\[.*\])', text, re.S)
-            if m:
-                print("creating ordered json")
-                ordered = json.loads(m.group(1))
-                print("Completed ordering")
-            else:
-                # fallback: split by common separators
-                print("Fallback: split by common separators")
-                ordered = [tok.strip().strip('"').strip("'") for tok in re.split(r'[,\\n]+', text) if tok.strip()]
-                print("Completed ordering")
-            print(f"LLM ({os.getenv('GROQ_MODEL_NAME')}) suggestion: {ordered}")
-            return ordered
-        except Exception as e:
-            # fallback: simple sort by priority mapping and id
-            print(str(e))
-            priority_map = {"high": 0, "medium": 1, "low": 2}
-            ordered_delivery = sorted(deliveries, key=lambda x: (priority_map.get(x.get("priority","medium"),1), x["id"]))
-            ordered = [i['id'] for i in ordered_delivery]
-            print(f"Fallback sort based on Priority: {ordered}")
-            return ordered
+        return prompt
+
+    @staticmethod
+    def _parse_llm_order(text):
+        print(f"Response Generated: {text}")
+        text = text.strip()
+        # attempt to parse json out of text
+        m = re.search(r'(\[.*\])', text, re.S)
+        if m:
+            print("creating ordered json")
+            ordered = json.loads(m.group(1))
+            print("Completed ordering")
+        else:
+            # fallback: split by common separators
+            print("Fallback: split by common separators")
+            ordered = [tok.strip().strip('"').strip("'") for tok in re.split(r'[,\\n]+', text) if tok.strip()]
+            print("Completed ordering")
+        print(f"LLM ({os.getenv('GROQ_MODEL_NAME')}) suggestion: {ordered}")
+        return ordered
+
+    @staticmethod
+    def _priority_sort(deliveries):
+        # fallback: simple sort by priority mapping and id
+        priority_map = {"high": 0, "medium": 1, "low": 2}
+        ordered_delivery = sorted(deliveries, key=lambda x: (priority_map.get(x.get("priority","medium"),1), x["id"]))
+        ordered = [i['id'] for i in ordered_delivery]
+        print(f"Fallback sort based on Priority: {ordered}")
+        return ordered
 
 class OptimizerAgent:
     """
     Generates route plans using routing_client; uses travel-time model if present to refine durations.
     """
-    def __init__(self, travel_time_model_path = Path(config.MODEL_DIR, "travel_time_model.pkl")):
-        self.model = None
-        if os.path.exists(travel_time_model_path):
+    def __init__(self, travel_time_model_path = None, traffic_feed = None, weather_feed = None, model_name = config.TRAVEL_TIME_MODEL_NAME):
+        """
+        travel_time_model_path: load this model file instead of the registry's current version
+        traffic_feed / weather_feed: feed dicts (as in sample_traffic.json / one city of sample_weather.json) joined onto
+        every leg as congestion / precipitation features; by default the sample files are used
+        model_name: model_registry name; the shared, lazily loaded current version is used and hot-swapped
+        """
+        if traffic_feed is None and weather_feed is None:
+            self.leg_features = LegFeatureJoiner.from_files()
+        else:
+            self.leg_features = LegFeatureJoiner(traffic_feed, weather_feed)
+        self.model_name = model_name
+        self._model = None
+        self._model_path = travel_time_model_path
+        if travel_time_model_path is not None and os.path.exists(travel_time_model_path):
             try:
-                self.model = load_model(travel_time_model_path)
+                self._model = load_model(travel_time_model_path)
             except:
-                self.model = None
+                self._model = None
+
+    @property
+    def model(self):
+        if self._model_path is not None:
+            return self._model
+        return get_registry().get_or_none(self.model_name)
 
     def compute_plan(self, start_point, ordered_deliveries):
         """
         start_point: (lat, lon)
-        ordered_deliveries: list of delivery dicts in visit order
+        ordered_deliveries: list of delivery dicts (or an OrderTable view) in visit order
         returns plan dict with sequenced stops, route summary (distance, duration), estimated arrival times
         """
+        if isinstance(ordered_deliveries, OrderTable):
+            # plan stops are rendered by the pages, so this is where the table becomes dicts
+            ordered_deliveries = ordered_deliveries.to_dicts()
+        points = self._plan_points(start_point, ordered_deliveries)
+        route = route_between_points(points)
+        segments = self._segment_minutes([points], [route])[0]
+        return self._build_plan(start_point, ordered_deliveries, route, segments)
+
+    def compute_plans(self, jobs):
+        """
+        Bulk compute_plan for many zones / vehicles: one routing batch and one model call for every leg.
+        jobs: list of (start_point, ordered_deliveries) pairs as taken by compute_plan
+        returns list of plan dicts in input order
+        """
+        jobs = [(start, deliveries.to_dicts() if isinstance(deliveries, OrderTable) else deliveries) for start, deliveries in jobs]
+        points_list = [self._plan_points(start, deliveries) for start, deliveries in jobs]
+        routes = routes_between_points(points_list)
+        segments = self._segment_minutes(points_list, routes)
+        return [
+            self._build_plan(start, deliveries, route, plan_segments)
+            for (start, deliveries), route, plan_segments in zip(jobs, routes, segments)
+        ]
+
+    @staticmethod
+    def _plan_points(start_point, ordered_deliveries):
         points = [(start_point[1], start_point[0])]  # (lon,lat) first
         for d in ordered_deliveries:
             points.append((d["lon"], d["lat"]))
-        route = route_between_points(points)
-        # If we have trained model, compute refined durations segment-wise
-        est_segment_minutes = []
-        if self.model:
-            for i in range(len(points)-1):
-                dist_km = route_distance_segment(points[i], points[i+1])
-                congestion = 0.4  # placeholder; ideally from traffic feed
-                precip = 0.0
-                X = np.array([[dist_km, congestion, precip]])
-                est = float(self.model.predict(X)[0])
-                est_segment_minutes.append(est)
-        else:
-            # coarse split of total duration equally
+        return points
+
+    def _segment_minutes(self, points_list, routes):
+        """
+        Per-leg travel minutes for every plan. With a trained model, the legs of all plans are
+        stacked into one feature matrix (distance, plus congestion / precipitation joined from the
+        traffic and weather feeds by leg_features) and evaluated in a single pass that also yields every
+        tree's prediction; ETA quantiles are taken across trees of the cumulative leg sums, so a plan's
+        p90 arrival is the p90 of the whole drive up to that stop, not a sum of per-leg p90s.
+        Returns: per plan {"minutes": [...], "quantiles": {"p50": [...], "p90": [...]} (per-leg increments
+                 of the cumulative quantiles, or None without a model), "hour_aware": bool}
+        """
+        model = self.model  # one version for the whole batch, even if a new one is promoted meanwhile
+        if model:
+            leg_km = [haversine_legs(points) for points in points_list]
+            dist_km = np.concatenate(leg_km) if leg_km else np.zeros(0)
+            congestion, precip = self.leg_features.features(points_list)
+            X = np.column_stack([dist_km, congestion, precip])
+            hour_aware = getattr(model, "n_features_in_", 3) == 4
+            if hour_aware:
+                # telemetry-trained models (telemetry.py) also take the hour of day
+                X = np.column_stack([X, np.full(len(dist_km), datetime.now().hour)])
+            per_tree = per_tree_predictions(model, X) if len(X) else np.zeros((0, 1))
+            est = per_tree.mean(axis = 1)  # the forest's prediction, from the same pass
+            bounds = np.cumsum([len(legs) for legs in leg_km])[:-1]
+            segments = []
+            for minutes, trees in zip(np.split(est, bounds), np.split(per_tree, bounds)):
+                cumulative = np.cumsum(trees, axis = 0)  # (legs, trees): each tree's drive time up to every stop
+                quantiles = {}
+                for q in config.ETA_QUANTILES:
+                    cq = np.quantile(cumulative, q, axis = 1) if len(cumulative) else np.zeros(0)
+                    quantiles[f"p{int(round(q * 100))}"] = np.diff(cq, prepend = 0.0).tolist()
+                segments.append({"minutes": minutes.tolist(), "quantiles": quantiles, "hour_aware": hour_aware})
+            return segments
+        # coarse split of total duration equally
+        segments = []
+        for points, route in zip(points_list, routes):
             if route["duration_s"]:
                 per = route["duration_s"] / (len(points)-1)
-                est_segment_minutes = [per/60.0]*(len(points)-1)
-        # Build ETA list
-        now = datetime.now()
+                minutes = [per/60.0]*(len(points)-1)
+            else:
+                minutes = []
+            segments.append({"minutes": minutes, "quantiles": None, "hour_aware": False})
+        return segments
+
+    @staticmethod
+    def _accumulate_etas(start_time, segment_minutes, ordered_deliveries, hourly, reference):
+        """
+        Drive the legs from start_time: each leg is scaled by the hour it is driven in, and the
+        vehicle waits for a delivery window to open.
+        Returns: (eta isoformat strings, timed segment minutes, ids reached after their window closed)
+        """
         eta_list = []
-        cur = now
-        for idx, segmin in enumerate(est_segment_minutes):
+        late_stops = []
+        cur = start_time
+        timed_segment_minutes = []
+        for idx, segmin in enumerate(segment_minutes):
+            segmin = float(segmin * hourly[cur.hour] / reference)
+            timed_segment_minutes.append(segmin)
             cur = cur + timedelta(minutes=segmin)
+            # wait for the delivery slot to open; record stops reached after it closes
+            stop = ordered_deliveries[idx] if idx < len(ordered_deliveries) else {}
+            midnight = cur.replace(hour=0, minute=0, second=0, microsecond=0)
+            window_start, window_end = parse_window(stop.get("window_start")), parse_window(stop.get("window_end"))
+            if window_start is not None and cur < midnight + timedelta(minutes=window_start):
+                cur = midnight + timedelta(minutes=window_start)
+            if window_end is not None and cur > midnight + timedelta(minutes=window_end):
+                late_stops.append(stop["id"])
             eta_list.append(cur.isoformat())
+        return eta_list, timed_segment_minutes, late_stops
+
+    def _build_plan(self, start_point, ordered_deliveries, route, segments):
+        # Build ETA list
+        now = datetime.now()
+        # time-of-day multiplier for the hour each leg is driven; models that already take the hour
+        # predicted for the current hour, so legs are scaled relative to it
+        hourly = get_speed_profiles().hourly(city_for_point(start_point[0], start_point[1]))
+        reference = hourly[now.hour] if segments["hour_aware"] else 1.0
+        eta_list, timed_segment_minutes, late_stops = self._accumulate_etas(now, segments["minutes"], ordered_deliveries, hourly, reference)
         plan = {
             "stops": [{"id":"START","lat":start_point[0],"lon":start_point[1]}] + ordered_deliveries,
             "route_summary": route,
-            "estimated_segment_minutes": est_segment_minutes,
-            "etas": eta_list
+            "estimated_segment_minutes": timed_segment_minutes,
+            "etas": eta_list,
+            "late_stops": late_stops
         }
+        # prediction intervals: the same accumulation over each quantile track
+        # (without a model every quantile equals the point estimate)
+        for name, minutes in (segments["quantiles"] or {f"p{int(round(q * 100))}": segments["minutes"] for q in config.ETA_QUANTILES}).items():
+            etas_q, minutes_q, late_q = self._accumulate_etas(now, minutes, ordered_deliveries, hourly, reference)
+            plan[f"etas_{name}"] = etas_q
+            plan[f"estimated_segment_minutes_{name}"] = minutes_q
+            plan[f"late_stops_{name}"] = late_q
         return plan
 
 def route_distance_segment(p1, p2):
@@ -237,7 +501,7 @@ class MonitorAgent:
         if self.traffic_feed:
             for s in self.traffic_feed.get("segments",[]):
                 if s["congestion_level"] > 0.75:
-                    events.append({"type":"traffic", "segment": s["segment_id"], "severity":"high"})
+                    events.append({"type":"traffic", "segment": s["segment_id"], "start": s.get("start"), "end": s.get("end"), "severity":"high"})
         if self.weather_feed:
             for loc in self.weather_feed.get("locations", []):
                 if "rain" in loc.get("conditions","").lower():
@@ -246,6 +510,34 @@ class MonitorAgent:
                     events.append({"type":"weather", "condition": "⛈️" + loc.get("conditions",""), "lat":loc["lat"], "lon":loc["lon"], "severity":"high"})
         return events
 
+    def match_events_to_routes(self, events, plans, radius_km = config.EVENT_RADIUS_KM):
+        """
+        Annotate events with the planned stops within radius_km of them.
+        events: output of evaluate(); traffic events are matched on their segment start, middle and end
+        plans: {plan_key: plan dict} from OptimizerAgent.compute_plan
+        Returns: events, each with "affected": [{"plan": key, "stop": id, "distance_km": float}, ...]
+        """
+        stops = [(key, stop) for key, plan in plans.items() for stop in plan.get("stops", []) if stop.get("id") != "START"]
+        index = SpatialIndex([(stop["lat"], stop["lon"]) for _, stop in stops], ids=stops)
+        for event in events:
+            if event["type"] == "traffic" and event.get("start") and event.get("end"):
+                (lat1, lon1), (lat2, lon2) = event["start"], event["end"]
+                probes = [(lat1, lon1), ((lat1 + lat2) / 2, (lon1 + lon2) / 2), (lat2, lon2)]
+            elif "lat" in event and "lon" in event:
+                probes = [(event["lat"], event["lon"])]
+            else:
+                probes = []
+            nearest = {}
+            if probes and len(index):
+                for idx, dist in zip(*index.query_radius(probes, radius_km)):
+                    for i, km in zip(idx, dist):
+                        key, stop = index.ids[i]
+                        if km < nearest.get((key, stop["id"]), np.inf):
+                            nearest[(key, stop["id"])] = km
+            event["affected"] = [{"plan": key, "stop": stop_id, "distance_km": round(float(km), 2)}
+                                 for (key, stop_id), km in sorted(nearest.items(), key=lambda kv: kv[1])]
+        return events
+
 
 class DispatcherAgent:
     """
@@ -328,17 +620,18 @@ class DataGeneratorAgent:
             f"Use realistic Bengali or Indian names and real street/locality-style addresses in {location}."
             "Priorities should be 'high', 'medium', or 'low'. Package sizes: 'small', 'medium', 'large'."
             "Fragile is true or false. "
+            "Some orders may have a delivery slot: window_start and window_end as 'HH:MM' strings; omit them otherwise. "
             "Return JSON only."
         )
 
         # Step 3: Combine lat/lon into the prompt
         user_prompt = f"Generate {num_orders} delivery orders for these coordinates:\n{json.dumps(coords, indent = 2)}"
 
-        # Step 4: Call the LLM
-        response = llm.invoke([
+        # Step 4: Call the LLM (not through the response cache: the prompt carries fresh random coordinates, so
+        # it could never hit, and "Generate" is meant to produce new orders each time)
+        content = str(get_llm().invoke([
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}],
-        )
+                {"role": "user", "content": user_prompt}]).content)
 
         # Step 5: Parse and return structured JSON
         try:
@@ -347,10 +640,10 @@ class DataGeneratorAgent:
             #     json.dump(orders, file, indent = 4)
 
 
-            match = re.search(r'\[\s*\{.*\}\s*\]', response.content, re.DOTALL)
+            match = re.search(r'\[\s*\{.*\}\s*\]', content, re.DOTALL)
             if not match:
                 print("⚠️ No valid JSON array found in LLM output.")
-                print(response.content)
+                print(content)
                 return []
 
             new_orders = json.loads(match.group(0))  # Parse only the list portion
@@ -378,14 +671,15 @@ class DataGeneratorAgent:
         
         except json.JSONDecodeError:
             print("⚠️ Could not parse JSON. Raw LLM output:")
-            print(response.content)
+            print(content)
             return []
         
         # return orders
 
     def generate_weather_data(self, coords, location):
             """
-            Generate synthetic weather data for given coordinates.
+            Weather for the given coordinates: live OpenWeatherMap observations when OPENWEATHER_API_KEY is set
+            (fetched concurrently), synthetic otherwise and for any point whose lookup failed.
             """
             # Define realistic weather conditions and temperature ranges
             conditions_list = ["clear", "clouds", "rain", "thunderstorm", "haze"]
@@ -400,12 +694,19 @@ class DataGeneratorAgent:
 
             current_location_weather = {}
             weather_locations = []
-            for c in coords:
+            live = get_weather_for_points([(c["lat"], c["lon"]) for c in coords]) if OPENWEATHER_API_KEY else [None] * len(coords)
+            for c, observed in zip(coords, live):
+                if isinstance(observed, dict):
+                    temp_c, conditions = observed["temp_c"], observed["conditions"]
+                else:
+                    if observed is not None:
+                        print(f"Weather lookup failed for ({c['lat']}, {c['lon']}): {observed}")
+                    temp_c, conditions = random.randint(*temp_range), random.choice(conditions_list)
                 weather_locations.append({
                     "lat": c["lat"],
                     "lon": c["lon"],
-                    "temp_c": random.randint(*temp_range),
-                    "conditions": random.choice(conditions_list)
+                    "temp_c": temp_c,
+                    "conditions": conditions
                 })
 
                 # Current timestamp in ISO format (with timezone)
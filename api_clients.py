@@ -1,7 +1,9 @@
 # api_clients.py
 import os
 import requests
+from config import config
 from dotenv import load_dotenv
+from http_client import get_client
 load_dotenv()
 
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")  # get from https://openweathermap.org/
@@ -14,11 +16,9 @@ def get_weather_for_point(lat, lon):
     """
     if not OPENWEATHER_API_KEY:
         raise RuntimeError("OPENWEATHER_API_KEY not set in environment")
-    url = "https://api.openweathermap.org/data/2.5/weather"
+    url = f"{config.OPENWEATHER_BASE_URL}/data/2.5/weather"
     params = {"lat": lat, "lon": lon, "units": "metric", "appid": OPENWEATHER_API_KEY}
-    resp = requests.get(url, params=params, timeout=10)
-    resp.raise_for_status()
-    data = resp.json()
+    data = get_client().get_json(url, params=params, timeout=10)
     # return minimal useful fields
     return {
         "temp_c": data["main"]["temp"],
@@ -27,6 +27,13 @@ def get_weather_for_point(lat, lon):
         "raw": data
     }
 
+def get_weather_for_points(points):
+    """
+    Fetch current weather for many (lat, lon) points concurrently over the shared connection pool.
+    Returns: list in input order; a failed lookup yields the exception instead of a dict
+    """
+    return get_client().map(lambda p: get_weather_for_point(p[0], p[1]), points)
+
 def get_static_map_image_url(lat, lon, zoom=12, width=800, height=600):
     """
     Returns a Mapbox Static Image URL for simple embedding.
@@ -42,18 +49,15 @@ def geocode_address(address):
     Very simple geocoder via Mapbox (or fallback to Nominatim if no token).
     """
     if MAPBOX_TOKEN:
-        url = "https://api.mapbox.com/geocoding/v5/mapbox.places/{}.json".format(requests.utils.requote_uri(address))
+        url = "{}/geocoding/v5/mapbox.places/{}.json".format(config.MAPBOX_BASE_URL, requests.utils.requote_uri(address))
         params = {"access_token": MAPBOX_TOKEN, "limit": 1}
-        r = requests.get(url, params=params, timeout=10); r.raise_for_status()
-        j = r.json()
+        j = get_client().get_json(url, params=params, timeout=10)
         if j.get("features"):
             lon, lat = j["features"][0]["center"]
             return {"lat": lat, "lon": lon, "place_name": j["features"][0]["place_name"]}
     # fallback to Nominatim (OpenStreetMap) — polite use only
-    url = "https://nominatim.openstreetmap.org/search"
-    resp = requests.get(url, params={"q": address, "format": "json", "limit": 1}, headers={"User-Agent":"ai-logistics-app"}, timeout=10)
-    resp.raise_for_status()
-    j = resp.json()
+    url = f"{config.NOMINATIM_BASE_URL}/search"
+    j = get_client().get_json(url, params={"q": address, "format": "json", "limit": 1}, headers={"User-Agent":"ai-logistics-app"}, timeout=10)
     if j:
         return {"lat": float(j[0]["lat"]), "lon": float(j[0]["lon"]), "place_name": j[0]["display_name"]}
     return None
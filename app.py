@@ -48,8 +48,8 @@ st.sidebar.title("User Login")
 role = st.sidebar.selectbox("Role", ["Dispatch Operator (Admin)", "Delivery Agent"])
 # username = st.sidebar.text_input("Username", value = "demo_user")
 if st.sidebar.button("Train Travel Time Calculator model"):
-    train_and_save_model()
-    st.sidebar.success("Trained and saved travel_time_model.pkl")
+    version = train_and_save_model()
+    st.sidebar.success(f"Trained and registered travel_time_model v{version}")
 
 st.title(":rainbow[AI Agent for Real-time Logistics Route Optimization]", anchor = False)
 # st.markdown(
@@ -66,12 +66,13 @@ st.title(":rainbow[AI Agent for Real-time Logistics Route Optimization]", anchor
 # Shared controls
 st.sidebar.header("Dispatcher Controls")
 area = st.sidebar.selectbox("Location", options = config.locations.keys())
+planner_method = st.sidebar.selectbox("Planner", options = ["solver", "llm"], format_func = {"solver": "Route Solver", "llm": "LLM (uses operator instructions)"}.get)
 # depot = st.sidebar.selectbox("Depot", options = config.locations[area]["depots"])
 # start_lat = depot[0]
 # start_lon = depot[1]
 # instantiate agents
 clusterer = ClusteringAgent()
-planner = PlannerAgent()
+planner = PlannerAgent(method = planner_method)
 optimizer = OptimizerAgent()
 monitor = MonitorAgent(traffic_feed = config.load_json(config.TRAFFIC_FILE), weather_feed = config.load_json(config.WEATHER_FILE))
 dispatcher = DispatcherAgent()
@@ -134,7 +135,7 @@ try:
 
             if re_cluster_btn or show_deliveries:
 
-                clusters, deliveries = clusterer.cluster_delivery_points_hdbscan(config.load_json(config.DELIVERIES_FILE), 2, proximity_km)
+                clusters, deliveries = clusterer.cluster_delivery_points_hdbscan(config.load_json(config.DELIVERIES_FILE), 2, proximity_km, use_cache = not re_cluster_btn)
                 
                 for order in deliveries:
                     popup_html = f"""
@@ -153,7 +154,7 @@ try:
                         icon = folium.Icon(color = order["color"], icon = "info-sign"),
                     ).add_to(map)
 
-                depot_assignments = utils.assign_nearest_depot_to_clusters(clusters, depots)
+                depot_assignments = utils.assign_nearest_depot_to_clusters(clusters, depots, location = selected_location)
                 
             st_folium(map, width = 700, height = 500, use_container_width = True)
 
@@ -229,10 +230,10 @@ try:
                             st_folium(zone_map, width = 600, height = 400)
                             st.caption(":grey[Priorities:]  High = 🔴 Red | Medium = 🟠 Orange | Low = 🟢 Green", width = "content")
                             
-                            operator_instructions = st.text_area(":grey[Operator Instructions]", key = f"operator_instruction_{zone}", value = "Deliver high-priority first; avoid highways if heavy rain.")
+                            operator_instructions = st.text_area(":grey[Operator Instructions]", key = f"operator_instruction_{zone}", value = "Deliver high-priority first; avoid highways if heavy rain.", help = "Read by the LLM planner; the route solver ignores them", disabled = planner.method != "llm")
 
                             if st.button("Optimized Route Plan", key = f"create_plan_{zone}"):
-                                ordered_ids = planner.prioritize(zone_orders, operator_instructions)
+                                ordered_ids = planner.prioritize(zone_orders, operator_instructions, depot = zone_depot_coordinates)
                                 # convert to list of delivery dicts in that order
                                 id_map = {d["id"]: d for d in zone_orders}
                                 ordered_delivery_dicts = [id_map[i] for i in ordered_ids if i in id_map]
@@ -271,13 +272,13 @@ try:
                                     priority = stop.get("priority", "low").lower()
                                     color = color_map.get(priority, "gray")
 
-                                    # ETA handling
-                                    if i < len(etas):
+                                    # ETA handling (etas[k] is the arrival at delivery k, i.e. stops[k+1]: stops[0] is START)
+                                    if i-1 < len(etas):
                                         try:
-                                            eta_time = datetime.fromisoformat(etas[i])
+                                            eta_time = datetime.fromisoformat(etas[i-1])
                                             eta_str = eta_time.strftime("%Y-%m-%d %H:%M:%S")
                                         except Exception:
-                                            eta_str = etas[i]
+                                            eta_str = etas[i-1]
                                     else:
                                         eta_str = "N/A"
 
@@ -356,7 +357,7 @@ try:
                                     st.subheader("🚦Live Traffic Feed", divider = "rainbow", anchor = False)
                                     if st.button(":material/refresh:", help = "Refresh traffic data", key = f"traffic_refresh_{zone}"):
                                         ...
-                                utils.st.dataframe(utils.get_traffic_data(traffic_feed), width = "content", hide_index = True)
+                                st.dataframe(utils.get_traffic_data(traffic_feed), width = "content", hide_index = True)
                                 
                             with st.container():
                                 with st.container(horizontal = True, vertical_alignment = "bottom"):
@@ -364,7 +365,7 @@ try:
                                     if st.button(":material/refresh:", help = "Refresh weather data", key = f"weather_refresh_{zone}"):
                                         data_generator.generate_weather_data(config.load_json(config.DELIVERIES_FILE))
                                         st.rerun()
-                                utils.st.dataframe(utils.get_weather_data(config.load_json(config.WEATHER_FILE)), width = "content", hide_index = True)
+                                st.dataframe(utils.get_weather_data(config.load_json(config.WEATHER_FILE)), width = "content", hide_index = True)
                                 
 
                             events = monitor.evaluate()
@@ -411,11 +412,12 @@ try:
                                 # simple behavior: bump any deliveries near event latlon or in high severity
                                 st.info("Replanning triggered by monitor events")
                                 # We just regenerate ordering with operator instructions + appended 'avoid' if needed
-                                ordered_ids = planner.prioritize(config.deliveries, operator_instructions + " Consider avoiding high congestion segments if possible.")
-                                id_map = {d["id"]: d for d in config.deliveries}
-                                ordered_delivery_dicts = [id_map[i["id"]] for i in ordered_ids if i["id"] in id_map]
-                                new_plan = optimizer.compute_plan((start_lat, start_lon), ordered_delivery_dicts)
-                                st.session_state["current_plan"] = new_plan
+                                ordered_ids = planner.prioritize(zone_orders, operator_instructions + " Consider avoiding high congestion segments if possible.", depot = zone_depot_coordinates)
+                                id_map = {d["id"]: d for d in zone_orders}
+                                ordered_delivery_dicts = [id_map[i] for i in ordered_ids if i in id_map]
+                                new_plan = optimizer.compute_plan((zone_depot_coordinates[0], zone_depot_coordinates[1]), ordered_delivery_dicts)
+                                st.session_state[f"current_plan_{zone}"] = new_plan
+                                st.session_state["route_plans"].add(f"current_plan_{zone}")
                                 st.success("Auto replan complete")
 
 
@@ -0,0 +1,82 @@
+# benchmarks/clustering_scale.py
+"""
+Clustering scale: haversine HDBSCAN (the default OrderMap path) vs. the projected, grid-prefiltered
+boruvka_kdtree path used above config.CLUSTER_LARGE_THRESHOLD, on synthetic orders around city hot spots.
+Also checks that the grid prefilter keeps counting orders: a single dense hotspot smaller than one grid cell
+must come back as one zone (as it does without the prefilter), not as outliers.
+
+    python benchmarks/clustering_scale.py --sizes 1000 10000 100000 500000 --location Delhi
+"""
+import sys
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import config
+from clustering import fit_hdbscan, cluster_labels_large
+
+
+def synthetic_orders(n, location="Delhi", n_hotspots=40, spread_deg=0.01, seed=0):
+    """
+    n (lat, lon) points scattered around random hot spots inside the location bounds.
+    """
+    rng = np.random.default_rng(seed)
+    b = config.locations[location]["bounds"]
+    hotspots = rng.uniform([b["min_lat"], b["min_lon"]], [b["max_lat"], b["max_lon"]], (n_hotspots, 2))
+    return hotspots[rng.integers(0, n_hotspots, n)] + rng.normal(0, spread_deg, (n, 2))
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - t0, result
+
+
+def run(sizes=(1000, 10000, 100000, 500000), location="Delhi", min_cluster_size=3, eps_km=1, haversine_max=20000):
+    print(f"{location}: min_cluster_size={min_cluster_size}, eps_km={eps_km}, grid_km={config.CLUSTER_GRID_KM}")
+    print(f"{'orders':>8} {'haversine (s)':>14} {'large path (s)':>15} {'zones':>6} {'label bytes':>12}")
+    rows = []
+    for n in sizes:
+        coords = synthetic_orders(n, location)
+        hav_s = None
+        if n <= haversine_max:
+            hav_s, _ = timed(fit_hdbscan, coords, min_cluster_size, eps_km)
+        large_s, labels = timed(cluster_labels_large, coords, min_cluster_size, eps_km)
+        zones = len(np.unique(labels[labels >= 0]))
+        hav = f"{hav_s:.2f}" if hav_s is not None else "skipped"
+        print(f"{n:>8} {hav:>14} {large_s:>15.2f} {zones:>6} {labels.nbytes:>12}")
+        rows.append((n, hav_s, large_s, zones))
+    return rows
+
+
+def hotspot_case(n=2000, location="Delhi", radius_m=50, min_cluster_size=5, eps_km=1):
+    """
+    n orders within ~radius_m of one point, clustered with and without the grid prefilter.
+    Returns: {grid_km: (zones, outlier share)}
+    """
+    b = config.locations[location]["bounds"]
+    centre = np.array([(b["min_lat"] + b["max_lat"]) / 2, (b["min_lon"] + b["max_lon"]) / 2])
+    coords = centre + np.random.default_rng(1).normal(0, radius_m / 2 / 111000, (n, 2))
+    result = {}
+    for grid_km in (config.CLUSTER_GRID_KM, 0):
+        labels = cluster_labels_large(coords, min_cluster_size, eps_km, grid_km=grid_km)
+        result[grid_km] = (len(np.unique(labels[labels >= 0])), float((labels < 0).mean()))
+        print(f"hotspot: {n} orders in ~{radius_m} m, grid_km={grid_km}: {result[grid_km][0]} zones, "
+              f"{result[grid_km][1]:.0%} outliers")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clustering scale benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 500000])
+    parser.add_argument("--location", default="Delhi", choices=list(config.locations))
+    parser.add_argument("--min-cluster-size", type=int, default=3)
+    parser.add_argument("--eps-km", type=float, default=1)
+    parser.add_argument("--haversine-max", type=int, default=20000, help="skip the haversine path above this size")
+    args = parser.parse_args()
+    run(args.sizes, args.location, args.min_cluster_size, args.eps_km, args.haversine_max)
+    hotspot = hotspot_case(location=args.location)
+    if hotspot[config.CLUSTER_GRID_KM] != hotspot[0]:
+        sys.exit(f"FAIL: grid prefilter gives {hotspot[config.CLUSTER_GRID_KM]}, no prefilter {hotspot[0]}")
@@ -0,0 +1,49 @@
+# benchmarks/http_throughput.py
+"""
+Offline HTTP throughput: bare requests.get per call vs. the pooled HttpClient, against stub_server.py.
+
+    python benchmarks/http_throughput.py --requests 200 --latency-ms 20
+"""
+import sys
+import time
+import argparse
+import requests
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from stub_server import start_stub_server
+from http_client import HttpClient
+
+
+def run(n_requests=200, latency_ms=20, concurrency=8):
+    server, base_url = start_stub_server(latency_ms=latency_ms)
+    url = f"{base_url}/data/2.5/weather"
+    params = [{"lat": 22.5 + i*1e-4, "lon": 88.35} for i in range(n_requests)]
+    try:
+        t0 = time.perf_counter()
+        for p in params:
+            requests.get(url, params=p, timeout=10).raise_for_status()
+        bare_s = time.perf_counter() - t0
+
+        client = HttpClient(pool_size=concurrency, max_concurrency=concurrency)
+        t0 = time.perf_counter()
+        results = client.map(lambda p: client.get_json(url, params=p), params)
+        pooled_s = time.perf_counter() - t0
+        client.close()
+        errors = sum(isinstance(r, Exception) for r in results)
+    finally:
+        server.shutdown()
+
+    print(f"{n_requests} requests, {latency_ms} ms stub latency")
+    print(f"  bare requests.get : {bare_s:.2f}s ({n_requests/bare_s:.0f} req/s)")
+    print(f"  pooled client x{concurrency}: {pooled_s:.2f}s ({n_requests/pooled_s:.0f} req/s), errors: {errors}")
+    return bare_s, pooled_s
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    run(args.requests, args.latency_ms, args.concurrency)
@@ -0,0 +1,63 @@
+# benchmarks/import_time.py
+"""
+Cold import time of the modules pages and workers start from, each measured in a fresh interpreter
+(best of --runs). Fails when a module exceeds --budget-ms or pulls in a heavy dependency at import time
+(those belong inside the functions that use them).
+
+    python benchmarks/import_time.py --budget-ms 400
+"""
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULES = ["agents", "utils.utils", "clustering", "models", "model_registry", "order_table", "planning"]
+HEAVY = ["hdbscan", "sklearn", "pandas", "scipy", "joblib", "folium", "streamlit", "langchain"]
+
+PROBE = """
+import sys, json, time
+t0 = time.perf_counter()
+import {module}
+print(json.dumps({{"ms": (time.perf_counter() - t0) * 1000, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, runs=3):
+    """
+    Returns: (best import time in ms, heavy modules loaded by the import)
+    """
+    best, heavy = None, []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        best = result["ms"] if best is None else min(best, result["ms"])
+        heavy = result["heavy"]
+    return best, heavy
+
+
+def run(modules=MODULES, budget_ms=400, runs=3):
+    print(f"{'module':>16} {'import (ms)':>12}  heavy dependencies loaded")
+    failures = []
+    for module in modules:
+        ms, heavy = measure(module, runs)
+        print(f"{module:>16} {ms:>12.0f}  {', '.join(heavy) or '-'}")
+        if ms > budget_ms:
+            failures.append(f"{module} took {ms:.0f} ms (budget {budget_ms} ms)")
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)} at import time")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time budget check")
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--budget-ms", type=float, default=400)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    failures = run(args.modules, args.budget_ms, args.runs)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,124 @@
+# benchmarks/llm_dispatch.py
+"""
+Offline LLM dispatch: zone ordering prompts sent one after another with llm.invoke (the old path) vs. the
+concurrent, rate-limited llm_executor with per-call deadlines, against the fake chat models in fake_llm
+(native async and blocking-only). Some zones' calls hang to show that they fall back to the priority sort at
+the deadline instead of blocking the batch (a hung call keeps its slot until then, so the deadline must leave
+the healthy zones room on the others).
+Fails when a result is missing, a healthy zone is not answered by the LLM in its order, a stuck zone is not
+answered by the fallback, the batch overruns the deadline or the request rate exceeds the bucket; the same
+behaviour is covered offline, at test speed, by tests/test_llm_executor.py.
+
+    python benchmarks/llm_dispatch.py --zones 12 --latency-ms 300 --stuck 2 --deadline-s 2.5
+"""
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from fake_llm import FakeChatModel, SyncFakeChatModel
+from llm_cache import LLMCache
+from llm_executor import LLMExecutor
+from agents import PlannerAgent
+
+
+def zone_jobs(n_zones, stops_per_zone=8):
+    jobs = []
+    for z in range(n_zones):
+        deliveries = [{"id": z * 100 + i, "lat": 22.5 + 0.01 * i, "lon": 88.3 + 0.01 * z,
+                       "priority": ("high", "medium", "low")[i % 3], "package_size": "small"}
+                      for i in range(stops_per_zone)]
+        jobs.append((deliveries, f"zone {z}"))
+    return jobs
+
+
+def check_dispatch(llm, jobs, stuck, deadline_s, max_concurrency, requests_per_min):
+    """
+    Run every zone's prompt through a fresh executor and then through the planner.
+    Returns: (list of failure messages, batch seconds, executor stats)
+    """
+    failures = []
+    n_zones = len(jobs)
+    executor = LLMExecutor(max_concurrency = max_concurrency, requests_per_min = requests_per_min,
+                           tokens_per_min = 10**7, deadline_s = deadline_s,
+                           cache = LLMCache(Path(tempfile.mkdtemp(), "llm_cache.sqlite")))
+    prompts = [[{"role": "user", "content": PlannerAgent._llm_prompt(d, i)}] for d, i in jobs]
+    t0 = time.perf_counter()
+    results = executor.invoke_all(llm, prompts)
+    batch_s = time.perf_counter() - t0
+
+    if len(results) != n_zones:
+        failures.append(f"{len(results)} results for {n_zones} prompts")
+    for (deliveries, instructions), result in zip(jobs, results):
+        expected = "timeout" if instructions in stuck else "ok"
+        if result["status"] != expected:
+            failures.append(f"{instructions}: status {result['status']}, expected {expected}")
+        if instructions in stuck and result["elapsed_s"] > deadline_s + 0.5:
+            failures.append(f"{instructions}: answered after {result['elapsed_s']}s")
+    if batch_s > deadline_s * (1 + n_zones / max_concurrency) + 1:
+        failures.append(f"batch took {batch_s:.2f}s")
+    starts = sorted(t for t, _ in llm.calls)
+    for i, t in enumerate(starts):
+        # bucket capacity is one minute of requests; beyond that, calls may not start faster than the refill
+        allowed = requests_per_min + (t - starts[0]) * requests_per_min / 60 + 1
+        if i + 1 > allowed:
+            failures.append(f"call {i + 1} started {t - starts[0]:.2f}s in: over the request rate")
+            break
+
+    # end to end through the planner: stuck zones get the priority sort, every other zone the LLM's order
+    planner = PlannerAgent(method = "llm", llm = llm, executor = executor)
+    orders = planner.prioritize_llm_batch(jobs, use_cache = False)
+    for (deliveries, instructions), ordered in zip(jobs, orders):
+        if instructions in stuck:
+            expected = PlannerAgent._priority_sort(deliveries)
+        else:
+            expected = [d["id"] for d in deliveries][::-1]
+        if ordered != expected:
+            failures.append(f"{instructions}: order {ordered}, expected {expected}")
+    return failures, batch_s, executor.stats()
+
+
+def run(n_zones=12, latency_ms=300, n_stuck=2, deadline_s=2.5, max_concurrency=4, requests_per_min=600):
+    jobs = zone_jobs(n_zones)
+    stuck = {f"zone {z}" for z in range(n_stuck)}
+    markers = [f"Operator instructions: {s}\n" for s in stuck]
+    failures = []
+
+    # serial llm.invoke, as before (stuck zones are skipped here: they would block forever)
+    llm = FakeChatModel(latency_s = latency_ms / 1000)
+    t0 = time.perf_counter()
+    for deliveries, instructions in jobs[n_stuck:]:
+        llm.invoke([{"role": "user", "content": PlannerAgent._llm_prompt(deliveries, instructions)}])
+    serial_s = time.perf_counter() - t0
+
+    print(f"{n_zones} zones, {latency_ms} ms per call, {n_stuck} stuck, deadline {deadline_s}s, "
+          f"{max_concurrency} in flight, {requests_per_min} requests/min")
+    print(f"serial invoke ({n_zones - n_stuck} zones, no stuck ones): {serial_s:.2f}s")
+
+    # concurrent executor, including the stuck zones, with a native async client and with a blocking one
+    # (whose stuck threads cannot be cancelled: they hang for a while past the deadline, then exit)
+    clients = {"async client (ainvoke)": FakeChatModel(latency_s = latency_ms / 1000, stuck_markers = markers),
+               "sync client (invoke)": SyncFakeChatModel(latency_s = latency_ms / 1000, stuck_markers = markers,
+                                                         stuck_s = 2 * deadline_s)}
+    for name, llm in clients.items():
+        client_failures, batch_s, stats = check_dispatch(llm, jobs, stuck, deadline_s, max_concurrency, requests_per_min)
+        print(f"executor, {name} ({n_zones} zones): {batch_s:.2f}s  {stats}")
+        failures += [f"{name}: {failure}" for failure in client_failures]
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent LLM dispatch against a fake chat model")
+    parser.add_argument("--zones", type=int, default=12)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--stuck", type=int, default=2, help="zones whose LLM call never returns")
+    parser.add_argument("--deadline-s", type=float, default=2.5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests-per-min", type=float, default=600)
+    args = parser.parse_args()
+    failures = run(args.zones, args.latency_ms, args.stuck, args.deadline_s, args.concurrency, args.requests_per_min)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
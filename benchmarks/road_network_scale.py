@@ -0,0 +1,106 @@
+# benchmarks/road_network_scale.py
+"""
+Road network scale: contraction time, point-to-point query time and matrix time of RoadNetwork on synthetic
+city-sized street grids (with one-way streets and missing blocks), each checked against plain Dijkstra on the
+full graph.
+
+    python benchmarks/road_network_scale.py --sides 60 120 300 500
+"""
+import sys
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from road_network import RoadNetwork, build_csr
+
+
+def city_grid(side, block_m=120, one_way_share=0.2, missing_share=0.05, seed=0):
+    """
+    side x side street grid around Delhi: streets have random speeds, some are one-way and some blocks are missing.
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(side * side).reshape(side, side)
+    pairs = np.concatenate([np.column_stack([ids[:, :-1].ravel(), ids[:, 1:].ravel()]),
+                            np.column_stack([ids[:-1, :].ravel(), ids[1:, :].ravel()])])
+    pairs = pairs[rng.random(len(pairs)) >= missing_share]
+    lengths = block_m * rng.uniform(0.8, 1.2, len(pairs))
+    seconds = lengths / (rng.choice([15, 20, 30, 45], len(pairs)) / 3.6)
+    one_way = rng.random(len(pairs)) < one_way_share
+    flip = rng.random(len(pairs)) < 0.5
+    a = np.where(flip, pairs[:, 1], pairs[:, 0])
+    b = np.where(flip, pairs[:, 0], pairs[:, 1])
+    tails = np.concatenate([a, b[~one_way]])
+    heads = np.concatenate([b, a[~one_way]])
+    weights = np.concatenate([seconds, seconds[~one_way]])
+    meters = np.concatenate([lengths, lengths[~one_way]])
+    lat = 28.5 + (ids // side).ravel() * block_m / 111000
+    lon = 77.0 + (ids % side).ravel() * block_m / 98000
+    return lat, lon, build_csr(side * side, tails, heads, weights, meters)
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - t0, result
+
+
+def full_dijkstra(net, sources, targets):
+    """
+    (seconds, meters) from each source to each target by plain Dijkstra over the whole graph.
+    """
+    shape = (net.n, net.n)
+    full = (csr_matrix((net.weights, net.indices, net.indptr), shape=shape),
+            csr_matrix((net.lengths, net.indices, net.indptr), shape=shape))
+    seconds = np.full((len(sources), net.n), np.inf)
+    meters = np.full((len(sources), net.n), np.inf)
+    for rows, reached, sec, met in RoadNetwork._search_spaces(full, sources):
+        seconds[rows, reached] = sec
+        meters[rows, reached] = met
+    return seconds[:, targets], meters[:, targets]
+
+
+def max_error(expected, got):
+    both_inf = np.isinf(expected) & np.isinf(got)
+    with np.errstate(invalid="ignore"):
+        return float(np.abs(np.where(both_inf, 0.0, expected - got)).max())
+
+
+def run(sides=(60, 120, 300, 500), queries=200, matrix_size=100, seed=0):
+    print(f"{'nodes':>8} {'edges':>9} {'contract (s)':>13} {'p2p (ms)':>9} "
+          f"{f'{matrix_size}x{matrix_size} (s)':>14} {'max err (s)':>12} {'max err (m)':>12}")
+    rng = np.random.default_rng(seed)
+    rows = []
+    for side in sides:
+        lat, lon, (indptr, indices, weights, lengths) = city_grid(side, seed=seed)
+        net = RoadNetwork(lat, lon, indptr, indices, weights, lengths)
+        contract_s, _ = timed(net.contract)
+        pairs = rng.integers(0, net.n, (queries, 2))
+        query_s, p2p = timed(lambda: np.array([net.shortest_path(a, b) for a, b in pairs]))
+        nodes = rng.choice(net.n, matrix_size, replace=False)
+        matrix_s, (seconds, meters) = timed(net.many_to_many, nodes, nodes)
+        exp_sec, exp_met = full_dijkstra(net, pairs[:, 0], pairs[:, 1])
+        err_s = max_error(exp_sec.diagonal(), p2p[:, 0])
+        err_m = max_error(exp_met.diagonal(), p2p[:, 1])
+        exp_sec, exp_met = full_dijkstra(net, nodes, nodes)
+        err_s = max(err_s, max_error(exp_sec, seconds))
+        err_m = max(err_m, max_error(exp_met, meters))
+        print(f"{net.n:>8} {len(indices):>9} {contract_s:>13.2f} {query_s / queries * 1000:>9.2f} "
+              f"{matrix_s:>14.2f} {err_s:>12.2e} {err_m:>12.2e}")
+        rows.append((net.n, contract_s, query_s / queries, matrix_s, err_s, err_m))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sides", type=int, nargs="+", default=[60, 120, 300, 500])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--matrix-size", type=int, default=100)
+    args = parser.parse_args()
+    rows = run(args.sides, args.queries, args.matrix_size)
+    # float32 edge weights: allow rounding, not a different path
+    if any(not (err_s < 1e-2 and err_m < 1e-1) for *_, err_s, err_m in rows):
+        sys.exit("road network results differ from Dijkstra on the full graph")
@@ -0,0 +1,187 @@
+# cache.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+def make_key(*parts):
+    """
+    Stable hash key for any JSON-serializable parts (dict keys are sorted).
+    """
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache with optional TTL and hit/miss/eviction counters.
+    """
+    def __init__(self, max_entries=256, ttl_s=None):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._data = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl_s is not None and time.time() - item[0] > self.ttl_s:
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, stored_at=None):
+        with self._lock:
+            self._data[key] = (stored_at or time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __contains__(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and (self.ttl_s is None or time.time() - item[0] <= self.ttl_s)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"entries": len(self._data), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits / total if total else 0.0}
+
+
+class DiskCache:
+    """
+    SQLite-backed persistent cache for JSON-serializable values.
+    Entries expire after ttl_s; when the stored payload exceeds max_bytes the least recently used entries are evicted.
+    """
+    def __init__(self, path, max_bytes=64*1024*1024, ttl_s=None):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return default if entry is None else entry[0]
+
+    def get_entry(self, key):
+        """
+        Returns: (value, created_timestamp), or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_s is not None and now - row[1] > self.ttl_s:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value):
+        payload = json.dumps(value, separators=(",", ":"), default=str)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, now, now, len(payload)),
+            )
+            self._evict()
+
+    def _evict(self):
+        if self.ttl_s is not None:
+            cur = self._conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl_s,))
+            self.evictions += max(cur.rowcount, 0)
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+
+    def stats(self):
+        total = self.hits + self.misses
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits / total if total else 0.0}
+
+
+class TieredCache:
+    """
+    In-memory LRU in front of a persistent DiskCache; disk hits are promoted to memory.
+    """
+    def __init__(self, path, max_entries=512, max_bytes=64*1024*1024, ttl_s=None):
+        self.memory = LRUCache(max_entries=max_entries, ttl_s=ttl_s)
+        self.disk = DiskCache(path, max_bytes=max_bytes, ttl_s=ttl_s)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = self.memory.get(key, self)
+        if value is self:
+            entry = self.disk.get_entry(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value = entry[0]
+            # keep the original timestamp so promotion does not extend the TTL
+            self.memory.set(key, value, stored_at=entry[1])
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        self.disk.set(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        self.disk.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "memory": self.memory.stats(), "disk": self.disk.stats()}
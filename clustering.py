@@ -0,0 +1,317 @@
+# clustering.py
+import threading
+import numpy as np
+from config import config
+from cache import LRUCache, make_key
+from spatial_index import SpatialIndex, EARTH_RADIUS_KM
+
+CLUSTER_COLORS = ["purple", "orange", "darkblue", "pink", "cadetblue", "gray", "lightgreen"]
+OUTLIER_COLOR = "black"
+
+# content-addressed clustering results, shared by every Streamlit session in the process
+cluster_cache = LRUCache(max_entries = config.CLUSTER_CACHE_ENTRIES)
+
+def cluster_cache_key(coords, min_cluster_size, eps_km, *options):
+    """
+    Cache key for a clustering run: hash of the ordered (lat, lon) points, the HDBSCAN parameters
+    and any extra options that change the labels (e.g. zone bounds).
+    """
+    return make_key("hdbscan", [[round(float(lat), 6), round(float(lon), 6)] for lat, lon in coords], min_cluster_size, eps_km, *options)
+
+
+def label_colors(labels):
+    """
+    Returns: {label: folium color} for every label present; outliers (-1) are black.
+    """
+    colors = {int(label): CLUSTER_COLORS[label % len(CLUSTER_COLORS)] for label in np.unique(labels) if label != -1}
+    colors[-1] = OUTLIER_COLOR
+    return colors
+
+
+def fit_hdbscan(coords, min_cluster_size = 3, eps_km = 5, prediction_data = False):
+    """
+    HDBSCAN with the haversine metric over (lat, lon) points.
+    Returns: (fitted clusterer, labels array; -1 = outlier)
+    """
+    import hdbscan
+
+    clusterer = hdbscan.HDBSCAN(
+        min_cluster_size = min_cluster_size,
+        min_samples = 1,
+        metric = "haversine",
+        cluster_selection_epsilon = eps_km / EARTH_RADIUS_KM,  # Convert km to radians
+        prediction_data = prediction_data,
+    )
+    labels = clusterer.fit_predict(np.radians(np.asarray(coords, dtype = np.float64).reshape(-1, 2)))
+    return clusterer, labels
+
+
+def project_equirectangular(coords, lat0 = None):
+    """
+    Equirectangular projection of (lat, lon) degrees to planar (x, y) km around reference latitude lat0
+    (default: mean latitude). Distortion is negligible at city scale, so euclidean distances match haversine.
+    Returns: float64 array of shape (n, 2)
+    """
+    coords = np.asarray(coords, dtype = np.float64).reshape(-1, 2)
+    lat = np.radians(coords[:, 0])
+    lon = np.radians(coords[:, 1])
+    lat0 = np.radians(lat0) if lat0 is not None else (lat.mean() if len(lat) else 0.0)
+    return np.column_stack([EARTH_RADIUS_KM * lon * np.cos(lat0), EARTH_RADIUS_KM * lat])
+
+
+def cluster_labels_large(coords, min_cluster_size = 3, eps_km = 5, grid_km = config.CLUSTER_GRID_KM, n_jobs = -1):
+    """
+    Clustering for very large order volumes.
+    Points are projected to planar km (euclidean metric, so HDBSCAN can use boruvka_kdtree and parallel core
+    distances), then snapped to a grid_km grid: only the first min(orders in the cell, min_cluster_size)
+    orders of each occupied cell are clustered and every order takes its cell's most common label. Keeping
+    that many orders per cell lets min_cluster_size count orders rather than cells (a dense hotspot inside
+    one cell is still a zone) while bounding the fit at min_cluster_size points per cell.
+    grid_km = 0 disables the prefilter.
+    coords: array-like of (lat, lon)
+    Returns: int32 label array in input order (-1 = outlier)
+    """
+    import hdbscan
+
+    xy = project_equirectangular(coords)
+    if len(xy) == 0:
+        return np.zeros(0, dtype = np.int32)
+    if grid_km:
+        _, cell, counts = np.unique(np.floor(xy / grid_km).astype(np.int64), axis = 0,
+                                    return_inverse = True, return_counts = True)
+        cell = cell.ravel()
+        order = np.argsort(cell, kind = "stable")
+        rank = np.arange(len(cell)) - np.repeat(np.cumsum(counts) - counts, counts)  # position within its cell
+        sample = order[rank < max(min_cluster_size, 1)]
+        points = xy[sample]
+    else:
+        cell, sample, points = np.arange(len(xy)), np.arange(len(xy)), xy
+    if len(points) < max(min_cluster_size, 2):
+        return np.full(len(xy), -1, dtype = np.int32)
+    clusterer = hdbscan.HDBSCAN(
+        min_cluster_size = min_cluster_size,
+        min_samples = 1,
+        metric = "euclidean",
+        algorithm = "boruvka_kdtree",
+        core_dist_n_jobs = n_jobs,
+        cluster_selection_epsilon = float(eps_km),  # already in km
+        approx_min_span_tree = True,
+        allow_single_cluster = True,  # one dense hotspot is one zone, not all outliers
+    )
+    labels = clusterer.fit_predict(points).astype(np.int32)
+    if not grid_km:
+        return labels
+    # most common label among each cell's sampled orders (ties -> the lower label)
+    pairs, votes = np.unique(np.column_stack([cell[sample], labels]), axis = 0, return_counts = True)
+    best = np.lexsort((-votes, pairs[:, 0]))
+    winners = pairs[best][np.r_[True, np.diff(pairs[best][:, 0]) != 0]]
+    cell_label = np.full(cell.max() + 1, -1, dtype = np.int32)
+    cell_label[winners[:, 0]] = winners[:, 1]
+    return cell_label[cell]
+
+
+def balance_zones(coords, labels, volumes = None, max_stops = config.ZONE_MAX_STOPS, max_volume = config.ZONE_MAX_VOLUME,
+                  max_attach_km = None):
+    """
+    Bound zone sizes: clusters over max_stops orders or max_volume package units are split recursively in two
+    (k-means on projected km) until every part fits; outliers then join the nearest zone that still has room.
+    coords: array-like of (lat, lon)
+    labels: cluster labels (-1 = outlier), e.g. from HDBSCAN
+    volumes: package units per order (default 1 each)
+    max_attach_km: outliers further than this from every feasible zone stay outliers (None = no limit)
+    Returns: new int64 label array; zones that were not split keep their label
+    """
+    from sklearn.cluster import KMeans
+
+    xy = project_equirectangular(coords)
+    labels = np.asarray(labels, dtype = np.int64).copy()
+    volumes = np.ones(len(labels)) if volumes is None else np.asarray(volumes, dtype = np.float64)
+    next_label = labels.max(initial = -1) + 1
+
+    def fits(members):
+        return len(members) <= max_stops and volumes[members].sum() <= max_volume
+
+    # --- split oversized zones ---
+    pending = [np.flatnonzero(labels == label) for label in np.unique(labels[labels >= 0])]
+    while pending:
+        members = pending.pop()
+        if fits(members) or len(members) < 2:
+            continue
+        halves = KMeans(n_clusters = 2, n_init = 3, random_state = 0).fit_predict(xy[members])
+        if halves.min() == halves.max():  # identical points; cut in order instead
+            halves = np.arange(len(members)) >= len(members) // 2
+        moved = members[halves == 1]
+        labels[moved] = next_label
+        next_label += 1
+        pending += [members[halves == 0], moved]
+
+    # --- attach outliers to the nearest zone with spare stops and volume ---
+    outliers = np.flatnonzero(labels == -1)
+    zoned = np.flatnonzero(labels >= 0)
+    if len(outliers) and len(zoned):
+        stops = {int(l): int(c) for l, c in zip(*np.unique(labels[zoned], return_counts = True))}
+        load = {l: float(volumes[labels == l].sum()) for l in stops}
+        index = SpatialIndex(np.asarray(coords, dtype = np.float64).reshape(-1, 2)[zoned])
+        k = min(len(zoned), 32)
+        dist, idx = index.query_knn(np.asarray(coords, dtype = np.float64).reshape(-1, 2)[outliers], k = k)
+        for i, row_d, row_i in sorted(zip(outliers, dist, idx), key = lambda t: t[1][0]):  # closest outliers first
+            for km, j in zip(row_d, row_i):
+                if max_attach_km is not None and km > max_attach_km:
+                    break
+                zone = int(labels[zoned[j]])
+                if stops[zone] + 1 <= max_stops and load[zone] + volumes[i] <= max_volume:
+                    labels[i] = zone
+                    stops[zone] += 1
+                    load[zone] += volumes[i]
+                    break
+    return labels
+
+
+def match_labels(old_labels, new_labels, next_label = 0):
+    """
+    Relabel a fresh clustering so zones keep the ID of the previous zone they overlap most with.
+    old_labels / new_labels: label arrays over the same points (old may use -2 for "not seen before")
+    next_label: first ID handed to zones with no predecessor
+    Returns: relabelled copy of new_labels
+    """
+    old_labels = np.asarray(old_labels)
+    new_labels = np.asarray(new_labels)
+    # (overlap, new, old) for every pair of clusters that share points, biggest overlap first
+    pairs = {}
+    for o, n in zip(old_labels, new_labels):
+        if o >= 0 and n >= 0:
+            pairs[(n, o)] = pairs.get((n, o), 0) + 1
+    mapping, taken = {}, set()
+    for (n, o), _ in sorted(pairs.items(), key = lambda kv: -kv[1]):
+        if n not in mapping and o not in taken:
+            mapping[n] = o
+            taken.add(o)
+    next_label = max(next_label, max(taken, default = -1) + 1)
+    for n in np.unique(new_labels[new_labels >= 0]):
+        if n not in mapping:
+            mapping[n] = next_label
+            next_label += 1
+    mapping[-1] = -1
+    return np.array([mapping[n] for n in new_labels], dtype = np.int64)
+
+
+class IncrementalClusterer:
+    """
+    Keeps a fitted HDBSCAN model for a location and labels newly arriving orders against it
+    (approximate_predict, falling back to the nearest clustered point within eps_km) instead of refitting.
+    A full refit runs once drift crosses the configured thresholds; zone IDs are carried over across refits.
+    """
+    def __init__(self, min_cluster_size = 3, eps_km = 5,
+                 growth_threshold = config.CLUSTER_REFIT_GROWTH, noise_threshold = config.CLUSTER_REFIT_NOISE):
+        self.min_cluster_size = min_cluster_size
+        self.eps_km = eps_km
+        self.growth_threshold = growth_threshold
+        self.noise_threshold = noise_threshold
+        self.clusterer = None
+        self.labels = {}  # delivery id -> label
+        self.n_fitted = 0
+        self.n_predicted = 0  # orders labelled by prediction since the last fit
+        self.n_predicted_noise = 0
+        self.refits = 0
+        self._core_index = None
+        self._core_labels = None
+        self._zone_of_raw = {}  # raw HDBSCAN label of the current fit -> stable zone ID
+        self._lock = threading.Lock()
+
+    def drift(self):
+        """
+        Returns: {"growth": predicted / fitted orders, "noise": share of predicted orders that fell outside every zone}
+        """
+        return {
+            "growth": self.n_predicted / self.n_fitted if self.n_fitted else float("inf"),
+            "noise": self.n_predicted_noise / self.n_predicted if self.n_predicted else 0.0,
+        }
+
+    def needs_refit(self):
+        d = self.drift()
+        return self.clusterer is None or d["growth"] > self.growth_threshold or d["noise"] > self.noise_threshold
+
+    def fit(self, deliveries):
+        """
+        Full HDBSCAN fit over all deliveries; zone IDs are matched to the previous fit where they overlap.
+        Returns: labels array in input order
+        """
+        with self._lock:
+            return self._fit(deliveries)
+
+    def update(self, deliveries):
+        """
+        Label deliveries, predicting only the ones not seen before; refits when drift crosses the thresholds.
+        deliveries: current list of delivery dicts for the location (orders no longer present are forgotten)
+        Returns: labels array in input order
+        """
+        with self._lock:
+            current = {d["id"] for d in deliveries}
+            for gone in set(self.labels) - current:
+                del self.labels[gone]
+            new = [d for d in deliveries if d["id"] not in self.labels]
+            if self.clusterer is None and (new or not self.labels):
+                return self._fit(deliveries)
+            if new:
+                self._predict(new)
+                if self.needs_refit():
+                    print(f"Cluster drift {self.drift()} crossed threshold; refitting {len(deliveries)} orders")
+                    return self._fit(deliveries)
+            return np.array([self.labels[d["id"]] for d in deliveries], dtype = np.int64)
+
+    def _fit(self, deliveries):
+        coords = [(d["lat"], d["lon"]) for d in deliveries]
+        if len(coords) < max(self.min_cluster_size, 2):
+            labels = np.full(len(coords), -1, dtype = np.int64)
+            clusterer = None
+            self._zone_of_raw = {}
+        else:
+            clusterer, raw = fit_hdbscan(coords, self.min_cluster_size, self.eps_km, prediction_data = True)
+            previous = [self.labels.get(d["id"], -2) for d in deliveries]
+            labels = match_labels(previous, raw, next_label = max(self.labels.values(), default = -1) + 1)
+            self._zone_of_raw = {int(r): int(l) for r, l in zip(raw, labels)}
+        self.clusterer = clusterer
+        self.labels = {d["id"]: int(l) for d, l in zip(deliveries, labels)}
+        self.n_fitted = len(deliveries)
+        self.n_predicted = self.n_predicted_noise = 0
+        self.refits += 1
+        clustered = labels >= 0
+        self._core_index = SpatialIndex(np.asarray(coords)[clustered]) if clustered.any() else None
+        self._core_labels = labels[clustered]
+        return labels
+
+    def _predict(self, new):
+        coords = np.array([(d["lat"], d["lon"]) for d in new], dtype = np.float64)
+        labels = np.full(len(new), -1, dtype = np.int64)
+        if self.clusterer is not None:
+            try:
+                import hdbscan
+                raw, _ = hdbscan.approximate_predict(self.clusterer, np.radians(coords))
+                labels = np.array([self._zone_of_raw.get(int(r), -1) for r in raw], dtype = np.int64)
+            except Exception as e:
+                print(f"approximate_predict failed ({e}); using nearest clustered order")
+                labels = self._nearest_core(coords)
+        self.labels.update({d["id"]: int(l) for d, l in zip(new, labels)})
+        self.n_predicted += len(new)
+        self.n_predicted_noise += int((labels < 0).sum())
+        return labels
+
+    def _nearest_core(self, coords):
+        if self._core_index is None:
+            return np.full(len(coords), -1, dtype = np.int64)
+        dist, idx = self._core_index.query_knn(coords, k = 1)
+        return np.where(dist[:, 0] <= self.eps_km, self._core_labels[idx[:, 0]], -1)
+
+
+_incremental = {}
+_incremental_lock = threading.Lock()
+
+def get_incremental_clusterer(location, min_cluster_size = 3, eps_km = 5):
+    """
+    Process-wide IncrementalClusterer per (location, min_cluster_size, eps_km), shared across Streamlit reruns.
+    """
+    key = (location, min_cluster_size, eps_km)
+    with _incremental_lock:
+        if key not in _incremental:
+            _incremental[key] = IncrementalClusterer(min_cluster_size, eps_km)
+        return _incremental[key]
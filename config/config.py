@@ -22,6 +22,75 @@ DELIVERIES_FILE = os.path.join(DATA_DIR, "deliveries.json")
 TRAFFIC_FILE = os.path.join(DATA_DIR, "sample_traffic.json")
 WEATHER_FILE = os.path.join(DATA_DIR, "sample_weather.json")
 
+# External services (override the base URLs to point at stub_server.py for offline runs)
+ORS_BASE_URL = os.getenv("ORS_BASE_URL", "https://api.openrouteservice.org")
+OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org")
+MAPBOX_BASE_URL = os.getenv("MAPBOX_BASE_URL", "https://api.mapbox.com")
+NOMINATIM_BASE_URL = os.getenv("NOMINATIM_BASE_URL", "https://nominatim.openstreetmap.org")
+
+# Routing backend: "ors", "road_network" (offline graph below), "haversine" or "auto"
+# (auto = ORS when ORS_API_KEY is set, else haversine; set "road_network" to use the graph file)
+ROUTING_BACKEND = os.getenv("ROUTING_BACKEND", "auto")
+ROAD_GRAPH_FILE = os.getenv("ROAD_GRAPH_FILE", os.path.join(DATA_DIR, "road_graph.npz"))
+ORS_MATRIX_MAX_LOCATIONS = 50  # locations per ORS matrix request; larger matrices are fetched in blocks
+
+# Route cache (OpenRouteService responses)
+ROUTE_CACHE_FILE = os.path.join(DB_DIR, "route_cache.sqlite")
+ROUTE_CACHE_TTL_S = 24 * 3600
+ROUTE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+ROUTE_CACHE_MEMORY_ENTRIES = 512
+ROUTE_CACHE_COORD_DECIMALS = 5  # ~1 m; coordinates are rounded before keying
+
+# LLM (agents.py) and its response cache (llm_cache.py)
+LLM_MODEL = "openai/gpt-oss-20b"
+LLM_PROVIDER = "groq"
+LLM_CACHE_FILE = os.path.join(DB_DIR, "llm_cache.sqlite")
+LLM_CACHE_TTL_S = 7 * 24 * 3600
+LLM_CACHE_MAX_BYTES = 32 * 1024 * 1024
+LLM_CACHE_MEMORY_ENTRIES = 256
+LLM_MAX_CONCURRENCY = 4  # provider calls in flight at once (llm_executor.py)
+LLM_REQUESTS_PER_MIN = 30  # provider quotas (Groq free tier for the model); raise for paid plans
+LLM_TOKENS_PER_MIN = 8000
+LLM_CALL_DEADLINE_S = 20  # a call still waiting for quota or a reply after this falls back to the priority sort
+
+# Zone planning
+PLAN_MAX_CONCURRENCY = 8  # zones planned at the same time by "Plan All Zones"
+PLAN_ZONE_TIMEOUT_S = 60
+
+# Monitoring
+EVENT_RADIUS_KM = 3  # traffic / weather events closer than this to a planned stop affect its route
+TRAFFIC_SNAP_KM = 0.5  # a plan leg takes the congestion of traffic segments within this distance
+WEATHER_SNAP_KM = 10  # ... and the precipitation of the nearest weather observation within this distance
+DEFAULT_CONGESTION = 0.4  # congestion feature for legs with no traffic segment nearby
+ETA_QUANTILES = (0.5, 0.9)  # plans carry etas_p50 / etas_p90 from the spread of the forest's trees
+
+# Fleet
+PACKAGE_SIZE_UNITS = {"small": 1, "medium": 2, "large": 3}  # vehicle capacity units per package_size
+VEHICLE_CAPACITY = 20  # in package_size units
+DEPOT_VEHICLES = 5  # vehicles per depot; depot capacity = DEPOT_VEHICLES * VEHICLE_CAPACITY
+ZONE_MAX_STOPS = 15  # balanced clustering: most orders in one zone
+ZONE_MAX_VOLUME = VEHICLE_CAPACITY  # balanced clustering: most package units in one zone (one vehicle load)
+
+# Incremental clustering: new orders are labelled against the last HDBSCAN fit until drift crosses either threshold
+CLUSTER_REFIT_GROWTH = 0.25  # refit once orders added since the last fit exceed this share of the fitted orders
+CLUSTER_REFIT_NOISE = 0.3  # refit once this share of the added orders fall outside every zone
+CLUSTER_CACHE_ENTRIES = 64  # clustering results kept in memory, shared by all sessions (LRU)
+CLUSTER_LARGE_THRESHOLD = 20000  # orders per location above which the projected / grid-prefiltered path is used
+CLUSTER_GRID_KM = 0.1  # grid cell size of that path; orders in the same cell share a label
+
+# Streaming travel-time training (telemetry.py)
+TELEMETRY_FILE = os.getenv("TELEMETRY_FILE", os.path.join(DATA_DIR, "telemetry.csv"))  # append-only completed legs
+TELEMETRY_STATE_FILE = os.path.join(MODEL_DIR, "telemetry_state.json")  # read offset, reservoir, model version
+TELEMETRY_CHUNK_ROWS = 50000
+TELEMETRY_RESERVOIR_ROWS = 200000  # training sample size; bounds memory whatever the history length
+TELEMETRY_REFIT_ROWS = 500000  # refit and publish after this many new legs (and at the end of each run)
+SPEED_PROFILE_FILE = os.path.join(MODEL_DIR, "speed_profiles.npz")  # per-city hourly travel-time multipliers
+
+# Model registry (model_registry.py)
+TRAVEL_TIME_MODEL_NAME = "travel_time_model"
+MODEL_REGISTRY_CHECK_S = 2  # how often agents look for a newly promoted version
+MODEL_REGISTRY_KEEP = 5  # registered versions kept on disk per model (the current one is always kept)
+
 locations = {
     "Kolkata" : {
         "bounds": {
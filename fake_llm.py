@@ -0,0 +1,56 @@
+# fake_llm.py
+"""
+Offline stand-ins for the chat model, so LLM planning (llm_executor, PlannerAgent "llm" method) can be
+exercised without a provider key. Both reply to an ordering prompt with the delivery ids it lists, in reverse,
+after latency_s; prompts mentioning any of stuck_markers hang for stuck_s instead (a stalled provider call).
+SyncFakeChatModel only has invoke(), like clients without native async support; FakeChatModel adds ainvoke().
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from types import SimpleNamespace
+
+_IDS = re.compile(r"- id:([^,\s]+),")
+
+
+class SyncFakeChatModel:
+    def __init__(self, latency_s=0.2, jitter_s=0.0, stuck_markers=(), stuck_s=3600, seed=0, model_name="fake-chat"):
+        self.model_name = model_name  # like langchain clients; llm_executor keys its cache on it
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.stuck_markers = tuple(stuck_markers)
+        self.stuck_s = stuck_s
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = []  # (monotonic start time, prompt) of every call
+
+    def _delay(self, prompt):
+        with self._lock:
+            self.calls.append((time.monotonic(), prompt))
+            if any(marker in prompt for marker in self.stuck_markers):
+                return self.stuck_s
+            return self.latency_s + self._rng.uniform(0, self.jitter_s)
+
+    @staticmethod
+    def _prompt(messages):
+        return "\n".join(str(m.get("content", "")) for m in messages)
+
+    @staticmethod
+    def _reply(prompt):
+        ids = [json.loads(i) if i.isdigit() else i for i in _IDS.findall(prompt)]
+        return SimpleNamespace(content=json.dumps(ids[::-1]))
+
+    def invoke(self, messages):
+        prompt = self._prompt(messages)
+        time.sleep(self._delay(prompt))
+        return self._reply(prompt)
+
+
+class FakeChatModel(SyncFakeChatModel):
+    async def ainvoke(self, messages):
+        prompt = self._prompt(messages)
+        await asyncio.sleep(self._delay(prompt))
+        return self._reply(prompt)
@@ -0,0 +1,75 @@
+# http_client.py
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+
+class HttpClient:
+    """
+    Shared HTTP client: one pooled keep-alive Session with retry/backoff and a cap on in-flight requests.
+    """
+    def __init__(self, pool_size=16, max_concurrency=8, retries=3, backoff_factor=0.5, timeout=20):
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET", "POST"]),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Connection": "keep-alive", "User-Agent": "ai-logistics-app"})
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        with self._slots:
+            resp = self.session.request(method, url, **kwargs)
+        resp.raise_for_status()
+        return resp
+
+    def get_json(self, url, params=None, headers=None, timeout=None):
+        return self.request("GET", url, params=params, headers=headers, timeout=timeout or self.timeout).json()
+
+    def post_json(self, url, payload, headers=None, timeout=None):
+        return self.request("POST", url, json=payload, headers=headers, timeout=timeout or self.timeout).json()
+
+    def map(self, fn, items):
+        """
+        Run fn over items concurrently (at most max_concurrency at a time); results keep input order.
+        Exceptions are returned in place of results so one failed call does not discard the batch.
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        def call(item):
+            try:
+                return fn(item)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as pool:
+            return list(pool.map(call, items))
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Process-wide HttpClient shared by api_clients and routing_client.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+    return _client
@@ -0,0 +1,103 @@
+# leg_features.py
+import os
+import numpy as np
+from config import config
+from utils import utils
+from spatial_index import SpatialIndex
+
+# precipitation feature (0 / 0.5 / 1, as in the training data) by weather description; first match wins
+PRECIP_BY_CONDITION = [
+    ("thunderstorm", 1.0),
+    ("heavy rain", 1.0),
+    ("light rain", 0.5),
+    ("drizzle", 0.5),
+    ("shower", 0.5),
+    ("rain", 1.0),
+]
+
+
+def precip_level(conditions):
+    conditions = (conditions or "").lower()
+    for keyword, level in PRECIP_BY_CONDITION:
+        if keyword in conditions:
+            return level
+    return 0.0
+
+
+def densify_segment(start, end, step_km):
+    """
+    Points every ~step_km along a straight traffic segment (endpoints included), as (lat, lon).
+    """
+    start, end = np.asarray(start, dtype = np.float64), np.asarray(end, dtype = np.float64)
+    length_km = utils.haversine_distance(start[0], start[1], end[0], end[1])
+    n = max(int(np.ceil(length_km / step_km)), 1)
+    t = np.linspace(0, 1, n + 1)[:, None]
+    return start + t * (end - start)
+
+
+class LegFeatureJoiner:
+    """
+    Per-leg congestion and precipitation features for the travel-time model.
+    Traffic segments are densified into points and weather observations are indexed as they are
+    (both in SpatialIndex); each leg is probed at its start, middle and end, and every probe takes the
+    congestion of the nearest segment point within traffic_radius_km and the precipitation of the nearest
+    weather point within weather_radius_km. Legs with nothing nearby keep the default features.
+    """
+    def __init__(self, traffic_feed = None, weather_feed = None,
+                 traffic_radius_km = config.TRAFFIC_SNAP_KM, weather_radius_km = config.WEATHER_SNAP_KM,
+                 default_congestion = config.DEFAULT_CONGESTION, default_precip = 0.0):
+        self.traffic_radius_km = traffic_radius_km
+        self.weather_radius_km = weather_radius_km
+        self.default_congestion = default_congestion
+        self.default_precip = default_precip
+
+        points, congestion = [], []
+        for seg in (traffic_feed or {}).get("segments", []):
+            if seg.get("start") and seg.get("end") and seg.get("congestion_level") is not None:
+                dense = densify_segment(seg["start"], seg["end"], traffic_radius_km)
+                points.append(dense)
+                congestion.append(np.full(len(dense), float(seg["congestion_level"])))
+        self.traffic_index = SpatialIndex(np.vstack(points)) if points else None
+        self.traffic_congestion = np.concatenate(congestion) if congestion else np.zeros(0)
+
+        locations = [loc for loc in (weather_feed or {}).get("locations", []) if "lat" in loc and "lon" in loc]
+        self.weather_index = SpatialIndex([(loc["lat"], loc["lon"]) for loc in locations]) if locations else None
+        self.weather_precip = np.array([precip_level(loc.get("conditions")) for loc in locations])
+
+    @classmethod
+    def from_files(cls, traffic_file = config.TRAFFIC_FILE, weather_file = config.WEATHER_FILE, **kwargs):
+        """
+        Joiner over the sample feeds; weather observations of every city are pooled (the radius keeps them local).
+        """
+        traffic = utils.load_json(traffic_file) if os.path.exists(traffic_file) else None
+        weather = utils.load_json(weather_file) if os.path.exists(weather_file) else {}
+        pooled = {"locations": [loc for city in weather.values() if isinstance(city, dict) for loc in city.get("locations", [])]}
+        return cls(traffic, pooled, **kwargs)
+
+    def _snap(self, index, values, probes, radius_km, default):
+        if index is None:
+            return np.full(len(probes), default)
+        dist, idx = index.query_knn(probes, k = 1)
+        return np.where(dist[:, 0] <= radius_km, values[idx[:, 0]], default)
+
+    def features(self, points_list):
+        """
+        points_list: list of plans, each a list of (lon, lat) points as passed to routing_client
+        Returns: (congestion, precip) arrays over all legs of all plans, concatenated in order
+        """
+        starts, ends = [], []
+        for points in points_list:
+            p = np.asarray(points, dtype = np.float64).reshape(-1, 2)[:, ::-1]  # -> (lat, lon)
+            starts.append(p[:-1])
+            ends.append(p[1:])
+        if not starts or not sum(len(s) for s in starts):
+            return np.zeros(0), np.zeros(0)
+        starts, ends = np.vstack(starts), np.vstack(ends)
+        # probe every leg at start, middle and end
+        probes = np.vstack([starts, (starts + ends) / 2, ends])
+        n = len(starts)
+        congestion = self._snap(self.traffic_index, self.traffic_congestion, probes, self.traffic_radius_km,
+                                self.default_congestion).reshape(3, n).mean(axis = 0)
+        precip = self._snap(self.weather_index, self.weather_precip, probes, self.weather_radius_km,
+                            self.default_precip).reshape(3, n).max(axis = 0)
+        return congestion, precip
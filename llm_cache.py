@@ -0,0 +1,114 @@
+# llm_cache.py
+"""
+Response cache for chat-model calls. The key is the model name plus the prompt messages with whitespace
+normalized, so re-planning with the same deliveries and operator instructions is answered from the cache
+instead of the provider. Entries live in an in-memory LRU in front of a SQLite store (cache.TieredCache)
+and expire after config.LLM_CACHE_TTL_S; failed calls are never cached.
+"""
+import re
+import time
+import threading
+from config import config
+from cache import TieredCache, make_key
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(messages):
+    """
+    messages: list of {"role", "content"} dicts as passed to llm.invoke
+    Returns: [[role, content]] with runs of whitespace collapsed and ends stripped
+    """
+    return [[m.get("role", "user"), _WHITESPACE.sub(" ", str(m.get("content", ""))).strip()] for m in messages]
+
+
+def llm_cache_key(messages, model_name):
+    return make_key(model_name, normalize_prompt(messages))
+
+
+class LLMCache:
+    """
+    Cached llm.invoke with hit / miss counters and the time spent answering each.
+    """
+    def __init__(self, path=config.LLM_CACHE_FILE, max_entries=config.LLM_CACHE_MEMORY_ENTRIES,
+                 max_bytes=config.LLM_CACHE_MAX_BYTES, ttl_s=config.LLM_CACHE_TTL_S):
+        self.store = TieredCache(path, max_entries=max_entries, max_bytes=max_bytes, ttl_s=ttl_s)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def invoke(self, llm, messages, model_name, use_cache=True):
+        """
+        llm: chat model with .invoke(messages)
+        model_name: part of the key, so switching models never serves another model's answer
+        use_cache: False forces a provider call (the answer still refreshes the cache)
+        Returns: the response text
+        """
+        if use_cache:
+            text = self.lookup(messages, model_name)
+            if text is not None:
+                return text
+        t0 = time.perf_counter()
+        text = str(llm.invoke(messages).content)
+        self.put(messages, model_name, text, time.perf_counter() - t0)
+        return text
+
+    def lookup(self, messages, model_name):
+        """
+        Returns: the cached response text (counted as a hit), or None
+        """
+        t0 = time.perf_counter()
+        text = self.store.get(llm_cache_key(messages, model_name))
+        if text is not None:
+            self._record(True, time.perf_counter() - t0)
+            print(f"LLM cache hit ({model_name}, {(time.perf_counter() - t0) * 1000:.1f} ms)")
+        return text
+
+    def put(self, messages, model_name, text, seconds):
+        """
+        Store a provider response that took seconds to arrive (counted as a miss).
+        """
+        self.store.set(llm_cache_key(messages, model_name), text)
+        self._record(False, seconds)
+        print(f"LLM cache miss ({model_name}, {seconds:.2f} s)")
+
+    def _record(self, hit, seconds):
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.hit_seconds += seconds
+            else:
+                self.misses += 1
+                self.miss_seconds += seconds
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self):
+        """
+        Returns: hits, misses, hit_rate, mean hit / miss latency in ms, provider time saved (hits x mean miss
+        latency) and the underlying memory / disk cache stats
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            mean_hit_ms = 1000 * self.hit_seconds / self.hits if self.hits else 0.0
+            mean_miss_ms = 1000 * self.miss_seconds / self.misses if self.misses else 0.0
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                    "mean_hit_ms": mean_hit_ms, "mean_miss_ms": mean_miss_ms,
+                    "saved_s": self.hits * mean_miss_ms / 1000, "store": self.store.stats()}
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """
+    Process-wide LLMCache (config.LLM_CACHE_*).
+    """
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMCache()
+    return _llm_cache
@@ -0,0 +1,194 @@
+# llm_executor.py
+"""
+Concurrent LLM dispatch. A batch of prompts runs on one event loop with a cap on calls in flight and under
+the provider's quotas: token buckets for requests and tokens per minute, shared by every caller in the
+process. Each call has a deadline that covers its wait for quota, for a slot and for the reply. A call that
+misses it, would have to wait past it for quota, or fails comes back without text, so the caller can use
+its local fallback and one stuck request never holds up the batch.
+"""
+import math
+import time
+import asyncio
+import threading
+from config import config
+from concurrent.futures import ThreadPoolExecutor
+from llm_cache import get_llm_cache
+
+CHARS_PER_TOKEN = 4  # rough prompt-size estimate for the tokens-per-minute bucket
+
+
+class TokenBucket:
+    """
+    capacity tokens, refilled continuously at rate_per_s. Thread-safe and independent of any event loop:
+    callers reserve tokens and sleep for the returned wait themselves.
+    """
+    def __init__(self, rate_per_s, capacity):
+        self.rate_per_s = rate_per_s
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def reserve(self, tokens=1, max_wait_s=None):
+        """
+        Take tokens now; the balance may go negative and later callers wait for the refill.
+        Returns: seconds to wait before using them, or None (nothing taken) when that would exceed max_wait_s
+        """
+        tokens = min(tokens, self.capacity)
+        with self._lock:
+            self._refill()
+            wait = max(0.0, (tokens - self._tokens) / self.rate_per_s)
+            if max_wait_s is not None and wait > max_wait_s:
+                return None
+            self._tokens -= tokens
+            return wait
+
+    def refund(self, tokens=1):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + min(tokens, self.capacity))
+
+
+def estimate_tokens(messages):
+    return math.ceil(sum(len(str(m.get("content", ""))) for m in messages) / CHARS_PER_TOKEN)
+
+
+def client_model_name(llm):
+    """
+    Model a chat client talks to (langchain clients expose model_name or model), or None if it does not say.
+    """
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None)
+
+
+class LLMExecutor:
+    """
+    Runs batches of chat prompts concurrently under rate limits and per-call deadlines.
+    Results are dicts {"text", "status", "elapsed_s"} in prompt order; status is "ok", "cached", "timeout",
+    "rate_limited" (quota would not free up before the deadline) or "error", and text is None unless
+    the status is "ok" or "cached".
+    """
+    def __init__(self, max_concurrency=config.LLM_MAX_CONCURRENCY,
+                 requests_per_min=config.LLM_REQUESTS_PER_MIN, tokens_per_min=config.LLM_TOKENS_PER_MIN,
+                 deadline_s=config.LLM_CALL_DEADLINE_S, cache=None):
+        """
+        cache: llm_cache.LLMCache consulted before any quota is spent (default: the process-wide one)
+        """
+        self.max_concurrency = max_concurrency
+        self.deadline_s = deadline_s
+        self.requests = TokenBucket(requests_per_min / 60, requests_per_min)
+        self.tokens = TokenBucket(tokens_per_min / 60, tokens_per_min)
+        self._cache = cache
+        self._lock = threading.Lock()
+        self.counts = {"ok": 0, "cached": 0, "timeout": 0, "rate_limited": 0, "error": 0}
+
+    @property
+    def cache(self):
+        return self._cache if self._cache is not None else get_llm_cache()
+
+    def _reserve(self, n_tokens, max_wait_s):
+        wait_requests = self.requests.reserve(1, max_wait_s)
+        if wait_requests is None:
+            return None
+        wait_tokens = self.tokens.reserve(n_tokens, max_wait_s)
+        if wait_tokens is None:
+            self.requests.refund(1)
+            return None
+        return max(wait_requests, wait_tokens)
+
+    async def _invoke(self, llm, messages, pool):
+        if hasattr(llm, "ainvoke"):  # native async clients are cancelled cleanly at the deadline
+            return await llm.ainvoke(messages)
+        return await asyncio.get_running_loop().run_in_executor(pool, llm.invoke, messages)
+
+    async def _call(self, llm, messages, deadline_s, model_name, use_cache, semaphore, pool):
+        t0 = time.perf_counter()
+
+        async def attempt():
+            if use_cache and model_name is not None:
+                text = self.cache.lookup(messages, model_name)
+                if text is not None:
+                    return text, "cached"
+            # quota first, so a call sleeping for the refill does not hold a concurrency slot
+            wait = self._reserve(estimate_tokens(messages), deadline_s - (time.perf_counter() - t0))
+            if wait is None:
+                return None, "rate_limited"
+            await asyncio.sleep(wait)
+            async with semaphore:
+                t_call = time.perf_counter()
+                text = str((await self._invoke(llm, messages, pool)).content)
+                if model_name is not None:
+                    self.cache.put(messages, model_name, text, time.perf_counter() - t_call)
+                return text, "ok"
+
+        try:
+            text, status = await asyncio.wait_for(attempt(), timeout=deadline_s)
+        except asyncio.TimeoutError:
+            text, status = None, "timeout"
+        except Exception as e:
+            print(f"LLM call failed: {e}")
+            text, status = None, "error"
+        with self._lock:
+            self.counts[status] += 1
+        return {"text": text, "status": status, "elapsed_s": round(time.perf_counter() - t0, 3)}
+
+    async def invoke_all_async(self, llm, prompts, deadline_s=None, use_cache=True, model_name=None):
+        """
+        llm: chat model with .ainvoke(messages) or .invoke(messages)
+        prompts: list of message lists ([{"role", "content"}, ...])
+        deadline_s: per-call deadline (default self.deadline_s)
+        model_name: cache key for llm's answers (default: the model the client reports); the cache is
+                    skipped for clients that report none, so they never share answers with another model
+        Returns: list of result dicts in prompt order
+        """
+        deadline_s = deadline_s or self.deadline_s
+        model_name = model_name or client_model_name(llm)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        # one worker per prompt for blocking clients, independent of max_concurrency: a call that timed out gives
+        # its semaphore slot back but its thread keeps running, and later calls must not queue behind it
+        pool = ThreadPoolExecutor(max_workers=max(len(prompts), 1), thread_name_prefix="llm-call")
+        try:
+            return list(await asyncio.gather(*[self._call(llm, m, deadline_s, model_name, use_cache, semaphore, pool) for m in prompts]))
+        finally:
+            # calls that missed their deadline finish in the background
+            pool.shutdown(wait=False)
+
+    def invoke_all(self, llm, prompts, deadline_s=None, use_cache=True, model_name=None):
+        """
+        Blocking wrapper around invoke_all_async, safe to call from Streamlit scripts and worker threads.
+        """
+        return run_sync(self.invoke_all_async(llm, prompts, deadline_s, use_cache, model_name))
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+def run_sync(coro):
+    """
+    Run a coroutine to completion from sync code (in a worker thread if this thread already runs a loop).
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_llm_executor():
+    """
+    Process-wide LLMExecutor, so every session shares one set of provider quotas.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = LLMExecutor()
+    return _executor
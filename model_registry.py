@@ -0,0 +1,205 @@
+# model_registry.py
+"""
+Versioned model artifacts in MODEL_DIR.
+
+models/registry.json records, per model name, every registered version (file, format, creation time and
+free-form metadata such as features or training rows) and which version is current. Artifacts are
+<name>-v<N>.pkl, plus <name>-v<N>.forest compiled arrays for tree ensembles. Each (name, version) is
+loaded at most once per process and shared by every agent and Streamlit session; a changed "current"
+version in the manifest (promote(), or another process registering) is picked up on the next get().
+"""
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from config import config
+from models import load_model, export_compiled_model, compiled_model_dir
+
+MANIFEST = "registry.json"
+
+
+class ModelRegistry:
+    def __init__(self, root=config.MODEL_DIR, check_interval_s=config.MODEL_REGISTRY_CHECK_S):
+        self.root = Path(root)
+        self.check_interval_s = check_interval_s
+        self._manifest = None
+        self._manifest_mtime = None
+        self._checked_at = 0.0
+        self._loaded = {}  # (name, version) -> model
+        self._lock = threading.RLock()
+
+    # --- manifest ---
+    def _manifest_path(self):
+        return Path(self.root, MANIFEST)
+
+    def manifest(self, refresh=False):
+        """
+        Returns: {name: {"current": version, "versions": {version: metadata}}}; re-read when the file changed
+        (checked at most every check_interval_s).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if refresh or self._manifest is None or now - self._checked_at >= self.check_interval_s:
+                self._checked_at = now
+                path = self._manifest_path()
+                mtime = os.path.getmtime(path) if path.exists() else None
+                if self._manifest is None or mtime != self._manifest_mtime:
+                    self._manifest = self._read_manifest(path) if mtime is not None else {}
+                    self._manifest_mtime = mtime
+            return self._manifest
+
+    @staticmethod
+    def _read_manifest(path):
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=f".{MANIFEST}.", dir=self.root)
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, self._manifest_path())
+        self._manifest = manifest
+        self._manifest_mtime = os.path.getmtime(self._manifest_path())
+
+    # --- queries ---
+    def current_version(self, name):
+        entry = self.manifest().get(name)
+        return entry["current"] if entry else None
+
+    def list_models(self):
+        """
+        Every registered version plus unregistered *.pkl files in MODEL_DIR (listed as version "unversioned").
+        Returns: list of dicts with name, version, current, path, format, size_bytes, created_at and metadata
+        """
+        rows, registered_files = [], set()
+        for name, entry in self.manifest(refresh=True).items():
+            for version, meta in entry["versions"].items():
+                path = Path(self.root, meta["file"])
+                registered_files.add(path.name)
+                rows.append({"name": name, "version": version, "current": version == entry["current"],
+                             "path": str(path), "size_bytes": _size(path), **meta})
+        for path in sorted(self.root.glob("*.pkl")):
+            if path.name not in registered_files:
+                rows.append({"name": path.stem, "version": "unversioned", "current": False, "path": str(path),
+                             "file": path.name, "format": "compiled+pickle" if compiled_model_dir(path).is_dir() else "pickle",
+                             "size_bytes": _size(path), "created_at": os.path.getmtime(path)})
+        return rows
+
+    # --- loading ---
+    def get(self, name=config.TRAVEL_TIME_MODEL_NAME, version=None):
+        """
+        The model for (name, version); version None = current. Loaded lazily, once per process.
+        Names with no registered version fall back to the unversioned <name>.pkl (legacy layout).
+        Raises FileNotFoundError when nothing is available.
+        """
+        with self._lock:
+            current = version is None
+            version = version if version is not None else self.current_version(name)
+            key = (name, version)
+            if key not in self._loaded:
+                if version is None:
+                    path = Path(self.root, f"{name}.pkl")
+                else:
+                    path = Path(self.root, self.manifest()[name]["versions"][str(version)]["file"])
+                self._loaded[key] = load_model(path)
+                print(f"Loaded model {name} v{version or 'unversioned'} from {path}")
+                if current:
+                    # hot swap: drop the versions this one replaced so only one copy stays resident
+                    for stale in [k for k in self._loaded if k[0] == name and k != key]:
+                        del self._loaded[stale]
+            return self._loaded[key]
+
+    def get_or_none(self, name=config.TRAVEL_TIME_MODEL_NAME, version=None):
+        try:
+            return self.get(name, version)
+        except (FileNotFoundError, KeyError):
+            return None
+
+    # --- publishing ---
+    def register(self, name, model, metadata=None, X_check=None, promote=True, keep=config.MODEL_REGISTRY_KEEP):
+        """
+        Save a new version of name (pickle, plus parity-checked compiled arrays for forests) and record it.
+        promote: make it the current version (hot-swapped into running agents)
+        keep: number of most recent versions whose files are kept on disk
+        Returns: the new version string
+        """
+        import joblib
+
+        with self._lock:
+            manifest = dict(self.manifest(refresh=True))
+            entry = manifest.setdefault(name, {"current": None, "versions": {}})
+            version = str(max((int(v) for v in entry["versions"]), default=0) + 1)
+            path = Path(self.root, f"{name}-v{version}.pkl")
+            self.root.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", dir=self.root)
+            os.close(fd)
+            joblib.dump(model, tmp)
+            fmt = "pickle"
+            if hasattr(model, "estimators_") or hasattr(model, "tree_"):
+                export_compiled_model(model, compiled_model_dir(path), X_check)
+                fmt = "compiled+pickle"
+            os.replace(tmp, path)
+            if fmt == "compiled+pickle":
+                os.utime(compiled_model_dir(path))  # keep the compiled copy preferred by load_model
+            entry["versions"][version] = {
+                "file": path.name,
+                "format": fmt,
+                "created_at": time.time(),
+                "n_features": int(getattr(model, "n_features_in_", 0)) or None,
+                **(metadata or {}),
+            }
+            if promote or entry["current"] is None:
+                entry["current"] = version
+            self._prune(name, entry, keep)
+            self._write_manifest(manifest)
+            print(f"Registered {name} v{version}{' (current)' if entry['current'] == version else ''}")
+            return version
+
+    def promote(self, name, version):
+        """
+        Make version current; running agents switch to it on their next prediction (no restart).
+        """
+        with self._lock:
+            manifest = dict(self.manifest(refresh=True))
+            if str(version) not in manifest.get(name, {}).get("versions", {}):
+                raise KeyError(f"{name} has no version {version}")
+            manifest[name]["current"] = str(version)
+            self._write_manifest(manifest)
+
+    def _prune(self, name, entry, keep):
+        versions = sorted(entry["versions"], key=int)
+        for version in versions[:-keep] if keep else []:
+            if version == entry["current"]:
+                continue
+            path = Path(self.root, entry["versions"].pop(version)["file"])
+            shutil.rmtree(compiled_model_dir(path), ignore_errors=True)
+            if path.exists():
+                path.unlink()
+            self._loaded.pop((name, version), None)
+
+
+def _size(path):
+    path = Path(path)
+    total = path.stat().st_size if path.exists() else 0
+    compiled = compiled_model_dir(path)
+    if compiled.is_dir():
+        total += sum(p.stat().st_size for p in compiled.iterdir())
+    return total
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """
+    Process-wide ModelRegistry over config.MODEL_DIR.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+    return _registry
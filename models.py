@@ -1,17 +1,21 @@
 # models.py
-import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-import joblib
 import os
+import shutil
+import tempfile
+import weakref
 from config import config
 from pathlib import Path
 
-def generate_sample_training_data(n=200):
+COMPILED_ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+
+def generate_sample_training_data(n=200, seed=42):
     """
     Create modest synthetic dataset mapping distance (km), congestion_level, weather_factor -> travel_time_minutes
     """
-    rng = np.random.RandomState(42)
+    import pandas as pd
+
+    rng = np.random.RandomState(seed)
     distance_km = rng.uniform(1, 40, size=n)
     congestion = rng.uniform(0.0, 1.0, size=n)
     precip = rng.choice([0, 0.5, 1.0], size=n, p=[0.6, 0.25, 0.15])
@@ -27,18 +31,174 @@ def generate_sample_training_data(n=200):
     })
     return df
 
-def train_and_save_model(path=Path(config.MODEL_DIR, "travel_time_model.pkl")):
+def train_and_save_model(path=None):
+    """
+    Train the sample model. Without a path it is registered as a new current version of
+    config.TRAVEL_TIME_MODEL_NAME (model_registry); with a path it is written there.
+    """
+    import joblib
+    from sklearn.ensemble import RandomForestRegressor
+
     df = generate_sample_training_data(500)
     X = df[["distance_km", "congestion", "precip"]]
     y = df["travel_time_min"]
     m = RandomForestRegressor(n_estimators=100, random_state=42)
     m.fit(X, y)
+    if path is None:
+        from model_registry import get_registry
+        return get_registry().register(config.TRAVEL_TIME_MODEL_NAME, m, {"source": "sample", "rows": len(df)}, X.to_numpy())
     joblib.dump(m, path)
     print(f"Saved model to {path}")
+    export_compiled_model(m, compiled_model_dir(path), X.to_numpy())
     return path
 
+def compiled_model_dir(path):
+    """
+    Directory holding the compiled arrays of a pickled model: models/travel_time_model.pkl -> models/travel_time_model.forest
+    """
+    return Path(path).with_suffix(".forest")
+
 def load_model(path=Path(config.MODEL_DIR, "travel_time_model.pkl")):
+    """
+    Load the travel-time model; the memory-mapped compiled forest is preferred when it is at least as new as the pickle.
+    """
+    compiled = compiled_model_dir(path)
+    if compiled.is_dir() and (not os.path.exists(path) or os.path.getmtime(compiled) >= os.path.getmtime(path)):
+        return CompiledForest.load(compiled)
     if os.path.exists(path):
+        import joblib
         return joblib.load(path)
     else:
         raise FileNotFoundError("Model not trained yet. Run train_and_save_model() first.")
+
+
+class CompiledForest:
+    """
+    Tree ensemble flattened into node arrays (all trees concatenated) with a vectorized NumPy evaluator.
+    Predictions are bit-identical to sklearn's RandomForestRegressor / DecisionTreeRegressor (single output).
+    """
+    def __init__(self, feature, threshold, left, right, value, roots, n_features=None):
+        self.feature = feature  # int32, -2 at leaves
+        self.threshold = threshold  # float64
+        self.left = left  # int32 global node index, -1 at leaves
+        self.right = right
+        self.value = value  # float64 leaf (and node) means
+        self.roots = roots  # int64 root node of each tree
+        self.n_features_in_ = int(n_features) if n_features is not None else int(feature.max()) + 1
+
+    @classmethod
+    def from_sklearn(cls, model):
+        estimators = getattr(model, "estimators_", [model])
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        for est in estimators:
+            t = est.tree_
+            roots.append(offset)
+            feature.append(t.feature.astype(np.int32))
+            threshold.append(t.threshold.astype(np.float64))
+            # child indices are shifted into the concatenated node arrays; leaves keep -1
+            left.append(np.where(t.children_left >= 0, t.children_left + offset, -1).astype(np.int32))
+            right.append(np.where(t.children_right >= 0, t.children_right + offset, -1).astype(np.int32))
+            value.append(t.value[:, 0, 0].astype(np.float64))
+            offset += t.node_count
+        return cls(np.concatenate(feature), np.concatenate(threshold), np.concatenate(left),
+                   np.concatenate(right), np.concatenate(value), np.array(roots, dtype=np.int64), model.n_features_in_)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """
+        Memory-map the arrays written by save(); pages share the OS page cache instead of unpickling copies.
+        """
+        arrays = [np.load(Path(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in COMPILED_ARRAYS]
+        n_features = Path(directory, "n_features.npy")
+        return cls(*arrays, int(np.load(n_features)) if n_features.exists() else None)
+
+    def save(self, directory):
+        """
+        Write the arrays as .npy files; the directory is built aside and swapped in, so readers never see a partial model.
+        """
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=f".{directory.name}.", dir=directory.parent))
+        for name in COMPILED_ARRAYS:
+            np.save(Path(tmp, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        np.save(Path(tmp, "n_features.npy"), np.int64(self.n_features_in_))
+        old = None
+        if directory.exists():
+            old = directory.with_name(f".{directory.name}.old.{os.getpid()}")
+            os.replace(directory, old)
+        os.replace(tmp, directory)
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+        return directory
+
+    def leaves(self, X):
+        """
+        Returns: (n_samples, n_trees) global leaf index reached by each sample in each tree
+        """
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        n_trees = len(self.roots)
+        node = np.tile(np.asarray(self.roots), len(X))  # flat (sample, tree) pairs
+        row = np.repeat(np.arange(len(X)), n_trees)
+        pending = np.flatnonzero(self.left[node] >= 0)
+        while len(pending):
+            n = node[pending]
+            go_left = X[row[pending], self.feature[n]] <= self.threshold[n]
+            n = np.where(go_left, self.left[n], self.right[n])
+            node[pending] = n
+            pending = pending[self.left[n] >= 0]  # only samples still at an internal node keep descending
+        return node.reshape(len(X), n_trees)
+
+    def predict_per_tree(self, X):
+        """
+        Returns: (n_samples, n_trees) prediction of every tree
+        """
+        return np.asarray(self.value)[self.leaves(X)]
+
+    def predict(self, X):
+        per_tree = self.predict_per_tree(X)
+        # accumulate tree by tree, as sklearn does, so the mean is bit-identical
+        y = np.zeros(len(per_tree))
+        for t in range(per_tree.shape[1]):
+            y += per_tree[:, t]
+        return y / per_tree.shape[1]
+
+
+def check_parity(model, compiled, X):
+    """
+    Raise if the compiled forest does not reproduce model.predict(X) exactly.
+    """
+    expected = model.predict(np.asarray(X))
+    got = compiled.predict(X)
+    if not np.array_equal(expected, got):
+        raise ValueError(f"Compiled model differs from sklearn on {int((expected != got).sum())} of {len(expected)} rows "
+                         f"(max abs diff {np.abs(expected - got).max():.3g})")
+
+def export_compiled_model(model, directory=Path(config.MODEL_DIR, "travel_time_model.forest"), X_check=None):
+    """
+    Compile a fitted forest into memory-mappable arrays under MODEL_DIR; with X_check, verify bit-exact parity first.
+    """
+    compiled = CompiledForest.from_sklearn(model)
+    if X_check is not None:
+        check_parity(model, compiled, X_check)
+    compiled.save(directory)
+    print(f"Saved compiled model to {directory}")
+    return directory
+
+
+_compiled_cache = weakref.WeakKeyDictionary()  # sklearn forest -> CompiledForest
+
+def per_tree_predictions(model, X):
+    """
+    Every tree's prediction in one vectorized pass: (n_samples, n_trees).
+    sklearn forests are compiled once (cached per model object); non-forest models give a single column.
+    """
+    if isinstance(model, CompiledForest):
+        return model.predict_per_tree(X)
+    if hasattr(model, "estimators_") and hasattr(model.estimators_[0], "tree_"):
+        compiled = _compiled_cache.get(model)
+        if compiled is None:
+            compiled = _compiled_cache[model] = CompiledForest.from_sklearn(model)
+        return compiled.predict_per_tree(X)
+    return np.asarray(model.predict(X), dtype=np.float64)[:, None]
@@ -0,0 +1,261 @@
+# order_table.py
+import json
+import numpy as np
+from collections.abc import Mapping
+from config import config
+from route_solver import parse_window
+from clustering import label_colors
+
+PRIORITY_LEVELS = ("high", "medium", "low")  # code = index = visit rank
+SIZE_LEVELS = tuple(config.PACKAGE_SIZE_UNITS)  # ("small", "medium", "large")
+UNCLUSTERED = -2  # cluster column before clustering; -1 = outlier
+COLUMNS = ("id", "lat", "lon", "priority", "package_size", "fragile", "cluster_id", "window_start", "window_end")
+
+
+def order_dtype(id_dtype = np.int64):
+    return np.dtype([
+        ("id", id_dtype),
+        ("lat", np.float64),
+        ("lon", np.float64),
+        ("priority", np.int8),
+        ("size", np.int8),
+        ("fragile", np.bool_),
+        ("cluster", np.int32),
+        ("window_start", np.float32),  # minutes after midnight, NaN = none
+        ("window_end", np.float32),
+    ])
+
+
+class OrderRow(Mapping):
+    """
+    Read-only dict-like view of one order, so code written against delivery dicts
+    (d["lat"], d.get("package_size", "medium")) works on an OrderTable without copying it.
+    """
+    __slots__ = ("_table", "_i")
+
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    def __getitem__(self, key):
+        data, i = self._table.data, self._i
+        if key in ("id", "lat", "lon", "fragile"):
+            return data[key][i].item()
+        if key == "priority":
+            return PRIORITY_LEVELS[data["priority"][i]]
+        if key == "package_size":
+            return SIZE_LEVELS[data["size"][i]]
+        if key in ("window_start", "window_end"):
+            value = data[key][i]
+            if np.isnan(value):
+                raise KeyError(key)
+            return float(value)
+        if key == "cluster_id":
+            label = data["cluster"][i]
+            if label == UNCLUSTERED:
+                raise KeyError(key)
+            return cluster_name(label)
+        column = self._table.extras.get(key)
+        if column is not None and column[i] is not None:
+            return column[i]
+        raise KeyError(key)
+
+    def _keys(self):
+        keys = [k for k in COLUMNS if k in self]
+        return keys + [k for k, column in self._table.extras.items() if column[self._i] is not None]
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __repr__(self):
+        return f"OrderRow({dict(self)})"
+
+
+def cluster_name(label):
+    return f"Zone_{label}" if label != -1 else "Outlier"
+
+
+class OrderTable:
+    """
+    Columnar order book: one NumPy structured array (id, lat, lon, priority code, size code, fragile,
+    cluster label, delivery window) plus one object column per free-text field (customer_name, address, ...;
+    None where an order does not have it).
+    Indexing with a slice returns a view; integer arrays / masks return a compact copy.
+    Iterating yields OrderRow views, so route_solver and the agents accept a table wherever they accept dicts.
+    The pages keep the zone tables in session state and hand them to the planner and optimizer; convert with
+    to_dicts() / to_clusters() / to_frame() only where the UI renders orders.
+    """
+    def __init__(self, data, extras = None):
+        self.data = data
+        self.extras = extras or {}  # {field: object ndarray aligned with data}
+
+    @classmethod
+    def from_dicts(cls, orders):
+        """
+        orders: list of delivery dicts as stored in deliveries.json
+        """
+        ids = [o["id"] for o in orders]
+        if all(isinstance(i, (int, np.integer)) and not isinstance(i, bool) for i in ids):
+            id_dtype = np.int64
+        else:
+            id_dtype = f"U{max((len(str(i)) for i in ids), default = 1)}"
+        data = np.empty(len(orders), dtype = order_dtype(id_dtype))
+        data["id"] = ids if id_dtype == np.int64 else [str(i) for i in ids]
+        data["lat"] = [o["lat"] for o in orders]
+        data["lon"] = [o["lon"] for o in orders]
+        data["priority"] = [_code(PRIORITY_LEVELS, o.get("priority"), "medium") for o in orders]
+        data["size"] = [_code(SIZE_LEVELS, o.get("package_size"), "medium") for o in orders]
+        data["fragile"] = [bool(o.get("fragile", False)) for o in orders]
+        data["cluster"] = UNCLUSTERED
+        for col in ("window_start", "window_end"):
+            data[col] = [np.nan if parse_window(o.get(col)) is None else parse_window(o.get(col)) for o in orders]
+        known = set(COLUMNS) | {"color"}
+        fields = dict.fromkeys(k for o in orders for k in o if k not in known)
+        extras = {k: np.fromiter((o.get(k) for o in orders), dtype = object, count = len(orders)) for k in fields}
+        return cls(data, extras)
+
+    @classmethod
+    def from_location(cls, location, path = config.DELIVERIES_FILE):
+        """
+        Orders of one location from the deliveries file.
+        """
+        with open(path, "r", encoding = "utf-8") as f:
+            return cls.from_dicts(json.load(f)[location])
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return (OrderRow(self, i) for i in range(len(self.data)))
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return OrderRow(self, int(key) % len(self.data))
+        return OrderTable(self.data[key], {k: column[key] for k, column in self.extras.items()})
+
+    @property
+    def ids(self):
+        return self.data["id"]
+
+    @property
+    def labels(self):
+        return self.data["cluster"]
+
+    def set_labels(self, labels):
+        """
+        Write cluster labels (-1 = outlier) in place.
+        """
+        self.data["cluster"] = labels
+        return self
+
+    def coords(self):
+        """
+        Returns: (n, 2) float64 array of (lat, lon)
+        """
+        return np.column_stack([self.data["lat"], self.data["lon"]])
+
+    def volumes(self, size_units = None):
+        """
+        Returns: package units per order (config.PACKAGE_SIZE_UNITS by default)
+        """
+        size_units = size_units or config.PACKAGE_SIZE_UNITS
+        return np.array([size_units.get(s, 1) for s in SIZE_LEVELS], dtype = np.float64)[self.data["size"]]
+
+    def has_time_windows(self):
+        return bool(np.any(~np.isnan(self.data["window_start"]) | ~np.isnan(self.data["window_end"])))
+
+    def take_ids(self, ids):
+        """
+        Sub-table of the given ids, in that order (unknown ids are skipped).
+        """
+        position = {k.item(): i for i, k in enumerate(self.data["id"])}
+        return self[np.array([position[i] for i in ids if i in position], dtype = np.int64)]
+
+    def groupby_cluster(self):
+        """
+        Returns: {cluster_id: OrderTable} ("Zone_<label>" / "Outlier"), zones in order of first appearance
+        """
+        labels = self.data["cluster"]
+        _, first = np.unique(labels, return_index = True)
+        return {cluster_name(labels[i]): self[np.flatnonzero(labels == labels[i])] for i in sorted(first)}
+
+    def regroup(self, clusters):
+        """
+        Zone sub-tables matching a {cluster_id: [delivery dicts]} grouping of this table's orders, e.g. the
+        "<zone>_D<k>" parts utils.assign_depots_balanced splits zones into.
+        Returns: {cluster_id: OrderTable} in the order of clusters
+        """
+        return {cid: self.take_ids([d["id"] for d in ds]) for cid, ds in clusters.items()}
+
+    def to_dicts(self, colors = None):
+        """
+        Delivery dicts for the UI; clustered tables also get cluster_id and a map color.
+        colors: {label: color} (default clustering.label_colors over this table)
+        """
+        labels = self.data["cluster"]
+        clustered = len(labels) and labels.min() != UNCLUSTERED
+        if clustered and colors is None:
+            colors = label_colors(labels)
+        orders = []
+        for i, rec in enumerate(self.data):
+            order = {"id": rec["id"].item(), "lat": float(rec["lat"]), "lon": float(rec["lon"]),
+                     "priority": PRIORITY_LEVELS[rec["priority"]], "package_size": SIZE_LEVELS[rec["size"]],
+                     "fragile": bool(rec["fragile"])}
+            for k, column in self.extras.items():
+                if column[i] is not None:
+                    order[k] = column[i]
+            for col in ("window_start", "window_end"):
+                if not np.isnan(rec[col]):
+                    order[col] = _hhmm(float(rec[col]))
+            if clustered:
+                order["cluster_id"] = cluster_name(rec["cluster"])
+                order["color"] = colors.get(int(rec["cluster"]), "gray")
+            orders.append(order)
+        return orders
+
+    def to_clusters(self):
+        """
+        UI edge of a clustered table: ({cluster_id: [delivery dicts]}, [delivery dicts]) in the shape
+        ClusteringAgent.cluster_delivery_points_hdbscan returns.
+        """
+        orders = self.to_dicts()
+        clusters = {}
+        for order in orders:
+            clusters.setdefault(order["cluster_id"], []).append(order)
+        return clusters, orders
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame(self.to_dicts())
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + sum(column.nbytes for column in self.extras.values())
+
+
+def _code(levels, value, default):
+    """
+    Column code of a level name, case- and whitespace-insensitive ("High " -> "high").
+    A missing value gets the default; an unknown one ("urgent") also does, with a warning.
+    """
+    if value is None or value == "":
+        return levels.index(default)
+    name = str(value).strip().lower()
+    if name not in levels:
+        print(f"Unknown value {value!r} (expected one of {', '.join(levels)}); using {default!r}")
+        return levels.index(default)
+    return levels.index(name)
+
+
+def _hhmm(minutes):
+    return f"{int(minutes // 60):02d}:{int(minutes % 60):02d}"
@@ -66,7 +66,9 @@ with cols[2]:
 # st.markdown(custom_css, unsafe_allow_html=True)
 
 
-events = monitor.evaluate()
+# match events to the stops of the plans generated on RouteBoard for this location
+location_plans = {key: st.session_state[key] for key in st.session_state.get("route_plans", {}).get(selected_location, []) if key in st.session_state}
+events = monitor.match_events_to_routes(monitor.evaluate(), location_plans)
 
 with st.container(border = True):
     st.markdown(f"#### 🚨 Detected Events ({len(events)})")
@@ -92,6 +94,7 @@ with st.container(border = True):
                         f"""
                         - **:grey[Segment:]** `{e.get('segment', 'N/A')}`  
                         - **:grey[Severity:]** :{color}[{sev.capitalize()}]
+                        - **:grey[Affected Stops:]** {', '.join(str(a['stop']) for a in e.get('affected', [])) or 'None'}
                         """,
                         width = "content", 
                         unsafe_allow_html = True
@@ -104,6 +107,7 @@ with st.container(border = True):
                         - **:grey[Condition:]** {e.get('condition').title()}
                         - **:grey[Location:]** ({e.get('lat')}, {e.get('lon')})  
                         - **:grey[Severity:]** :{color}[{sev.capitalize()}]
+                        - **:grey[Affected Stops:]** {', '.join(str(a['stop']) for a in e.get('affected', [])) or 'None'}
                         """,
                         width = "content", 
                         unsafe_allow_html=True
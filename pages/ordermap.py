@@ -6,6 +6,8 @@ from pathlib import Path
 from config import config
 from streamlit_folium import st_folium
 from models import train_and_save_model
+from spatial_index import locate_outliers
+from order_table import OrderTable
 from agents import ClusteringAgent, DataGeneratorAgent
 
 # Set Page Config
@@ -19,8 +21,8 @@ with st.container(horizontal = True, vertical_alignment = "bottom"):
     st.header(":blue[OrderMap]", divider = "rainbow", anchor = False)
 
 if st.sidebar.button("Train Travel Time Calculator model"):
-    train_and_save_model()
-    st.sidebar.success("Trained and saved travel_time_model.pkl")
+    version = train_and_save_model()
+    st.sidebar.success(f"Trained and registered {config.TRAVEL_TIME_MODEL_NAME} v{version}")
 
 option_container = st.container(horizontal = True, vertical_alignment = "center")
 locations = config.locations
@@ -30,6 +32,8 @@ with option_container.popover("Overlay", width = "content"):
     show_depots = st.checkbox("Depots", value = True)
     show_bounds = st.checkbox("Bounds", value = True)
     show_deliveries = st.checkbox("Deliveries", value = True)
+    balanced_zones = st.checkbox("Balanced Zones", value = False, help = f"Split zones over {config.ZONE_MAX_STOPS} orders or {config.ZONE_MAX_VOLUME} package units and attach outliers to the nearest zone")
+    balance_depots = st.checkbox("Balance Depots", value = False, help = "Split zones across depots so no depot exceeds its capacity")
 
 if selected_location:
     map_bounds = locations[selected_location]["bounds"]
@@ -90,7 +94,9 @@ with cols[1]:
 
     if re_cluster_btn or show_deliveries:
         try:
-            clusters, deliveries = clusterer.cluster_delivery_points_hdbscan(utils.load_json(config.DELIVERIES_FILE)[selected_location], 2, proximity_km)
+            orders = clusterer.cluster_table(OrderTable.from_location(selected_location), 2, proximity_km, incremental = not re_cluster_btn, balanced = balanced_zones, use_cache = not re_cluster_btn)
+            clusters, deliveries = orders.to_clusters()
+            st.session_state["location"][selected_location]["orders"] = orders
             st.session_state["location"][selected_location]["clusters"] = clusters
             st.session_state["location"][selected_location]["deliveries"] = deliveries
 
@@ -111,8 +117,15 @@ with cols[1]:
                     icon = folium.Icon(color = order["color"], icon = "info-sign"),
                 ).add_to(map)
 
-            depot_assignments = utils.assign_nearest_depot_to_clusters(clusters, depots)
+            if balance_depots:
+                clusters, depot_assignments = utils.assign_depots_balanced(clusters, depots)
+                st.session_state["location"][selected_location]["clusters"] = clusters
+            else:
+                depot_assignments = utils.assign_nearest_depot_to_clusters(clusters, depots, location = selected_location)
             st.session_state["location"][selected_location]["depot_assignments"] = depot_assignments
+            # zone views of the table for RouteBoard's planner and optimizer (the dicts above are for rendering)
+            st.session_state["location"][selected_location]["zone_orders"] = orders.regroup(clusters)
+            st.session_state["location"][selected_location]["outliers"] = locate_outliers(clusters)
         except KeyError:
             st.info(f"No orders from available from '{selected_location}' location")
         except Exception as e:
@@ -128,4 +141,8 @@ if selected_location in utils.load_json(config.DELIVERIES_FILE).keys():
     for cluster_id, cluster_deliveries in clusters.items():
         st.markdown(f"##### 🚚 {cluster_id} :grey[({len(cluster_deliveries)} deliveries)]", width = "content")
         df_cluster = pd.DataFrame(cluster_deliveries)[["id", "customer_name", "address", "priority", "package_size", "fragile"]]
+        if cluster_id == "Outlier":
+            outliers = st.session_state["location"][selected_location].get("outliers", {})
+            df_cluster["nearest_zone"] = [outliers.get(i, {}).get("nearest_zone") for i in df_cluster["id"]]
+            df_cluster["nearest_zone_km"] = [outliers.get(i, {}).get("distance_km") for i in df_cluster["id"]]
         st.dataframe(df_cluster, hide_index = True, width = "stretch")
\ No newline at end of file
@@ -6,6 +6,8 @@ from pathlib import Path
 from config import config
 from datetime import datetime
 from streamlit_folium import st_folium
+from planning import plan_all_zones, in_visit_order
+from routing_client import route_path
 from agents import PlannerAgent, OptimizerAgent, DispatcherAgent
 
 # Set Page Config
@@ -18,7 +20,6 @@ with st.container(horizontal = True, vertical_alignment = "bottom"):
     st.image(Path(config.ASSETS_DIR, "routeboard.png"), width = 50)
     st.header(":blue[RouteBoard]", divider = "rainbow", anchor = False)
 
-planner = PlannerAgent()
 optimizer = OptimizerAgent()
 dispatcher = DispatcherAgent()
 
@@ -26,17 +27,40 @@ option_container = st.container(horizontal = True, vertical_alignment = "center"
 locations = config.locations
 option_container.markdown(":grey[Locations:]", width = "content")
 selected_location = option_container.selectbox("Locations", options = locations.keys(), width = 200, label_visibility = "collapsed")
+option_container.markdown(":grey[Planner:]", width = "content")
+planner_method = option_container.selectbox("Planner", options = ["solver", "llm"], format_func = {"solver": "Route Solver", "llm": "LLM"}.get, width = 160, label_visibility = "collapsed", help = "The LLM planner follows the operator instructions; the route solver builds the shortest depot tour and ignores them")
+planner = PlannerAgent(method = planner_method)
 depots = locations[selected_location]["depots"]
 
 
 if st.session_state['username'] == list(config.USERS.keys())[0]: # --> "Dispatch Operator (Admin)"
     try:
         if selected_location in st.session_state["location"]:
-            zone_tabs = st.tabs([i.replace("_", " ") for i in list(st.session_state["location"][selected_location]["clusters"].keys())])
-
             if "route_plans" not in st.session_state:
                 st.session_state["route_plans"] = {}
-                st.session_state["route_plans"][selected_location] = set()
+            st.session_state["route_plans"].setdefault(selected_location, set())
+            # OrderTable views of each zone for the planner / optimizer; the dicts in "clusters" are for the maps
+            zone_tables = st.session_state["location"][selected_location].get("zone_orders", st.session_state["location"][selected_location]["clusters"])
+
+            if option_container.button("Plan All Zones", help = "Plan every zone of this location concurrently"):
+                results = plan_all_zones(
+                    zone_tables,
+                    st.session_state["location"][selected_location]["depot_assignments"],
+                    planner, optimizer,
+                    operator_instructions = "Deliver high-priority first; avoid highways if heavy rain.",
+                )
+                for zone, result in results.items():
+                    if "error" in result:
+                        st.warning(f"{zone.replace('_', ' ')}: {result['error']}")
+                        continue
+                    for old_key in [k for k in st.session_state["route_plans"][selected_location] if k == f"current_plan_{selected_location}_{zone}" or k.startswith(f"current_plan_{selected_location}_{zone}_V")]:
+                        st.session_state["route_plans"][selected_location].discard(old_key)
+                        st.session_state.pop(old_key, None)
+                    st.session_state[f"current_plan_{selected_location}_{zone}"] = result["plans"][0]
+                    st.session_state["route_plans"][selected_location].add(f"current_plan_{selected_location}_{zone}")
+                st.toast(f"Route Plans generated for {sum('plans' in r for r in results.values())} zones")
+
+            zone_tabs = st.tabs([i.replace("_", " ") for i in list(st.session_state["location"][selected_location]["clusters"].keys())])
 
             for i, deliveries in enumerate(st.session_state["location"][selected_location]["clusters"].items()):
                 zone = deliveries[0]
@@ -95,28 +119,52 @@ if st.session_state['username'] == list(config.USERS.keys())[0]: # --> "Dispatch
                             st_folium(zone_map, width = 600, height = 400, use_container_width = True)
                             st.caption(":grey[Priorities:]  High = 🔴 Red | Medium = 🟠 Orange | Low = 🟢 Green", width = "content")
                             
-                            operator_instructions = st.text_area(":grey[Operator Instructions]", key = f"operator_instruction_{zone}", value = "Deliver high-priority first; avoid highways if heavy rain.")
+                            operator_instructions = st.text_area(":grey[Operator Instructions]", key = f"operator_instruction_{zone}", value = "Deliver high-priority first; avoid highways if heavy rain.", help = "Read by the LLM planner; the route solver ignores them", disabled = planner.method != "llm")
+
+                            with st.container(horizontal = True, vertical_alignment = "center"):
+                                st.markdown(":grey[Vehicles:]", width = "content")
+                                n_vehicles = st.number_input("Vehicles", value = 1, min_value = 1, max_value = max(1, len(zone_orders)), key = f"n_vehicles_{zone}", width = 150, icon = "🚚", label_visibility = "collapsed")
 
                             if st.button("Optimized Route Plan", key = f"create_plan_{zone}"):
-                                ordered_ids = planner.prioritize(zone_orders, operator_instructions)
-                                # convert to list of delivery dicts in that order
-                                id_map = {d["id"]: d for d in zone_orders}
-                                ordered_delivery_dicts = [id_map[i] for i in ordered_ids if i in id_map]
-                                plan = optimizer.compute_plan((zone_depot_coordinates[0], zone_depot_coordinates[1]), ordered_delivery_dicts)
-                                st.session_state[f"current_plan_{selected_location}_{zone}"] = plan
-                                st.session_state["route_plans"][selected_location].add(f"current_plan_{selected_location}_{zone}")
+                                # drop plans from a previous run of this zone
+                                for old_key in [k for k in st.session_state["route_plans"][selected_location] if k == f"current_plan_{selected_location}_{zone}" or k.startswith(f"current_plan_{selected_location}_{zone}_V")]:
+                                    st.session_state["route_plans"][selected_location].discard(old_key)
+                                    st.session_state.pop(old_key, None)
+
+                                zone_table = zone_tables[zone]
+                                if n_vehicles == 1:
+                                    vehicle_orders = [planner.prioritize(zone_table, operator_instructions, depot = zone_depot_coordinates)]
+                                else:
+                                    vehicle_orders = planner.assign_vehicles(zone_table, zone_depot_coordinates, n_vehicles)
+
+                                for v, ordered_ids in enumerate(vehicle_orders, start = 1):
+                                    # the zone's orders in that sequence (a sub-table; compute_plan makes the stop dicts)
+                                    ordered_deliveries = in_visit_order(zone_table, ordered_ids)
+                                    plan = optimizer.compute_plan((zone_depot_coordinates[0], zone_depot_coordinates[1]), ordered_deliveries)
+                                    plan_key = f"current_plan_{selected_location}_{zone}" if n_vehicles == 1 else f"current_plan_{selected_location}_{zone}_V{v}"
+                                    st.session_state[plan_key] = plan
+                                    st.session_state["route_plans"][selected_location].add(plan_key)
                                 st.toast("Route Plan generated")
 
                             
 
                         with st.container(horizontal_alignment = "center"):
                             st.markdown(":grey[Optimized Route]", width = "content")
-                            if f"current_plan_{selected_location}_{zone}" in st.session_state:
-                                zone_route_plan = st.session_state[f"current_plan_{selected_location}_{zone}"]
+                            # a zone has one plan, or one plan per vehicle (suffix _V1, _V2, ...)
+                            zone_plan_keys = sorted(k for k in st.session_state["route_plans"][selected_location] if k == f"current_plan_{selected_location}_{zone}" or k.startswith(f"current_plan_{selected_location}_{zone}_V"))
+                            plan_key = f"current_plan_{selected_location}_{zone}"
+                            if len(zone_plan_keys) > 1:
+                                plan_key = st.selectbox("Vehicle", options = zone_plan_keys, format_func = lambda k: k.rsplit("_", 1)[-1].replace("V", "Vehicle "), key = f"vehicle_plan_{zone}")
+                            elif zone_plan_keys:
+                                plan_key = zone_plan_keys[0]
+
+                            if plan_key in st.session_state:
+                                zone_route_plan = st.session_state[plan_key]
 
                                 stops = zone_route_plan["stops"]
                                 segment_minutes = zone_route_plan.get("estimated_segment_minutes", [])
                                 etas = zone_route_plan.get("etas", [])
+                                etas_p90 = zone_route_plan.get("etas_p90", [])
                                 route_summary = zone_route_plan.get("route_summary", {})
 
                                 # Calculate map center
@@ -137,15 +185,16 @@ if st.session_state['username'] == list(config.USERS.keys())[0]: # --> "Dispatch
                                     priority = stop.get("priority", "low").lower()
                                     color = color_map.get(priority, "gray")
 
-                                    # ETA handling
-                                    if i < len(etas):
+                                    # ETA handling (etas[k] is the arrival at delivery k, i.e. stops[k+1]: stops[0] is START)
+                                    if i-1 < len(etas):
                                         try:
-                                            eta_time = datetime.fromisoformat(etas[i])
+                                            eta_time = datetime.fromisoformat(etas[i-1])
                                             eta_str = eta_time.strftime("%Y-%m-%d %H:%M:%S")
                                         except Exception:
-                                            eta_str = etas[i]
+                                            eta_str = etas[i-1]
                                     else:
                                         eta_str = "N/A"
+                                    eta_p90_str = datetime.fromisoformat(etas_p90[i-1]).strftime("%H:%M:%S") if i-1 < len(etas_p90) else "N/A"
 
                                     travel_time = (
                                         f"{segment_minutes[i-1]:.1f} min" if i > 0 and i-1 < len(segment_minutes) else "N/A"
@@ -159,7 +208,9 @@ if st.session_state['username'] == list(config.USERS.keys())[0]: # --> "Dispatch
                                     <b>Address:</b> {stop.get('address', 'N/A')}<br>
                                     <b>Priority:</b> {priority.capitalize()}<br>
                                     <b>Package Size:</b> {stop.get('package_size', 'N/A').capitalize()}<br>
+                                    <b>Window:</b> {stop.get('window_start') or '--'} - {stop.get('window_end') or '--'}<br>
                                     <b>ETA:</b> {eta_str}<br>
+                                    <b>ETA (p90):</b> {eta_p90_str}<br>
                                     <b>Travel Time:</b> {travel_time}
                                     """
 
@@ -171,9 +222,9 @@ if st.session_state['username'] == list(config.USERS.keys())[0]: # --> "Dispatch
                                     ).add_to(zone_map)
 
 
-                                # Add route line connecting all stops
+                                # Add route line along the roads (fetched once for plans priced from a matrix)
                                 folium.PolyLine(
-                                    route_coords,
+                                    route_path([(lon, lat) for lat, lon in route_coords], route_summary.get("geometry")),
                                     color = "blue",
                                     weight = 4,
                                     opacity = 0.7,
@@ -185,11 +236,13 @@ if st.session_state['username'] == list(config.USERS.keys())[0]: # --> "Dispatch
                                 distance_km = route_summary.get("distance_m", 0) / 1000
                                 duration_min = route_summary.get("duration_s", 0) / 60
                                 st.markdown(f"**:grey[Total Distance:]** {distance_km:.2f} km  |  **:grey[Estimated Duration:]** {duration_min:.1f} minutes", width = "content")
+                                if zone_route_plan.get("late_stops"):
+                                    st.warning(f"Delivery window missed for: {', '.join(str(s) for s in zone_route_plan['late_stops'])}")
 
                             else:
                                 st.info("Plan not generated")
 
-                    if f"current_plan_{selected_location}_{zone}" in st.session_state:
+                    if plan_key in st.session_state:
                         st.subheader("Manual Override", divider = "grey")
                         
                         st.markdown("You can reorder delivery sequence or skip orders", width = "content")
@@ -197,18 +250,18 @@ if st.session_state['username'] == list(config.USERS.keys())[0]: # --> "Dispatch
                         with st.container(horizontal = True, vertical_alignment = "center"):
                             with st.container(horizontal = True, vertical_alignment = "center"):
                                 st.markdown(":grey[New delivery sequence (by Order ID):]", width = "content")
-                                new_order = st.multiselect("New delivery sequence (by Order ID)", placeholder = "Choose order sequence", label_visibility = "collapsed", options = [val["id"] for val in st.session_state[f"current_plan_{selected_location}_{zone}"]["stops"] if val["id"] != "START"])
+                                new_order = st.multiselect("New delivery sequence (by Order ID)", placeholder = "Choose order sequence", label_visibility = "collapsed", options = [val["id"] for val in st.session_state[plan_key]["stops"] if val["id"] != "START"])
                             with st.container(horizontal = True, vertical_alignment = "center"):
                                 st.markdown(":grey[Skip Order (by Order ID):]", width = "content")
-                                skip_order = st.multiselect("Skip Order (by Order ID)", placeholder = "Choose order(s) to skip", label_visibility = "collapsed", options = [val["id"] for val in st.session_state[f"current_plan_{selected_location}_{zone}"]["stops"] if val["id"] != "START"])
+                                skip_order = st.multiselect("Skip Order (by Order ID)", placeholder = "Choose order(s) to skip", label_visibility = "collapsed", options = [val["id"] for val in st.session_state[plan_key]["stops"] if val["id"] != "START"])
                         # override_str = st.text_input("New order (comma separated)", key = f"override_str_{zone}")
                         
                         if st.button("Apply Override", key = f"override_btn_{zone}"):
-                            if f"current_plan_{selected_location}_{zone}" not in st.session_state:
+                            if plan_key not in st.session_state:
                                 st.error("No plan in session to override")
                             else:
                                 overrides = {"new_order" : new_order, "skip" : skip_order}
-                                st.session_state[f"current_plan_{selected_location}_{zone}"] = dispatcher.apply_override(st.session_state[f"current_plan_{selected_location}_{zone}"], overrides)
+                                st.session_state[plan_key] = dispatcher.apply_override(st.session_state[plan_key], overrides)
                                 st.toast("SUCCESS: Override applied", icon = ":material/thumb_up:")
                                 st.rerun()
 
@@ -306,7 +359,7 @@ else:
                                     agent_route_coords.append((lat, lon))
 
                                 folium.PolyLine(
-                                                    agent_route_coords,
+                                                    route_path([(lon, lat) for lat, lon in agent_route_coords], plan.get("route_summary", {}).get("geometry")),
                                                     color = "blue",
                                                     weight = 4,
                                                     opacity = 0.7,
@@ -0,0 +1,99 @@
+# planning.py
+import time
+import asyncio
+from config import config
+from concurrent.futures import ThreadPoolExecutor
+
+def plan_zone(zone_orders, depot, planner, optimizer, operator_instructions = "", n_vehicles = 1, ordered_ids = None):
+    """
+    Order, route and time one zone (blocking).
+    zone_orders: list of delivery dicts or an order_table.OrderTable view of the zone
+    ordered_ids: visit order already chosen (e.g. by a batched LLM call); skips planner.prioritize
+    Returns: list of plan dicts, one per vehicle
+    """
+    if ordered_ids is not None:
+        vehicle_orders = [ordered_ids]
+    elif n_vehicles == 1:
+        vehicle_orders = [planner.prioritize(zone_orders, operator_instructions, depot = depot)]
+    else:
+        vehicle_orders = planner.assign_vehicles(zone_orders, depot, n_vehicles)
+    jobs = [((depot[0], depot[1]), in_visit_order(zone_orders, ordered_ids)) for ordered_ids in vehicle_orders]
+    if len(jobs) == 1:
+        return [optimizer.compute_plan(*jobs[0])]
+    return optimizer.compute_plans(jobs)
+
+
+def in_visit_order(zone_orders, ordered_ids):
+    """
+    The zone's orders in the given id order (unknown ids skipped): a sub-table for an OrderTable, else dicts.
+    """
+    if hasattr(zone_orders, "take_ids"):  # OrderTable
+        return zone_orders.take_ids(ordered_ids)
+    id_map = {d["id"]: d for d in zone_orders}
+    return [id_map[i] for i in ordered_ids if i in id_map]
+
+
+async def plan_all_zones_async(clusters, depot_assignments, planner, optimizer, operator_instructions = "",
+                               n_vehicles = 1, max_concurrency = config.PLAN_MAX_CONCURRENCY,
+                               timeout_s = config.PLAN_ZONE_TIMEOUT_S):
+    """
+    Plan every zone of a location concurrently.
+    With an LLM planner the zones' ordering prompts are sent as one batch first (llm_executor: rate limited,
+    per-call deadline, priority sort for calls that miss it), then routing runs per zone.
+
+    clusters: {zone: OrderTable view} as stored in st.session_state["location"][loc]["zone_orders"]
+              (or {zone: [delivery dicts]})
+    depot_assignments: output of utils.assign_nearest_depot_to_clusters (zones without a depot are skipped)
+    max_concurrency: maximum number of zones planned at the same time
+    timeout_s: per-zone deadline; a zone that misses it is reported instead of blocking the others
+    Returns: {zone: {"plans": [plan, ...]} or {"error": message}, "elapsed_s": seconds}
+    """
+    depots = {a["cluster_id"]: (a["depot_lat"], a["depot_lon"]) for a in depot_assignments}
+    zones = [(zone, orders) for zone, orders in clusters.items() if zone in depots and orders]
+    llm_orders = {}
+    if getattr(planner, "method", None) == "llm" and n_vehicles == 1 and zones:
+        ordered = await planner.prioritize_llm_batch_async([(orders, operator_instructions) for _, orders in zones])
+        llm_orders = {zone: ids for (zone, _), ids in zip(zones, ordered)}
+    semaphore = asyncio.Semaphore(max_concurrency)
+    loop = asyncio.get_running_loop()
+    # one worker per zone, independent of max_concurrency: a zone that timed out gives its semaphore slot back
+    # but its thread keeps running, and the next zone must not queue behind it while its own clock runs
+    pool = ThreadPoolExecutor(max_workers = max(len(zones), 1), thread_name_prefix = "plan-zone")
+
+    async def run(zone, orders):
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                plans = await asyncio.wait_for(
+                    loop.run_in_executor(pool, plan_zone, orders, depots[zone], planner, optimizer, operator_instructions, n_vehicles,
+                                         llm_orders.get(zone)),
+                    timeout = timeout_s,
+                )
+                result = {"plans": plans}
+            except asyncio.TimeoutError:
+                result = {"error": f"timed out after {timeout_s}s"}
+            except Exception as e:
+                result = {"error": str(e)}
+            result["elapsed_s"] = round(time.perf_counter() - t0, 3)
+            return zone, result
+
+    jobs = [run(zone, orders) for zone, orders in zones]
+    try:
+        return dict(await asyncio.gather(*jobs))
+    finally:
+        # do not wait for zones that timed out; their threads finish in the background
+        pool.shutdown(wait = False)
+
+
+def plan_all_zones(clusters, depot_assignments, planner, optimizer, **kwargs):
+    """
+    Blocking wrapper around plan_all_zones_async, safe to call from Streamlit scripts
+    (runs the event loop in a worker thread if one is already running in this thread).
+    """
+    coro = plan_all_zones_async(clusters, depot_assignments, planner, optimizer, **kwargs)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers = 1) as pool:
+        return pool.submit(asyncio.run, coro).result()
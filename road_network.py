@@ -0,0 +1,434 @@
+# road_network.py
+"""
+Offline road routing over a graph stored on disk as a compact CSR adjacency array (.npz):
+
+    node_lat, node_lon : float64[n]
+    indptr             : int64[n+1]   edges of node u are indptr[u]:indptr[u+1]
+    indices            : int32[m]     edge heads
+    weights            : float32[m]   travel time in seconds
+    lengths            : float32[m]   length in meters
+
+The graph is preprocessed with contraction hierarchies (CH); the hierarchy is cached next to the graph
+file as <name>.ch.npz so the preprocessing runs once. Contraction runs in vectorized rounds and leaves a
+small uncontracted core; queries run scipy's compiled Dijkstra over the upward graphs and many-to-many
+matrices use the bucket algorithm.
+
+convert_osm_xml() turns an OpenStreetMap XML extract into the graph format.
+"""
+import os
+import numpy as np
+import xml.etree.ElementTree as ET
+from spatial_index import SpatialIndex
+from routing_client import haversine_legs
+
+# Default speeds (km/h) by OSM highway class, used when a way has no usable maxspeed tag
+HIGHWAY_SPEEDS_KMPH = {
+    "motorway": 80, "trunk": 60, "primary": 45, "secondary": 35, "tertiary": 30,
+    "unclassified": 25, "residential": 20, "service": 15, "living_street": 10,
+    "motorway_link": 50, "trunk_link": 40, "primary_link": 35, "secondary_link": 30, "tertiary_link": 25,
+}
+ACCESS_SPEED_KMPH = 30  # speed assumed between a query point and the graph node it snaps to
+
+
+def build_csr(n, tails, heads, weights, lengths):
+    """
+    Sort an edge list by tail node into CSR arrays (indptr, indices, weights, lengths).
+    """
+    tails = np.asarray(tails, dtype=np.int64)
+    order = np.argsort(tails, kind="stable")
+    indptr = np.zeros(n+1, dtype=np.int64)
+    np.add.at(indptr, tails + 1, 1)
+    return (np.cumsum(indptr), np.asarray(heads, dtype=np.int32)[order],
+            np.asarray(weights, dtype=np.float32)[order], np.asarray(lengths, dtype=np.float32)[order])
+
+
+def save_graph(path, node_lat, node_lon, indptr, indices, weights, lengths):
+    np.savez(path, node_lat=np.asarray(node_lat, dtype=np.float64), node_lon=np.asarray(node_lon, dtype=np.float64),
+             indptr=indptr, indices=indices, weights=weights, lengths=lengths)
+
+
+def convert_osm_xml(osm_path, out_path, speeds_kmph=HIGHWAY_SPEEDS_KMPH):
+    """
+    Convert an OSM XML extract (.osm) of drivable ways into the CSR graph file format.
+    Returns: number of nodes and edges written
+    """
+    coords = {}
+    ways = []
+    for _, elem in ET.iterparse(osm_path, events=("end",)):
+        if elem.tag == "node":
+            coords[int(elem.get("id"))] = (float(elem.get("lat")), float(elem.get("lon")))
+            elem.clear()
+        elif elem.tag == "way":
+            tags = {t.get("k"): t.get("v") for t in elem.findall("tag")}
+            highway = tags.get("highway")
+            if highway in speeds_kmph:
+                refs = [int(nd.get("ref")) for nd in elem.findall("nd")]
+                speed = speeds_kmph[highway]
+                maxspeed = tags.get("maxspeed", "").split(" ")[0]
+                if maxspeed.isdigit():
+                    speed = float(maxspeed)
+                oneway = tags.get("oneway", "no")
+                if highway.startswith("motorway") and oneway == "no":
+                    oneway = "yes"
+                ways.append((refs, speed, oneway))
+            elem.clear()
+
+    node_index = {}
+    tails, heads, weights, lengths = [], [], [], []
+    for refs, speed, oneway in ways:
+        refs = [r for r in refs if r in coords]
+        if len(refs) < 2:
+            continue
+        ids = [node_index.setdefault(r, len(node_index)) for r in refs]
+        leg_m = haversine_legs([(coords[r][1], coords[r][0]) for r in refs]) * 1000
+        leg_s = leg_m / (speed / 3.6)
+        pairs = list(zip(ids[:-1], ids[1:]))
+        if oneway == "-1":
+            pairs = [(b, a) for a, b in pairs]
+        for (a, b), m, s in zip(pairs, leg_m, leg_s):
+            tails.append(a); heads.append(b); weights.append(s); lengths.append(m)
+            if oneway not in ("yes", "true", "1", "-1"):
+                tails.append(b); heads.append(a); weights.append(s); lengths.append(m)
+
+    node_lat = np.empty(len(node_index))
+    node_lon = np.empty(len(node_index))
+    for ref, i in node_index.items():
+        node_lat[i], node_lon[i] = coords[ref]
+    save_graph(out_path, node_lat, node_lon, *build_csr(len(node_index), tails, heads, weights, lengths))
+    return len(node_index), len(tails)
+
+
+def _dedupe_edges(tails, heads, weights, lengths):
+    """
+    Drop self-loops and keep only the fastest of parallel edges.
+    """
+    keep = tails != heads
+    tails, heads, weights, lengths = tails[keep], heads[keep], weights[keep], lengths[keep]
+    order = np.lexsort((weights, heads, tails))
+    tails, heads, weights, lengths = tails[order], heads[order], weights[order], lengths[order]
+    first = np.ones(len(tails), dtype=bool)
+    first[1:] = (tails[1:] != tails[:-1]) | (heads[1:] != heads[:-1])
+    return tails[first], heads[first], weights[first], lengths[first]
+
+
+def _pairs_through(in_tails, in_mid, out_mid, out_heads, n):
+    """
+    Every two-edge path a -> m -> b formed by an incoming edge (in_tails[i] -> in_mid[i]) and an outgoing
+    edge (out_mid[j] -> out_heads[j]) that share the middle node m.
+    Returns: (index into the incoming edges, index into the outgoing edges) per path
+    """
+    order_in = np.argsort(in_mid, kind="stable")
+    order_out = np.argsort(out_mid, kind="stable")
+    count_out = np.bincount(out_mid, minlength=n)
+    start_out = np.cumsum(count_out) - count_out
+    repeat = count_out[in_mid[order_in]]
+    i = np.repeat(order_in, repeat)
+    offset = np.arange(repeat.sum()) - np.repeat(np.cumsum(repeat) - repeat, repeat)
+    j = order_out[start_out[in_mid[i]] + offset]
+    return i, j
+
+
+def _witness_distances(tails, heads, weights, sources, targets, bounds, n, hops, present, budget=1e8, block=64):
+    """
+    Witness search, all sources at once: the shortest distance from sources[i] to targets[i] over the graph
+    (tails, heads, weights) on the present nodes, following only paths no longer than the largest bound of their
+    source. Once sources x present nodes fits in budget the search is exact (scipy's Dijkstra on the compacted
+    graph); before that it is limited to hops edges and vectorized.
+    tails must be sorted; (sources, targets) pairs sorted and unique.
+    Returns: float64[len(sources)], inf where no such path was found
+    """
+    if not len(sources):
+        return np.empty(0)
+    roots, first = np.unique(sources, return_index=True)
+    if len(roots) * present.sum() <= budget:
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import dijkstra
+        local = np.cumsum(present) - 1
+        m = int(present.sum())
+        graph = csr_matrix((weights, (local[tails], local[heads])), shape=(m, m))
+        bound = np.maximum.reduceat(bounds, first)
+        row = np.searchsorted(roots, sources)
+        best = np.empty(len(sources))
+        at = np.empty(len(roots), dtype=np.int64)
+        by_bound = np.argsort(bound)  # blocks of similar bounds, so each search stops early
+        for r0 in range(0, len(roots), block):
+            batch = by_bound[r0:r0+block]
+            d = dijkstra(graph, directed=True, indices=local[roots[batch]], limit=bound[batch].max())
+            at[batch] = np.arange(len(batch))
+            pick = np.isin(row, batch)
+            best[pick] = d[at[row[pick]], local[targets[pick]]]
+        return best
+
+    out_start = np.searchsorted(tails, np.arange(n + 1))
+    limit = np.zeros(n)
+    limit[roots] = np.maximum.reduceat(bounds, first)
+    reached_key, reached_d = roots * n + roots, np.zeros(len(roots))
+    front_src, front_node, front_d = roots, roots, np.zeros(len(roots))
+    for _ in range(hops):
+        degree = out_start[front_node + 1] - out_start[front_node]
+        row = np.repeat(np.arange(len(front_node)), degree)
+        edge = out_start[front_node][row] + np.arange(degree.sum()) - np.repeat(np.cumsum(degree) - degree, degree)
+        src, node, d = front_src[row], heads[edge], front_d[row] + weights[edge]
+        keep = d <= limit[src]
+        src, node, d = src[keep], node[keep], d[keep]
+        key = src * n + node
+        order = np.lexsort((d, key))
+        key, src, node, d = key[order], src[order], node[order], d[order]
+        shortest = np.ones(len(key), dtype=bool)
+        shortest[1:] = key[1:] != key[:-1]
+        key, src, node, d = key[shortest], src[shortest], node[shortest], d[shortest]
+        pos = np.minimum(np.searchsorted(reached_key, key), len(reached_key) - 1)
+        known = reached_key[pos] == key
+        better = ~known | (d < reached_d[pos])
+        if not better.any():
+            break
+        reached_d[pos[known & better]] = d[known & better]
+        fresh = ~known
+        merged = np.concatenate([reached_key, key[fresh]])
+        order = np.argsort(merged, kind="stable")
+        reached_key, reached_d = merged[order], np.concatenate([reached_d, d[fresh]])[order]
+        front_src, front_node, front_d = src[better], node[better], d[better]
+    wanted = sources * n + targets
+    pos = np.minimum(np.searchsorted(reached_key, wanted), len(reached_key) - 1)
+    return np.where(reached_key[pos] == wanted, reached_d[pos], np.inf)
+
+
+class RoadNetwork:
+    """
+    Road graph with a contraction hierarchy for shortest-path queries.
+    """
+    def __init__(self, node_lat, node_lon, indptr, indices, weights, lengths):
+        self.node_lat = np.asarray(node_lat, dtype=np.float64)
+        self.node_lon = np.asarray(node_lon, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.lengths = np.asarray(lengths, dtype=np.float64)
+        self.n = len(self.node_lat)
+        self.rank = None
+        self.up = None    # CSR of edges u -> x with rank[x] > rank[u] (plus the uncontracted core's edges)
+        self.down = None  # CSR of reversed edges x -> u (original u -> x) with rank[u] > rank[x] (plus the core's)
+        self._node_index = None
+
+    @classmethod
+    def load(cls, path, build_ch=True):
+        """
+        Load a graph file; the contraction hierarchy is read from <name>.ch.npz when it is newer
+        than the graph, otherwise it is built and cached there.
+        """
+        g = np.load(path)
+        net = cls(g["node_lat"], g["node_lon"], g["indptr"], g["indices"], g["weights"], g["lengths"])
+        ch_path = str(path).replace(".npz", "") + ".ch.npz"
+        if os.path.exists(ch_path) and os.path.getmtime(ch_path) >= os.path.getmtime(path):
+            net.load_ch(ch_path)
+        elif build_ch:
+            net.contract()
+            net.save_ch(ch_path)
+        return net
+
+    # --- preprocessing ---
+
+    def contract(self, core_size=200, max_core_degree=40, witness_hops=5):
+        """
+        Build the contraction hierarchy in vectorized rounds. Each round contracts an independent set of nodes
+        (those whose edge difference plus contracted-neighbour count is lower than every neighbour's), all at
+        once: a shortcut u -> x through a contracted node is added unless the remaining graph, without that
+        round's nodes, has a path of at most witness_hops edges that is at least as short. Contraction stops at
+        core_size nodes, or when the remaining graph averages more than max_core_degree edges per node; the
+        core's edges go into both search directions (a core-based hierarchy), so queries stay exact.
+        """
+        n = self.n
+        tails = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.indptr))
+        tails, heads, weights, lengths = _dedupe_edges(tails, self.indices.astype(np.int64), self.weights, self.lengths)
+        alive = np.ones(n, dtype=bool)
+        contracted_neighbours = np.zeros(n, dtype=np.int64)
+        tiebreak = np.random.default_rng(0).permutation(n)
+        rank = np.full(n, -1, dtype=np.int64)
+        next_rank = 0
+        up_parts, down_parts = [], []
+
+        while alive.sum() > core_size and len(tails) <= max_core_degree * alive.sum():
+            in_degree = np.bincount(heads, minlength=n)
+            out_degree = np.bincount(tails, minlength=n)
+            priority = in_degree * out_degree - in_degree - out_degree + contracted_neighbours
+            key = (priority - priority.min()) * n + tiebreak
+            neighbour_min = np.full(n, np.iinfo(np.int64).max)
+            np.minimum.at(neighbour_min, tails, key[heads])
+            np.minimum.at(neighbour_min, heads, key[tails])
+            chosen = alive & (key < neighbour_min)
+
+            into, out_of = np.flatnonzero(chosen[heads]), np.flatnonzero(chosen[tails])
+            i, j = _pairs_through(tails[into], heads[into], tails[out_of], heads[out_of], n)
+            a, b = tails[into][i], heads[out_of][j]
+            via_w = weights[into][i] + weights[out_of][j]
+            via_l = lengths[into][i] + lengths[out_of][j]
+            distinct = a != b
+            a, b, via_w, via_l = _dedupe_edges(a[distinct], b[distinct], via_w[distinct], via_l[distinct])
+
+            # witnesses: short paths through the remaining graph, which no longer has this round's nodes
+            rest = ~(chosen[tails] | chosen[heads])
+            rt, rh, rw = tails[rest], heads[rest], weights[rest]
+            best = _witness_distances(rt, rh, rw, a, b, via_w, n, witness_hops, alive & ~chosen)
+            needed = best > via_w
+
+            # the round's nodes leave the graph; their neighbours are contracted later, so they rank higher
+            up_parts.append((tails[out_of], heads[out_of], weights[out_of], lengths[out_of]))
+            down_parts.append((heads[into], tails[into], weights[into], lengths[into]))
+            np.add.at(contracted_neighbours, heads[out_of], 1)
+            np.add.at(contracted_neighbours, tails[into], 1)
+            rank[chosen] = next_rank + np.arange(chosen.sum())
+            next_rank += int(chosen.sum())
+            alive &= ~chosen
+            tails, heads, weights, lengths = _dedupe_edges(
+                np.concatenate([rt, a[needed]]), np.concatenate([rh, b[needed]]),
+                np.concatenate([rw, via_w[needed]]), np.concatenate([lengths[rest], via_l[needed]]))
+
+        # the core: ranked last, its edges searched in both directions
+        rank[alive] = next_rank + np.arange(alive.sum())
+        up_parts.append((tails, heads, weights, lengths))
+        down_parts.append((heads, tails, weights, lengths))
+        self.rank = rank
+        self.up = build_csr(n, *(np.concatenate(c) for c in zip(*up_parts)))
+        self.down = build_csr(n, *(np.concatenate(c) for c in zip(*down_parts)))
+        self._prepare_search()
+        return self
+
+    def _prepare_search(self):
+        from scipy.sparse import csr_matrix
+        shape = (self.n, self.n)
+        self._up = (csr_matrix((np.asarray(self.up[2], dtype=np.float64), self.up[1], self.up[0]), shape=shape),
+                    csr_matrix((np.asarray(self.up[3], dtype=np.float64), self.up[1], self.up[0]), shape=shape))
+        self._down = (csr_matrix((np.asarray(self.down[2], dtype=np.float64), self.down[1], self.down[0]), shape=shape),
+                      csr_matrix((np.asarray(self.down[3], dtype=np.float64), self.down[1], self.down[0]), shape=shape))
+
+    def save_ch(self, path):
+        np.savez(path, rank=self.rank,
+                 up_indptr=self.up[0], up_indices=self.up[1], up_weights=self.up[2], up_lengths=self.up[3],
+                 down_indptr=self.down[0], down_indices=self.down[1], down_weights=self.down[2], down_lengths=self.down[3])
+
+    def load_ch(self, path):
+        ch = np.load(path)
+        self.rank = ch["rank"]
+        self.up = (ch["up_indptr"], ch["up_indices"], ch["up_weights"].astype(np.float64), ch["up_lengths"].astype(np.float64))
+        self.down = (ch["down_indptr"], ch["down_indices"], ch["down_weights"].astype(np.float64), ch["down_lengths"].astype(np.float64))
+        self._prepare_search()
+        return self
+
+    # --- queries ---
+
+    def nearest_nodes(self, lat, lon):
+        """
+        Index of the closest graph node for each query point, and the snapping distance in km.
+        """
+        if self._node_index is None:
+            self._node_index = SpatialIndex(np.column_stack([self.node_lat, self.node_lon]))
+        gap, idx = self._node_index.query_knn(np.column_stack([np.atleast_1d(lat), np.atleast_1d(lon)]), k=1)
+        return idx[:, 0], gap[:, 0]
+
+    @staticmethod
+    def _search_spaces(direction, nodes, block=16):
+        """
+        Dijkstra (scipy, compiled) over one direction of the hierarchy from each node, block rows at a time.
+        Meters along each shortest-time tree are summed by pointer jumping over the predecessor arrays.
+        Yields: (rows, reached, seconds, meters) per block, one entry per node a search reached (its source
+                included), ordered by row (the index into nodes) and then node
+        """
+        from scipy.sparse.csgraph import dijkstra
+        graph, lengths = direction
+        nodes = np.asarray(nodes, dtype=np.int64)
+        for r0 in range(0, len(nodes), block):
+            roots = nodes[r0:r0+block]
+            seconds, pred = dijkstra(graph, directed=True, indices=roots, return_predecessors=True)
+            n = seconds.shape[1]
+            pred[np.arange(len(roots)), roots] = roots  # the source is its own parent
+            rows, reached = np.nonzero(pred >= 0)
+            parents = pred[rows, reached].astype(np.int64)
+            own = parents == reached
+            total = np.asarray(lengths[parents, reached]).ravel()
+            total[own] = 0.0
+            flat = rows * n + reached  # ascending
+            up = np.searchsorted(flat, rows * n + parents)
+            up[own | (parents == roots[rows])] = -1
+            while (up >= 0).any():
+                step = up >= 0
+                total, up = total + np.where(step, total[np.maximum(up, 0)], 0.0), np.where(step, up[np.maximum(up, 0)], -1)
+            yield rows + r0, reached, seconds[rows, reached], total
+
+    def shortest_path(self, source, target):
+        """
+        Shortest travel time between two graph nodes.
+        Returns: (seconds, meters); (inf, inf) if unreachable
+        """
+        seconds, meters = self.many_to_many([source], [target])
+        return float(seconds[0, 0]), float(meters[0, 0])
+
+    def many_to_many(self, sources, targets):
+        """
+        Travel time and distance for every source/target node pair (bucket algorithm: one backward
+        search per target, kept as sparse buckets, then one forward search per source whose search space
+        is matched against every bucket at once).
+        Returns: (seconds, meters) as (len(sources), len(targets)) ndarrays
+        """
+        n_targets = len(targets)
+        rows, cols, b_sec, b_met = (np.concatenate(c) for c in zip(*self._search_spaces(self._down, targets)))
+        meet = np.unique(cols)  # nodes some backward search settled
+        bucket_sec = np.full((n_targets, len(meet)), np.inf)
+        bucket_met = np.full((n_targets, len(meet)), np.inf)
+        at = np.searchsorted(meet, cols)
+        bucket_sec[rows, at] = b_sec
+        bucket_met[rows, at] = b_met
+
+        seconds = np.full((len(sources), n_targets), np.inf)
+        meters = np.full((len(sources), n_targets), np.inf)
+        every = np.arange(n_targets)
+        for rows, reached, f_sec, f_met in self._search_spaces(self._up, sources):
+            at = np.minimum(np.searchsorted(meet, reached), len(meet) - 1)
+            hit = meet[at] == reached
+            rows, at, f_sec, f_met = rows[hit], at[hit], f_sec[hit], f_met[hit]
+            for i in np.unique(rows):
+                lo, hi = np.searchsorted(rows, [i, i + 1])
+                total = f_sec[lo:hi] + bucket_sec[:, at[lo:hi]]
+                k = total.argmin(axis=1)
+                seconds[i] = total[every, k]
+                meters[i] = f_met[lo:hi][k] + bucket_met[every, at[lo:hi][k]]
+        meters[~np.isfinite(seconds)] = np.inf
+        return seconds, meters
+
+    def matrix(self, points):
+        """
+        Road travel matrices between (lat, lon) points, including the access legs to the snapped nodes.
+        Returns: (seconds, meters) as (N, N) ndarrays
+        """
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        nodes, gap_km = self.nearest_nodes(pts[:, 0], pts[:, 1])
+        uniq, inv = np.unique(nodes, return_inverse=True)
+        sec, met = self.many_to_many(uniq, uniq)
+        sec, met = sec[np.ix_(inv, inv)], met[np.ix_(inv, inv)]
+        access_km = gap_km[:, None] + gap_km[None, :]
+        sec = sec + access_km / ACCESS_SPEED_KMPH * 3600
+        met = met + access_km * 1000
+        np.fill_diagonal(sec, 0.0)
+        np.fill_diagonal(met, 0.0)
+        return sec, met
+
+    def route(self, points):
+        """
+        points: list of (lon,lat) pairs in order (same convention as route_between_points)
+        Returns: dict with distance_m, duration_s, geometry (None); legs the graph cannot route (e.g. into a
+                 one-way dead end) are counted as straight lines driven at ACCESS_SPEED_KMPH
+        """
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        nodes, gap_km = self.nearest_nodes(pts[:, 1], pts[:, 0])
+        straight_km = haversine_legs(points)
+        uniq, inv = np.unique(nodes, return_inverse=True)
+        sec, met = self.many_to_many(uniq, uniq)
+        total_s = total_m = 0.0
+        for a, b, ga, gb, leg_km in zip(inv[:-1], inv[1:], gap_km[:-1], gap_km[1:], straight_km):
+            s, m = sec[a, b], met[a, b]
+            if not np.isfinite(s):
+                total_s += leg_km / ACCESS_SPEED_KMPH * 3600
+                total_m += leg_km * 1000
+                continue
+            total_s += s + (ga + gb) / ACCESS_SPEED_KMPH * 3600
+            total_m += m + (ga + gb) * 1000
+        return {"distance_m": float(total_m), "duration_s": float(total_s), "geometry": None}
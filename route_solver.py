@@ -0,0 +1,680 @@
+# route_solver.py
+import numpy as np
+from config import config
+from routing_client import travel_matrices, routing_backend
+from speed_profiles import get_speed_profiles, city_for_point
+
+# Improvements smaller than this (in matrix units) are treated as noise so the local search always terminates
+EPS = 1e-9
+
+def nearest_neighbour_tour(dist, start=0):
+    """
+    Greedy construction: repeatedly visit the closest unvisited node.
+    dist: (n, n) distance matrix
+    start: index of the depot / first node
+    Returns: list of node indices beginning with start
+    """
+    n = len(dist)
+    visited = np.zeros(n, dtype=bool)
+    tour = [start]
+    visited[start] = True
+    cur = start
+    for _ in range(n-1):
+        row = np.where(visited, np.inf, dist[cur])
+        cur = int(row.argmin())
+        visited[cur] = True
+        tour.append(cur)
+    return tour
+
+def cheapest_insertion_tour(dist, start=0):
+    """
+    Greedy construction: insert, at each step, the node whose cheapest insertion into the closed tour is minimal.
+    dist: (n, n) distance matrix
+    start: index of the depot / first node
+    Returns: list of node indices beginning with start
+    """
+    n = len(dist)
+    if n <= 2:
+        return [start] + [i for i in range(n) if i != start]
+    remaining = np.array([i for i in range(n) if i != start])
+    # seed with the node farthest from the depot so the tour spans the zone early
+    far = int(remaining[dist[start, remaining].argmax()])
+    tour = [start, far]
+    remaining = remaining[remaining != far]
+    while len(remaining):
+        a = np.array(tour)
+        b = np.roll(a, -1)
+        # cost[e, u] of inserting unvisited u into edge e = (a[e], b[e])
+        cost = dist[a][:, remaining] + dist[remaining][:, b].T - dist[a, b][:, None]
+        e, u = np.unravel_index(int(cost.argmin()), cost.shape)
+        tour.insert(int(e)+1, int(remaining[u]))
+        remaining = np.delete(remaining, u)
+    return tour
+
+def tour_length(tour, dist, closed=True):
+    """
+    Total length of a tour over dist; closed tours include the edge back to tour[0].
+    """
+    t = np.asarray(tour)
+    if len(t) < 2:
+        return 0.0
+    total = float(dist[t[:-1], t[1:]].sum())
+    if closed:
+        total += float(dist[t[-1], t[0]])
+    return total
+
+def two_opt(tour, dist):
+    """
+    2-opt local search on a closed tour, keeping tour[0] fixed.
+    For each edge the best reconnection over all other edges is evaluated in one vectorized step.
+    Assumes a symmetric distance matrix.
+    """
+    t = np.array(tour)
+    n = len(t)
+    if n < 4:
+        return list(t)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(n-2):
+            a, b = t[i], t[i+1]
+            j = np.arange(i+2, n if i > 0 else n-1)
+            if len(j) == 0:
+                continue
+            c = t[j]
+            d = t[(j+1) % n]
+            delta = dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+            k = int(delta.argmin())
+            if delta[k] < -EPS:
+                jj = int(j[k])
+                t[i+1:jj+1] = t[i+1:jj+1][::-1]
+                improved = True
+    return list(t)
+
+def or_opt(tour, dist, max_segment=3):
+    """
+    Or-opt local search on a closed tour, keeping tour[0] fixed.
+    Moves segments of 1..max_segment consecutive nodes (optionally reversed) to the best other edge.
+    """
+    t = list(tour)
+    n = len(t)
+    if n < 4:
+        return t
+    improved = True
+    while improved:
+        improved = False
+        for seg_len in range(1, min(max_segment, n-2)+1):
+            i = 1
+            while i + seg_len <= n:
+                arr = np.array(t)
+                seg = arr[i:i+seg_len]
+                p, nx = arr[i-1], arr[(i+seg_len) % n]
+                s0, s1 = seg[0], seg[-1]
+                gain = dist[p, s0] + dist[s1, nx] - dist[p, nx]
+                # candidate edges (c, d) of the tour with the segment removed
+                rest = np.concatenate([arr[:i], arr[i+seg_len:]])
+                c = rest
+                d = np.roll(rest, -1)
+                fwd = dist[c, s0] + dist[s1, d] - dist[c, d]
+                rev = dist[c, s1] + dist[s0, d] - dist[c, d]
+                # reinserting into the edge it was cut from is a no-op
+                fwd[i-1] = np.inf
+                rev[i-1] = np.inf
+                best_f, best_r = int(fwd.argmin()), int(rev.argmin())
+                if fwd[best_f] <= rev[best_r]:
+                    e, add, new_seg = best_f, fwd[best_f], list(seg)
+                else:
+                    e, add, new_seg = best_r, rev[best_r], list(seg[::-1])
+                if add - gain < -EPS:
+                    rest = list(rest)
+                    t = rest[:e+1] + [int(x) for x in new_seg] + rest[e+1:]
+                    improved = True
+                else:
+                    i += 1
+    return [int(x) for x in t]
+
+def solve_tsp(dist, start=0, construction="nearest_neighbour", max_rounds=10):
+    """
+    Deterministic TSP heuristic: greedy construction followed by alternating 2-opt and Or-opt
+    until neither improves the closed tour (or max_rounds is reached).
+
+    dist: (n, n) symmetric distance matrix
+    start: index of the depot; the returned tour starts (and implicitly ends) there
+    construction: "nearest_neighbour" or "cheapest_insertion"
+    Returns: list of node indices beginning with start
+    """
+    dist = np.asarray(dist, dtype=np.float64)
+    if len(dist) <= 3:
+        return nearest_neighbour_tour(dist, start) if len(dist) else []
+    if construction == "cheapest_insertion":
+        tour = cheapest_insertion_tour(dist, start)
+    else:
+        tour = nearest_neighbour_tour(dist, start)
+    best = tour_length(tour, dist)
+    for _ in range(max_rounds):
+        tour = or_opt(two_opt(tour, dist), dist)
+        length = tour_length(tour, dist)
+        if length >= best - EPS:
+            break
+        best = length
+    return tour
+
+def _symmetric_km(coords):
+    """
+    Distance matrix from the active routing backend, symmetrized because 2-opt and the savings
+    heuristics assume d(a, b) == d(b, a).
+    """
+    km, _ = travel_matrices(coords)
+    return (km + km.T) / 2
+
+def _latlon(deliveries):
+    """
+    (lat, lon) list of delivery dicts or of an order_table.OrderTable (read column-wise).
+    """
+    if hasattr(deliveries, "coords"):
+        return [tuple(p) for p in deliveries.coords().tolist()]
+    return [(d["lat"], d["lon"]) for d in deliveries]
+
+def order_deliveries(deliveries, depot=None, construction="nearest_neighbour"):
+    """
+    Order deliveries into a short depot-to-depot tour.
+
+    deliveries: list of dicts with keys id, lat, lon (or an order_table.OrderTable)
+    depot: (lat, lon) of the start/end depot; if None the tour starts at the first delivery
+    Returns: list of delivery ids in visit order (depot excluded)
+    """
+    if not deliveries:
+        return []
+    coords = _latlon(deliveries)
+    if depot is not None:
+        coords = [(depot[0], depot[1])] + coords
+    dist = _symmetric_km(coords)
+    tour = solve_tsp(dist, start=0, construction=construction)
+    if depot is not None:
+        return [deliveries[i-1]["id"] for i in tour if i != 0]
+    return [deliveries[i]["id"] for i in tour]
+
+def clarke_wright_routes(dist, demands, capacity, depot=0):
+    """
+    Clarke-Wright parallel savings construction for the capacitated VRP.
+
+    dist: (n, n) symmetric distance matrix including the depot
+    demands: length-n demands (the depot entry is ignored)
+    capacity: vehicle capacity in the same units as demands
+    Returns: list of routes, each a list of customer indices (depot excluded)
+    """
+    n = len(dist)
+    demands = np.asarray(demands, dtype=np.float64)
+    customers = [i for i in range(n) if i != depot]
+    routes = {i: [i] for i in customers}
+    route_of = {i: i for i in customers}
+    load = {i: demands[i] for i in customers}
+
+    # savings s_ij = d(0,i) + d(0,j) - d(i,j) for every customer pair, largest first
+    c = np.array(customers)
+    if len(c) < 2:
+        return [r for r in routes.values()]
+    ii, jj = np.triu_indices(len(c), k=1)
+    ci, cj = c[ii], c[jj]
+    savings = dist[depot, ci] + dist[depot, cj] - dist[ci, cj]
+    order = np.argsort(-savings, kind="stable")
+
+    for k in order:
+        if savings[k] <= EPS:
+            break
+        i, j = int(ci[k]), int(cj[k])
+        ri, rj = route_of[i], route_of[j]
+        if ri == rj or load[ri] + load[rj] > capacity:
+            continue
+        a, b = routes[ri], routes[rj]
+        # i and j must both be route ends; orient so that a ends with i and b starts with j
+        if a[-1] != i:
+            if a[0] != i:
+                continue
+            a = a[::-1]
+        if b[0] != j:
+            if b[-1] != j:
+                continue
+            b = b[::-1]
+        merged = a + b
+        routes[ri] = merged
+        load[ri] += load[rj]
+        del routes[rj], load[rj]
+        for node in b:
+            route_of[node] = ri
+    return list(routes.values())
+
+def _route_cost(route, dist, depot=0):
+    return tour_length([depot] + list(route), dist)
+
+def _merge_to_fleet_size(routes, dist, demands, capacity, n_vehicles, depot=0):
+    """
+    Merge routes pairwise (cheapest feasible concatenation first) until at most n_vehicles remain.
+    Routes that cannot be merged without exceeding capacity are left as they are.
+    """
+    routes = [list(r) for r in routes]
+    while len(routes) > n_vehicles:
+        loads = [float(demands[r].sum()) for r in routes]
+        best = None
+        for x in range(len(routes)):
+            for y in range(len(routes)):
+                if x == y or loads[x] + loads[y] > capacity:
+                    continue
+                a, b = routes[x], routes[y]
+                delta = dist[a[-1], b[0]] - dist[a[-1], depot] - dist[depot, b[0]]
+                if best is None or delta < best[0]:
+                    best = (delta, x, y)
+        if best is None:
+            print(f"Fleet of {n_vehicles} vehicles cannot carry the zone within capacity {capacity}; using {len(routes)} routes")
+            break
+        _, x, y = best
+        routes[x] = routes[x] + routes[y]
+        del routes[y]
+    return routes
+
+def _route_arrays(routes, depot=0):
+    """
+    Flatten routes into per-customer arrays: node, route index, predecessor and successor (depot at both ends).
+    """
+    node, rid, prev, nxt = [], [], [], []
+    for r, route in enumerate(routes):
+        for p, u in enumerate(route):
+            node.append(u)
+            rid.append(r)
+            prev.append(route[p-1] if p > 0 else depot)
+            nxt.append(route[p+1] if p+1 < len(route) else depot)
+    return np.array(node), np.array(rid), np.array(prev), np.array(nxt)
+
+def _route_edges(routes, depot=0):
+    """
+    All edges (c, d) of all routes, closed through the depot, with their route index and position.
+    """
+    c, d, rid, pos = [], [], [], []
+    for r, route in enumerate(routes):
+        tour = [depot] + list(route) + [depot]
+        for p in range(len(tour)-1):
+            c.append(tour[p])
+            d.append(tour[p+1])
+            rid.append(r)
+            pos.append(p)
+    return np.array(c), np.array(d), np.array(rid), np.array(pos)
+
+def relocate(routes, dist, demands, capacity, depot=0):
+    """
+    Inter-route relocate: move a single customer to the cheapest feasible edge of another route.
+    Each customer's best move is found with one vectorized evaluation over all edges.
+    """
+    routes = [list(r) for r in routes]
+    improved = True
+    while improved:
+        improved = False
+        loads = np.array([demands[r].sum() for r in routes])
+        node, rid, prev, nxt = _route_arrays(routes, depot)
+        c, d, erid, epos = _route_edges(routes, depot)
+        for k in range(len(node)):
+            u, r = node[k], rid[k]
+            gain = dist[prev[k], u] + dist[u, nxt[k]] - dist[prev[k], nxt[k]]
+            add = dist[c, u] + dist[u, d] - dist[c, d]
+            feasible = (erid != r) & (loads[erid] + demands[u] <= capacity)
+            if not feasible.any():
+                continue
+            add = np.where(feasible, add, np.inf)
+            e = int(add.argmin())
+            if add[e] - gain < -EPS:
+                target = int(erid[e])
+                routes[r].remove(u)
+                routes[target].insert(int(epos[e]), int(u))
+                routes = [route for route in routes if route]
+                improved = True
+                break
+    return routes
+
+def exchange(routes, dist, demands, capacity, depot=0):
+    """
+    Inter-route exchange: swap two customers of different routes when it shortens the total and both loads stay feasible.
+    Each customer's best partner is found with one vectorized evaluation over all other customers.
+    """
+    routes = [list(r) for r in routes]
+    improved = True
+    while improved:
+        improved = False
+        loads = np.array([demands[r].sum() for r in routes])
+        node, rid, prev, nxt = _route_arrays(routes, depot)
+        for k in range(len(node)):
+            u, r = node[k], rid[k]
+            v = node
+            # u takes v's slot and v takes u's slot
+            delta = (dist[prev[k], v] + dist[v, nxt[k]] - dist[prev[k], u] - dist[u, nxt[k]]
+                     + dist[prev, u] + dist[u, nxt] - dist[prev, v] - dist[v, nxt])
+            feasible = ((rid != r)
+                        & (loads[r] - demands[u] + demands[v] <= capacity)
+                        & (loads[rid] - demands[v] + demands[u] <= capacity))
+            if not feasible.any():
+                continue
+            delta = np.where(feasible, delta, np.inf)
+            m = int(delta.argmin())
+            if delta[m] < -EPS:
+                s = int(rid[m])
+                iu, iv = routes[r].index(u), routes[s].index(v[m])
+                routes[r][iu], routes[s][iv] = int(v[m]), int(u)
+                improved = True
+                break
+    return routes
+
+def _improve_route(route, dist, depot=0):
+    """
+    Intra-route 2-opt / Or-opt on a single vehicle route.
+    """
+    tour = or_opt(two_opt([depot] + list(route), dist), dist)
+    return [u for u in tour if u != depot]
+
+def solve_cvrp(dist, demands, capacity, n_vehicles=None, depot=0, max_rounds=10):
+    """
+    Capacitated VRP heuristic: Clarke-Wright savings construction, then alternating inter-route
+    relocate/exchange and intra-route 2-opt/Or-opt until the total distance stops improving.
+
+    dist: (n, n) symmetric distance matrix including the depot
+    demands: length-n demands in capacity units (the depot entry is ignored)
+    capacity: vehicle capacity
+    n_vehicles: maximum number of routes; None leaves the fleet size to the savings construction
+    Returns: list of routes, each a list of customer indices in visit order (depot excluded)
+    """
+    dist = np.asarray(dist, dtype=np.float64)
+    demands = np.asarray(demands, dtype=np.float64)
+    customers = [i for i in range(len(dist)) if i != depot]
+    if not customers:
+        return []
+    if (demands[customers] > capacity).any():
+        raise ValueError(f"An order's package volume exceeds the vehicle capacity of {capacity}")
+
+    routes = clarke_wright_routes(dist, demands, capacity, depot)
+    if n_vehicles is not None and len(routes) > n_vehicles:
+        routes = _merge_to_fleet_size(routes, dist, demands, capacity, n_vehicles, depot)
+
+    best = sum(_route_cost(r, dist, depot) for r in routes)
+    for _ in range(max_rounds):
+        routes = relocate(routes, dist, demands, capacity, depot)
+        routes = exchange(routes, dist, demands, capacity, depot)
+        routes = [_improve_route(r, dist, depot) for r in routes]
+        cost = sum(_route_cost(r, dist, depot) for r in routes)
+        if cost >= best - EPS:
+            break
+        best = cost
+    return routes
+
+def split_deliveries(deliveries, depot, n_vehicles=None, capacity=None, size_units=None):
+    """
+    Split a zone's deliveries across vehicles and order each vehicle's stops.
+
+    deliveries: list of dicts with keys id, lat, lon, package_size (or an order_table.OrderTable)
+    depot: (lat, lon) all vehicles start and end at
+    n_vehicles: maximum number of vehicles (None = as many as the savings construction needs)
+    capacity: vehicle capacity in package_size units
+    size_units: mapping of package_size -> units (defaults to config.PACKAGE_SIZE_UNITS)
+    Returns: list of delivery id lists, one per vehicle, in visit order
+    """
+    if not deliveries:
+        return []
+    size_units = size_units or config.PACKAGE_SIZE_UNITS
+    coords = [(depot[0], depot[1])] + _latlon(deliveries)
+    demands = [0] + [size_units.get(d.get("package_size", "medium"), size_units.get("medium", 1)) for d in deliveries]
+    if capacity is None:
+        capacity = config.VEHICLE_CAPACITY
+    dist = _symmetric_km(coords)
+    routes = solve_cvrp(dist, demands, capacity, n_vehicles)
+    return [[deliveries[i-1]["id"] for i in route] for route in routes]
+
+def parse_window(value):
+    """
+    Convert a delivery window bound to minutes after midnight.
+    value: "HH:MM" string, a number of minutes, or None
+    Returns: float minutes, or None when the bound is not set
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        hh, mm = value.strip().split(":")[:2]
+        return int(hh)*60 + int(mm)
+    return float(value)
+
+def has_time_windows(deliveries):
+    """
+    True if any delivery carries a window_start or window_end.
+    """
+    if hasattr(deliveries, "has_time_windows"):  # OrderTable
+        return deliveries.has_time_windows()
+    return any(d.get("window_start") is not None or d.get("window_end") is not None for d in deliveries)
+
+def _leg_after(minutes, depart, hourly):
+    """
+    Driving time of legs with the given base minutes that leave at minute depart of the day (scalars or arrays):
+    the base time scaled by the time-of-day multiplier hourly[(depart // 60) % 24]. hourly=None leaves it as is.
+    """
+    if hourly is None:
+        return minutes
+    depart = np.where(np.isfinite(depart), depart, 0)
+    return minutes * hourly[(depart // 60).astype(np.int64) % 24]
+
+def _leg_before(minutes, arrive, hourly):
+    """
+    Driving time of legs that must arrive by minute arrive, scaled at their estimated departure hour.
+    """
+    if hourly is None:
+        return minutes
+    return _leg_after(minutes, arrive - _leg_after(minutes, arrive, hourly), hourly)
+
+def _tw_schedule(tour, travel, service, early, late, hourly=None):
+    """
+    Forward/backward time bookkeeping for one route (tour[0] is the depot, the route returns to it).
+
+    Forward: departure D[k] = max(arrival, early) + service at tour position k.
+    Backward: Z[k] = latest service start at position k that keeps the rest of the route feasible;
+    position len(tour) is the return to the depot.
+    With both arrays any single insertion can be checked in O(1).
+    hourly: 24 time-of-day multipliers; each leg is scaled by the one for the hour it is driven
+    Returns: D, Z, feasible
+    """
+    m = len(tour)
+    D = np.empty(m)
+    start = early[tour[0]]
+    feasible = True
+    for k in range(m):
+        if k > 0:
+            start = max(D[k-1] + _leg_after(travel[tour[k-1], tour[k]], D[k-1], hourly), early[tour[k]])
+            feasible &= start <= late[tour[k]] + EPS
+        D[k] = start + service[tour[k]]
+    Z = np.empty(m+1)
+    depot = tour[0]
+    Z[m] = late[depot]
+    feasible &= D[m-1] + _leg_after(travel[tour[m-1], depot], D[m-1], hourly) <= Z[m] + EPS
+    for k in range(m-1, 0, -1):
+        nxt = tour[k+1] if k+1 < m else depot
+        Z[k] = min(late[tour[k]], Z[k+1] - _leg_before(travel[tour[k], nxt], Z[k+1], hourly) - service[tour[k]])
+    Z[0] = late[depot]
+    return D, Z, bool(feasible)
+
+def _tw_insertions(u, tour, D, Z, travel, service, early, late, hourly=None):
+    """
+    Cost increase and O(1) feasibility of inserting u after every position of a route, as vectors.
+    """
+    a = np.asarray(tour)
+    b = np.append(a[1:], a[0])
+    added = travel[a, u] + travel[u, b] - travel[a, b]
+    start_u = np.maximum(D + _leg_after(travel[a, u], D, hourly), early[u])
+    arrive_next = start_u + service[u] + _leg_after(travel[u, b], start_u + service[u], hourly)
+    feasible = (start_u <= late[u] + EPS) & (arrive_next <= Z[1:] + EPS)
+    return added, feasible
+
+def solve_vrptw(travel, early, late, service=None, demands=None, capacity=None, n_vehicles=None,
+                priority_rank=None, depot=0, max_rounds=10, hourly=None):
+    """
+    Routing with delivery time windows (VRPTW).
+
+    Customers are inserted at their cheapest feasible position (windowed, high-priority customers first),
+    then improved with relocate moves. Every move is checked in O(1) against the forward departure /
+    backward latest-start arrays of the target route, so no candidate is re-simulated.
+    Assumes travel times satisfy the triangle inequality (removing a stop never delays the rest).
+
+    travel: (n, n) travel time matrix in minutes including the depot
+    hourly: optional 24 time-of-day multipliers (speed_profiles); windows are checked with every leg scaled
+            by the multiplier of the hour it is driven, while insertion costs stay in base minutes
+    early, late: length-n window bounds in minutes after midnight; early[depot] is the shift start,
+                 late[depot] the shift end (np.inf for none)
+    service: length-n service times in minutes (default 0)
+    demands, capacity: optional package volumes and vehicle capacity
+    n_vehicles: maximum number of routes (None = open routes as needed)
+    priority_rank: length-n insertion priority (0 = high); lower ranks are inserted first
+    Returns: (routes, missed) where routes are customer index lists in visit order and
+             missed are customers that could not be served inside their window
+    """
+    travel = np.asarray(travel, dtype=np.float64)
+    n = len(travel)
+    early = np.asarray(early, dtype=np.float64)
+    late = np.asarray(late, dtype=np.float64)
+    service = np.zeros(n) if service is None else np.asarray(service, dtype=np.float64)
+    demands = np.zeros(n) if demands is None else np.asarray(demands, dtype=np.float64)
+    capacity = np.inf if capacity is None else capacity
+    rank = np.zeros(n) if priority_rank is None else np.asarray(priority_rank, dtype=np.float64)
+    customers = [i for i in range(n) if i != depot]
+    windowed = np.isfinite(late) | (early > early[depot])
+
+    # tightest windows and most important customers are placed while there is still room
+    order = sorted(customers, key=lambda i: (not windowed[i], rank[i], late[i], early[i]))
+    routes, schedules, loads, missed = [], [], [], []
+
+    def best_insertion(u, skip=None):
+        best = None
+        for r, route in enumerate(routes):
+            if r == skip or loads[r] + demands[u] > capacity:
+                continue
+            D, Z, _ = schedules[r]
+            added, feasible = _tw_insertions(u, [depot] + route, D, Z, travel, service, early, late, hourly)
+            if not feasible.any():
+                continue
+            added = np.where(feasible, added, np.inf)
+            p = int(added.argmin())
+            if best is None or added[p] < best[0]:
+                best = (float(added[p]), r, p)
+        return best
+
+    for u in order:
+        best = best_insertion(u)
+        if best is None and (n_vehicles is None or len(routes) < n_vehicles):
+            D, Z, ok = _tw_schedule([depot, u], travel, service, early, late, hourly)
+            if ok:
+                routes.append([u])
+                schedules.append((D, Z, ok))
+                loads.append(demands[u])
+                continue
+        if best is None:
+            missed.append(u)
+            continue
+        _, r, p = best
+        routes[r].insert(p, u)
+        loads[r] += demands[u]
+        schedules[r] = _tw_schedule([depot] + routes[r], travel, service, early, late, hourly)
+
+    # relocate: move a customer to a cheaper feasible slot in any route
+    for _ in range(max_rounds):
+        improved = False
+        for r in range(len(routes)):
+            k = 0
+            while k < len(routes[r]):
+                route = routes[r]
+                u = route[k]
+                prev = route[k-1] if k > 0 else depot
+                nxt = route[k+1] if k+1 < len(route) else depot
+                gain = travel[prev, u] + travel[u, nxt] - travel[prev, nxt]
+                # evaluate against the route without u (its own schedule changes, the others do not)
+                without = route[:k] + route[k+1:]
+                saved = routes[r], schedules[r], loads[r]
+                routes[r] = without
+                schedules[r] = _tw_schedule([depot] + without, travel, service, early, late, hourly)
+                loads[r] -= demands[u]
+                best = best_insertion(u)
+                if best is not None and best[0] - gain < -EPS and (best[1] != r or best[2] != k):
+                    _, t, p = best
+                    routes[t].insert(p, u)
+                    loads[t] += demands[u]
+                    schedules[t] = _tw_schedule([depot] + routes[t], travel, service, early, late, hourly)
+                    improved = True
+                else:
+                    routes[r], schedules[r], loads[r] = saved
+                    k += 1
+        routes_nonempty = [i for i, route in enumerate(routes) if route]
+        routes = [routes[i] for i in routes_nonempty]
+        schedules = [schedules[i] for i in routes_nonempty]
+        loads = [loads[i] for i in routes_nonempty]
+        if not improved:
+            break
+
+    # a freed-up slot may now fit a customer that was missed during construction
+    for u in list(missed):
+        best = best_insertion(u)
+        if best is not None:
+            _, r, p = best
+            routes[r].insert(p, u)
+            loads[r] += demands[u]
+            schedules[r] = _tw_schedule([depot] + routes[r], travel, service, early, late, hourly)
+            missed.remove(u)
+    return routes, missed
+
+def order_deliveries_tw(deliveries, depot, start_time=None, n_vehicles=1, capacity=None,
+                        avg_speed_kmph=30, service_min=0, size_units=None):
+    """
+    Order deliveries respecting optional window_start / window_end ("HH:MM") fields.
+
+    deliveries: list of dicts with keys id, lat, lon and optionally window_start, window_end, priority, package_size
+                (or an order_table.OrderTable)
+    depot: (lat, lon) all vehicles start and end at
+    start_time: datetime the vehicles leave the depot (default: now)
+    n_vehicles: maximum number of vehicles
+    capacity: vehicle capacity in package_size units (None = unlimited)
+    avg_speed_kmph: speed used to turn haversine distances into travel minutes when the routing
+                    backend is haversine (road backends supply their own travel times)
+    Returns: list of delivery id lists, one per vehicle. Deliveries that cannot be served inside their
+             window are appended to the vehicle where they add the least distance (they will arrive late).
+    """
+    if not deliveries:
+        return []
+    from datetime import datetime
+    start_time = start_time or datetime.now()
+    size_units = size_units or config.PACKAGE_SIZE_UNITS
+    priority_map = {"high": 0, "medium": 1, "low": 2}
+
+    coords = [(depot[0], depot[1])] + _latlon(deliveries)
+    km, travel = travel_matrices(coords)
+    if routing_backend() != "road_network":
+        travel = km / avg_speed_kmph * 60
+    # time-of-day slowdown, applied per leg for the hour it is driven
+    hourly = np.asarray(get_speed_profiles().hourly(city_for_point(depot[0], depot[1])), dtype=np.float64)
+    n = len(coords)
+    early = np.zeros(n)
+    late = np.full(n, np.inf)
+    early[0] = start_time.hour*60 + start_time.minute + start_time.second/60
+    for i, d in enumerate(deliveries, start=1):
+        ws, we = parse_window(d.get("window_start")), parse_window(d.get("window_end"))
+        early[i] = ws if ws is not None else 0
+        late[i] = we if we is not None else np.inf
+    service = np.full(n, float(service_min))
+    service[0] = 0
+    demands = [0] + [size_units.get(d.get("package_size", "medium"), 1) for d in deliveries]
+    rank = [0] + [priority_map.get(d.get("priority", "medium"), 1) for d in deliveries]
+
+    routes, missed = solve_vrptw(travel, early, late, service, demands, capacity, n_vehicles, rank, hourly=hourly)
+    if missed:
+        print(f"Time windows cannot be met for: {[deliveries[u-1]['id'] for u in missed]}")
+        if not routes:
+            routes = [[]]
+        for u in missed:
+            # cheapest position ignoring windows; the plan's ETAs will flag the late arrival
+            best = None
+            for r, route in enumerate(routes):
+                tour = np.array([0] + route)
+                nxt = np.append(tour[1:], 0)
+                added = travel[tour, u] + travel[u, nxt] - travel[tour, nxt]
+                p = int(added.argmin())
+                if best is None or added[p] < best[0]:
+                    best = (added[p], r, p)
+            routes[best[1]].insert(best[2], u)
+    return [[deliveries[i-1]["id"] for i in route] for route in routes if route]
@@ -1,9 +1,58 @@
 # routing_client.py
 import os
-import requests
+import numpy as np
+from config import config
+from http_client import get_client
+from cache import TieredCache, make_key
 from math import radians, cos, sin, asin, sqrt
 
 ORS_API_KEY = os.getenv("ORS_API_KEY")  # optional: https://openrouteservice.org/
+EARTH_RADIUS_KM = 6371.0
+
+FALLBACK_SPEED_KMPH = 30
+
+_route_cache = None
+_road_network = None
+
+def routing_backend():
+    """
+    Resolve config.ROUTING_BACKEND ("auto" picks ORS, then haversine; the offline road graph is opt-in).
+    """
+    backend = config.ROUTING_BACKEND
+    if backend == "auto":
+        return "ors" if ORS_API_KEY else "haversine"
+    return backend
+
+def get_road_network():
+    """
+    Process-wide offline road graph (with its contraction hierarchy) loaded from config.ROAD_GRAPH_FILE.
+    """
+    global _road_network
+    if _road_network is None:
+        from road_network import RoadNetwork
+        _road_network = RoadNetwork.load(config.ROAD_GRAPH_FILE)
+    return _road_network
+
+def get_route_cache():
+    """
+    Process-wide route cache: in-memory LRU in front of an on-disk SQLite store (config.ROUTE_CACHE_*).
+    """
+    global _route_cache
+    if _route_cache is None:
+        _route_cache = TieredCache(
+            config.ROUTE_CACHE_FILE,
+            max_entries=config.ROUTE_CACHE_MEMORY_ENTRIES,
+            max_bytes=config.ROUTE_CACHE_MAX_BYTES,
+            ttl_s=config.ROUTE_CACHE_TTL_S,
+        )
+    return _route_cache
+
+def route_cache_key(points, profile="driving-car"):
+    """
+    Cache key for a route: the profile plus the coordinate sequence rounded to config.ROUTE_CACHE_COORD_DECIMALS.
+    """
+    nd = config.ROUTE_CACHE_COORD_DECIMALS
+    return make_key(profile, [[round(float(p[0]), nd), round(float(p[1]), nd)] for p in points])
 
 def haversine_km(lat1, lon1, lat2, lon2):
     # returns km
@@ -15,25 +64,212 @@ def haversine_km(lat1, lon1, lat2, lon2):
     r = 6371
     return c * r
 
-def route_between_points(points):
+def haversine_matrix(origins, destinations=None, dtype=np.float64):
+    """
+    Pairwise great-circle distances in km, computed in one vectorized pass.
+
+    origins: array-like of N (lat, lon) pairs
+    destinations: array-like of M (lat, lon) pairs; if None, origins are used (N x N)
+    dtype: np.float32 or np.float64 for the returned matrix
+    Returns: (N, M) ndarray of distances in km
+    """
+    o = np.radians(np.asarray(origins, dtype=np.float64).reshape(-1, 2))
+    d = o if destinations is None else np.radians(np.asarray(destinations, dtype=np.float64).reshape(-1, 2))
+    lat1, lon1 = o[:, 0:1], o[:, 1:2]
+    lat2, lon2 = d[:, 0][None, :], d[:, 1][None, :]
+    a = np.sin((lat2 - lat1)/2)**2 + np.cos(lat1)*np.cos(lat2)*np.sin((lon2 - lon1)/2)**2
+    dist = 2*EARTH_RADIUS_KM*np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return dist.astype(dtype, copy=False)
+
+def haversine_legs(points):
+    """
+    Distances in km between consecutive points of a path.
+
+    points: array-like of (lon,lat) pairs in order (same convention as route_between_points)
+    Returns: ndarray of len(points)-1 leg distances in km
+    """
+    p = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+    if len(p) < 2:
+        return np.zeros(0)
+    lon, lat = p[:, 0], p[:, 1]
+    a = np.sin(np.diff(lat)/2)**2 + np.cos(lat[:-1])*np.cos(lat[1:])*np.sin(np.diff(lon)/2)**2
+    return 2*EARTH_RADIUS_KM*np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def haversine_route(points, avg_speed_kmph=30):
+    """
+    Straight-line route estimate: sum of haversine legs driven at a constant average speed.
+    points: list of (lon,lat) pairs in order
+    Returns: dict with distance_m, duration_s, geometry (None)
+    """
+    total_km = float(haversine_legs(points).sum())
+    duration_hours = total_km / avg_speed_kmph if avg_speed_kmph > 0 else 0
+    return {"distance_m": total_km*1000, "duration_s": duration_hours*3600, "geometry": None}
+
+def route_between_points(points, profile="driving-car", use_cache=True):
     """
     points: list of (lon,lat) pairs in order
+    profile: ORS routing profile
+    use_cache: serve repeat requests for the same (rounded) stop sequence from the route cache
     Returns: dict with distance_m, duration_s, geometry (encoded or list)
-    If ORS API key is available, use it. Otherwise, produce naive estimate using haversine + speeds.
+    The backend follows config.ROUTING_BACKEND: ORS (needs an API key), the offline road graph,
+    or a naive estimate using haversine + speeds.
     """
-    if ORS_API_KEY:
-        url = "https://api.openrouteservice.org/v2/directions/driving-car/geojson"
+    backend = routing_backend()
+    if backend == "road_network":
+        return get_road_network().route(points)
+    if backend == "ors" and ORS_API_KEY:
+        key = route_cache_key(points, profile)
+        if use_cache:
+            cached = get_route_cache().get(key)
+            # entries priced from a matrix by routes_between_points have no geometry; fetch it once here
+            if cached is not None and cached.get("geometry") is not None:
+                return cached
+        url = f"{config.ORS_BASE_URL}/v2/directions/{profile}/geojson"
         headers = {"Authorization": ORS_API_KEY, "Content-Type": "application/json"}
         coords = [[p[0], p[1]] for p in points]
-        resp = requests.post(url, json={"coordinates": coords}, headers=headers, timeout=20)
-        resp.raise_for_status()
-        j = resp.json()
+        j = get_client().post_json(url, {"coordinates": coords}, headers=headers, timeout=20)
         props = j["features"][0]["properties"]["summary"]
-        return {"distance_m": props["distance"], "duration_s": props["duration"], "geometry": j["features"][0]["geometry"]}
+        route = {"distance_m": props["distance"], "duration_s": props["duration"], "geometry": j["features"][0]["geometry"]}
+        if use_cache:
+            get_route_cache().set(key, route)
+        return route
     # Fallback: naïve sum of haversine distances and assume average speed 30 km/h
-    total_km = 0
-    for i in range(len(points)-1):
-        total_km += haversine_km(points[i][1], points[i][0], points[i+1][1], points[i+1][0])
-    avg_speed_kmph = 30
-    duration_hours = total_km / avg_speed_kmph if avg_speed_kmph > 0 else 0
-    return {"distance_m": total_km*1000, "duration_s": duration_hours*3600, "geometry": None}
+    return haversine_route(points, avg_speed_kmph=FALLBACK_SPEED_KMPH)
+
+def ors_matrix(points, profile="driving-car", pairs=None):
+    """
+    Road distance/duration matrix for many points: one ORS matrix request, or, above
+    config.ORS_MATRIX_MAX_LOCATIONS points, concurrent requests over source x destination blocks.
+    points: list of (lon,lat) pairs
+    pairs: (source, destination) index pairs actually needed; blocks holding none of them are not requested
+           (their entries stay NaN)
+    Returns: (distances_m, durations_s) as (N, N) ndarrays; NaN where ORS found no route
+    """
+    url = f"{config.ORS_BASE_URL}/v2/matrix/{profile}"
+    headers = {"Authorization": ORS_API_KEY, "Content-Type": "application/json"}
+    n = len(points)
+    if n <= config.ORS_MATRIX_MAX_LOCATIONS:
+        payload = {"locations": [[p[0], p[1]] for p in points], "metrics": ["distance", "duration"]}
+        j = get_client().post_json(url, payload, headers=headers, timeout=30)
+        return np.asarray(j["distances"], dtype=np.float64), np.asarray(j["durations"], dtype=np.float64)
+
+    step = max(config.ORS_MATRIX_MAX_LOCATIONS // 2, 1)
+    if pairs is None:
+        blocks = sorted({(i, j) for i in range(0, n, step) for j in range(0, n, step)})
+    else:
+        blocks = sorted({(s // step * step, d // step * step) for s, d in pairs})
+
+    def fetch(block):
+        i0, j0 = block
+        sources, targets = points[i0:i0+step], points[j0:j0+step]
+        payload = {"locations": [[p[0], p[1]] for p in list(sources) + list(targets)],
+                   "sources": list(range(len(sources))),
+                   "destinations": list(range(len(sources), len(sources) + len(targets))),
+                   "metrics": ["distance", "duration"]}
+        return get_client().post_json(url, payload, headers=headers, timeout=30)
+
+    distances = np.full((n, n), np.nan)
+    durations = np.full((n, n), np.nan)
+    for (i0, j0), j in zip(blocks, get_client().map(fetch, blocks)):
+        if isinstance(j, Exception):
+            raise j
+        d = np.asarray(j["distances"], dtype=np.float64)
+        distances[i0:i0+d.shape[0], j0:j0+d.shape[1]] = d
+        durations[i0:i0+d.shape[0], j0:j0+d.shape[1]] = np.asarray(j["durations"], dtype=np.float64)
+    return distances, durations
+
+def routes_between_points(routes, profile="driving-car", use_cache=True):
+    """
+    Summaries for many routes at once.
+    routes: list of point lists, each a list of (lon,lat) pairs in order
+    With an ORS key, every uncached route is priced from a matrix over all distinct stops (ors_matrix, in
+    blocks when there are many) instead of one directions call per route, and stored in the route cache.
+    Geometry is None for those; route_path fetches it when a route is drawn.
+    Returns: list of dicts with distance_m, duration_s, geometry, in input order
+    """
+    backend = routing_backend()
+    if backend == "road_network":
+        return [get_road_network().route(points) for points in routes]
+    if backend != "ors" or not ORS_API_KEY:
+        return [haversine_route(points, avg_speed_kmph=FALLBACK_SPEED_KMPH) for points in routes]
+    results = [None] * len(routes)
+    pending = []
+    for i, points in enumerate(routes):
+        cached = get_route_cache().get(route_cache_key(points, profile)) if use_cache else None
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append(i)
+    if pending:
+        nd = config.ROUTE_CACHE_COORD_DECIMALS
+        index = {}
+        for i in pending:
+            for p in routes[i]:
+                index.setdefault((round(float(p[0]), nd), round(float(p[1]), nd)), len(index))
+        positions = {i: np.array([index[(round(float(p[0]), nd), round(float(p[1]), nd))] for p in routes[i]])
+                     for i in pending}
+        legs = {(int(a), int(b)) for idx in positions.values() for a, b in zip(idx[:-1], idx[1:])}
+        distances, durations = ors_matrix(list(index.keys()), profile, pairs=legs)
+        for i in pending:
+            idx = positions[i]
+            results[i] = {
+                "distance_m": float(distances[idx[:-1], idx[1:]].sum()),
+                "duration_s": float(durations[idx[:-1], idx[1:]].sum()),
+                "geometry": None,
+            }
+            if use_cache:
+                get_route_cache().set(route_cache_key(routes[i], profile), results[i])
+    return results
+
+def fill_unreachable(km, minutes, coords):
+    """
+    Replace pairs a road backend could not route (inf from the road graph, null / NaN from ORS) with the
+    haversine estimate, so solvers never see inf - inf = NaN in their cost deltas.
+    coords: the (lat, lon) points the (N, N) matrices are over
+    Returns: (km, minutes), finite everywhere
+    """
+    bad = ~(np.isfinite(km) & np.isfinite(minutes))
+    if bad.any():
+        rows, cols = np.nonzero(bad)
+        fallback_km = haversine_matrix(coords)[rows, cols]
+        km, minutes = km.copy(), minutes.copy()
+        km[rows, cols] = fallback_km
+        minutes[rows, cols] = fallback_km / FALLBACK_SPEED_KMPH * 60
+        print(f"{len(rows)} unroutable point pair(s); using straight-line estimates for them")
+    return km, minutes
+
+def route_path(points, geometry=None, profile="driving-car"):
+    """
+    Polyline for drawing a route.
+    points: list of (lon,lat) stops in order (a plan's stops, START first)
+    geometry: the route's GeoJSON geometry when already known (plan["route_summary"]["geometry"])
+    Routes priced from a matrix have no geometry; under ORS it is fetched here, once, through
+    route_between_points and the route cache. Without road geometry the stops are joined by straight lines.
+    Returns: list of (lat, lon)
+    """
+    if geometry is None and routing_backend() == "ors" and ORS_API_KEY and len(points) > 1:
+        try:
+            geometry = route_between_points(points, profile)["geometry"]
+        except Exception as e:
+            print(f"Route geometry unavailable: {e}")
+    if isinstance(geometry, dict) and geometry.get("coordinates"):
+        return [(lat, lon) for lon, lat in geometry["coordinates"]]
+    return [(p[1], p[0]) for p in points]
+
+def travel_matrices(coords, allow_remote=False):
+    """
+    Pairwise distance (km) and travel time (minutes) between (lat, lon) points from the active backend.
+    allow_remote: use the ORS matrix endpoint when ORS is the backend; otherwise only local backends
+                  (offline road graph, haversine) are used so solvers never wait on the network.
+    Road backends may return asymmetric matrices; pairs they cannot route get the haversine estimate.
+    Returns: (km, minutes) as (N, N) ndarrays
+    """
+    backend = routing_backend()
+    if backend == "road_network":
+        seconds, meters = get_road_network().matrix(coords)
+        return fill_unreachable(meters / 1000, seconds / 60, coords)
+    if backend == "ors" and ORS_API_KEY and allow_remote:
+        meters, seconds = ors_matrix([(c[1], c[0]) for c in coords])
+        return fill_unreachable(meters / 1000, seconds / 60, coords)
+    km = haversine_matrix(coords)
+    return km, km / FALLBACK_SPEED_KMPH * 60
@@ -0,0 +1,81 @@
+# spatial_index.py
+import numpy as np
+from config import config
+from cache import LRUCache, make_key
+
+EARTH_RADIUS_KM = 6371.0
+
+class SpatialIndex:
+    """
+    BallTree (haversine metric) over (lat, lon) points for k-nearest and radius queries in km.
+    ids / payload are optional per-point labels returned alongside query results.
+    """
+    def __init__(self, coords, ids=None):
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.ids = list(ids) if ids is not None else list(range(len(self.coords)))
+        from sklearn.neighbors import BallTree
+        self.tree = BallTree(np.radians(self.coords), metric="haversine") if len(self.coords) else None
+
+    def __len__(self):
+        return len(self.coords)
+
+    def query_knn(self, points, k=1):
+        """
+        points: array-like of (lat, lon)
+        Returns: (dist_km, idx) arrays of shape (len(points), k), nearest first
+        """
+        pts = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+        k = min(k, len(self.coords))
+        dist, idx = self.tree.query(pts, k=k)
+        return dist * EARTH_RADIUS_KM, idx
+
+    def query_radius(self, points, radius_km, sort_results=True):
+        """
+        points: array-like of (lat, lon)
+        Returns: (idx_list, dist_km_list), one array per query point
+        """
+        pts = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+        if self.tree is None:
+            return [np.zeros(0, dtype=np.int64)] * len(pts), [np.zeros(0)] * len(pts)
+        idx, dist = self.tree.query_radius(pts, r=radius_km / EARTH_RADIUS_KM, return_distance=True, sort_results=sort_results)
+        return list(idx), [d * EARTH_RADIUS_KM for d in dist]
+
+
+_location_indexes = LRUCache(max_entries=32)
+
+def build_location_index(location, orders=None):
+    """
+    Depot and order indexes for a location, built once per (location, order coordinates) and shared.
+    location: key of config.locations
+    orders: list of delivery dicts with id, lat, lon (optional)
+    Returns: {"depots": SpatialIndex, "orders": SpatialIndex or None}
+    """
+    orders = orders or []
+    key = make_key(location, [(o["lat"], o["lon"]) for o in orders])
+    index = _location_indexes.get(key)
+    if index is None:
+        depots = config.locations[location]["depots"]
+        index = {
+            "depots": SpatialIndex(depots, ids=[f"Depot_{i}" for i in range(1, len(depots)+1)]),
+            "orders": SpatialIndex([(o["lat"], o["lon"]) for o in orders], ids=[o["id"] for o in orders]) if orders else None,
+        }
+        _location_indexes.set(key, index)
+    return index
+
+
+def locate_outliers(clusters, outlier_key="Outlier"):
+    """
+    For each outlier delivery, the nearest clustered delivery's zone and the distance to it.
+    clusters: {cluster_id: [delivery dicts]} from ClusteringAgent
+    Returns: {delivery id: {"nearest_zone": cluster_id, "distance_km": float}}
+    """
+    outliers = clusters.get(outlier_key, [])
+    zoned = [(cid, d) for cid, ds in clusters.items() if cid != outlier_key for d in ds]
+    if not outliers or not zoned:
+        return {}
+    index = SpatialIndex([(d["lat"], d["lon"]) for _, d in zoned], ids=[cid for cid, _ in zoned])
+    dist, idx = index.query_knn([(d["lat"], d["lon"]) for d in outliers], k=1)
+    return {
+        d["id"]: {"nearest_zone": index.ids[i[0]], "distance_km": round(float(km[0]), 2)}
+        for d, km, i in zip(outliers, dist, idx)
+    }
@@ -0,0 +1,137 @@
+# speed_profiles.py
+"""
+Time-dependent travel times: per-city, per-hour multipliers on travel time (1.0 = the city's daily average),
+precomputed from telemetry into one small float32 table so ETA loops and solvers only index an array.
+
+    python speed_profiles.py                  # rebuild models/speed_profiles.npz from data/telemetry.csv
+"""
+import os
+import argparse
+import threading
+import numpy as np
+from config import config
+
+# typical Indian metro day when a city has no history: night runs free, 9-11 am and 6-9 pm crawl
+DEFAULT_HOURLY_MULTIPLIER = np.array([
+    0.60, 0.55, 0.55, 0.55, 0.60, 0.65,  # 00-05
+    0.80, 1.10, 1.45, 1.80, 1.70, 1.30,  # 06-11
+    1.05, 0.95, 0.90, 0.85, 1.05, 1.40,  # 12-17
+    1.75, 1.80, 1.50, 1.15, 0.85, 0.70,  # 18-23
+], dtype=np.float32)
+MIN_SAMPLES_PER_HOUR = 50  # hours with fewer telemetry legs keep the default multiplier
+
+
+def city_for_point(lat, lon, locations=None):
+    """
+    The config.locations city whose bounds contain the point, else the one with the nearest bounds centre.
+    """
+    locations = locations or config.locations
+    best, best_d = None, np.inf
+    for city, loc in locations.items():
+        b = loc["bounds"]
+        if b["min_lat"] <= lat <= b["max_lat"] and b["min_lon"] <= lon <= b["max_lon"]:
+            return city
+        d = (lat - (b["min_lat"] + b["max_lat"]) / 2) ** 2 + (lon - (b["min_lon"] + b["max_lon"]) / 2) ** 2
+        if d < best_d:
+            best, best_d = city, d
+    return best
+
+
+class SpeedProfiles:
+    """
+    table[c, h]: travel-time multiplier for city c during hour h (float32, n_cities x 24).
+    """
+    def __init__(self, cities=(), table=None):
+        self.cities = list(cities)
+        self.table = np.asarray(table, dtype=np.float32).reshape(-1, 24) if table is not None else np.zeros((0, 24), np.float32)
+        self._row = {city: i for i, city in enumerate(self.cities)}
+
+    def hourly(self, city):
+        """
+        Returns: the city's 24 multipliers (the default day for unknown cities); index it by hour in hot loops.
+        """
+        i = self._row.get(city)
+        return self.table[i] if i is not None else DEFAULT_HOURLY_MULTIPLIER
+
+    def multiplier(self, city, hour):
+        return float(self.hourly(city)[int(hour) % 24])
+
+    def multipliers(self, city, hours):
+        return self.hourly(city)[np.asarray(hours, dtype=np.int64) % 24]
+
+    def save(self, path=config.SPEED_PROFILE_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, cities=np.array(self.cities), table=self.table)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path=config.SPEED_PROFILE_FILE):
+        """
+        Stored tables, or default profiles when none have been built.
+        """
+        if not os.path.exists(path):
+            return cls()
+        data = np.load(path)
+        return cls(data["cities"].tolist(), data["table"])
+
+
+def build_speed_profiles(telemetry_path=config.TELEMETRY_FILE, path=config.SPEED_PROFILE_FILE,
+                         min_samples=MIN_SAMPLES_PER_HOUR):
+    """
+    One chunked pass over the telemetry: per (city, hour) pace = minutes per km, divided by the city's
+    all-day pace. Memory is a few accumulators per city whatever the history length.
+    Returns: SpeedProfiles (also saved to path)
+    """
+    from telemetry import iter_telemetry_chunks
+
+    minutes, km, count = {}, {}, {}
+    for chunk, _ in iter_telemetry_chunks(telemetry_path):
+        chunk = chunk.dropna(subset=["distance_km", "travel_time_min", "hour", "city"])
+        chunk = chunk[chunk["distance_km"] > 0]
+        hours = chunk["hour"].to_numpy(dtype=np.int64) % 24
+        for city, idx in chunk.groupby("city").indices.items():
+            for acc in (minutes, km, count):
+                acc.setdefault(city, np.zeros(24))
+            minutes[city] += np.bincount(hours[idx], weights=chunk["travel_time_min"].to_numpy()[idx], minlength=24)
+            km[city] += np.bincount(hours[idx], weights=chunk["distance_km"].to_numpy()[idx], minlength=24)
+            count[city] += np.bincount(hours[idx], minlength=24)
+
+    cities = sorted(minutes)
+    table = np.tile(DEFAULT_HOURLY_MULTIPLIER, (len(cities), 1))
+    for i, city in enumerate(cities):
+        ok = count[city] >= min_samples
+        if not ok.any():
+            continue
+        pace = np.divide(minutes[city], km[city], out=np.zeros(24), where=km[city] > 0)
+        day_pace = minutes[city][ok].sum() / km[city][ok].sum()
+        table[i, ok] = pace[ok] / day_pace
+    profiles = SpeedProfiles(cities, table)
+    profiles.save(path)
+    print(f"Saved speed profiles for {len(cities)} cities to {path}")
+    return profiles
+
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+def get_speed_profiles():
+    """
+    Process-wide SpeedProfiles, loaded once.
+    """
+    global _profiles
+    with _profiles_lock:
+        if _profiles is None:
+            _profiles = SpeedProfiles.load()
+    return _profiles
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build per-city hourly travel-time multipliers from telemetry")
+    parser.add_argument("--telemetry", default=config.TELEMETRY_FILE)
+    parser.add_argument("--out", default=config.SPEED_PROFILE_FILE)
+    args = parser.parse_args()
+    profiles = build_speed_profiles(args.telemetry, args.out)
+    for city in profiles.cities:
+        print(city, np.round(profiles.hourly(city), 2).tolist())
@@ -0,0 +1,117 @@
+# stub_server.py
+"""
+Local stand-in for the OpenRouteService, OpenWeatherMap, Mapbox geocoding and Nominatim endpoints used by
+api_clients / routing_client, so throughput can be measured offline.
+
+    python stub_server.py --port 8765 --latency-ms 50
+
+then point the clients at it, e.g. ORS_BASE_URL=http://127.0.0.1:8765 OPENWEATHER_BASE_URL=http://127.0.0.1:8765
+"""
+import re
+import json
+import time
+import random
+import argparse
+import numpy as np
+import threading
+from urllib.parse import urlparse, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from routing_client import haversine_matrix, haversine_legs
+
+ROAD_FACTOR = 1.3  # stub road distance = straight line * factor
+STUB_SPEED_KMPH = 30
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    latency_s = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body, status=200):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self):
+        time.sleep(self.latency_s)
+        path = urlparse(self.path).path
+        body = self._read_json()
+        if re.match(r"^/v2/directions/[^/]+(/geojson)?$", path):
+            coords = body.get("coordinates", [])
+            km = float(haversine_legs(coords).sum()) * ROAD_FACTOR
+            self._send_json({
+                "type": "FeatureCollection",
+                "features": [{
+                    "type": "Feature",
+                    "properties": {"summary": {"distance": km*1000, "duration": km / STUB_SPEED_KMPH * 3600}},
+                    "geometry": {"type": "LineString", "coordinates": coords},
+                }],
+            })
+        elif re.match(r"^/v2/matrix/[^/]+$", path):
+            locations = body.get("locations", [])
+            latlon = [(p[1], p[0]) for p in locations]
+            km = haversine_matrix(latlon) * ROAD_FACTOR if latlon else []
+            if latlon and ("sources" in body or "destinations" in body):
+                km = km[np.ix_(body.get("sources", range(len(latlon))), body.get("destinations", range(len(latlon))))]
+            self._send_json({
+                "distances": (km*1000).tolist() if len(latlon) else [],
+                "durations": (km / STUB_SPEED_KMPH * 3600).tolist() if len(latlon) else [],
+            })
+        else:
+            self._send_json({"error": f"unknown endpoint {path}"}, status=404)
+
+    def do_GET(self):
+        time.sleep(self.latency_s)
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/data/2.5/weather":
+            self._send_json({
+                "main": {"temp": round(random.uniform(18, 35), 1)},
+                "weather": [{"description": random.choice(["clear sky", "few clouds", "light rain", "thunderstorm", "haze"])}],
+                "wind": {"speed": round(random.uniform(0, 8), 1)},
+                "coord": {"lat": float(q.get("lat", 0)), "lon": float(q.get("lon", 0))},
+            })
+        elif url.path == "/search":
+            self._send_json([{"lat": "22.5726", "lon": "88.3639", "display_name": q.get("q", "")}])
+        elif url.path.startswith("/geocoding/v5/mapbox.places/"):
+            place = unquote(url.path.rsplit("/", 1)[-1]).removesuffix(".json")
+            self._send_json({"features": [{"center": [88.3639, 22.5726], "place_name": place}]})
+        else:
+            self._send_json({"error": f"unknown endpoint {url.path}"}, status=404)
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency_ms=0):
+    """
+    Start the stub server in a daemon thread.
+    port: 0 picks a free port
+    latency_ms: artificial per-request delay, to mimic a remote service
+    Returns: (server, base_url); call server.shutdown() to stop it
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"latency_s": latency_ms / 1000.0})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline stand-in for ORS / OpenWeather / geocoding endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    server, base_url = start_stub_server(args.host, args.port, args.latency_ms)
+    print(f"Stub server listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,219 @@
+# telemetry.py
+"""
+Streaming travel-time training from completed-leg telemetry.
+
+Legs are appended to config.TELEMETRY_FILE (CSV, one row per leg, see TELEMETRY_COLUMNS). Each training run
+reads only the bytes appended since the previous run, in chunks, into a fixed-size reservoir sample of all
+legs ever seen, refits the forest on the reservoir every config.TELEMETRY_REFIT_ROWS new legs and publishes
+it atomically to MODEL_DIR. Memory stays bounded by the reservoir size whatever the history length.
+
+    python telemetry.py                       # train on new telemetry
+    python telemetry.py --simulate 100000     # append synthetic legs first (demo)
+"""
+import io
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from config import config
+from sklearn.ensemble import RandomForestRegressor
+from models import generate_sample_training_data
+from model_registry import get_registry
+
+TELEMETRY_COLUMNS = ["distance_km", "congestion", "precip", "hour", "travel_time_min", "city"]
+TELEMETRY_FEATURES = ["distance_km", "congestion", "precip", "hour"]
+TARGET = "travel_time_min"
+
+
+def append_telemetry(records, path=config.TELEMETRY_FILE):
+    """
+    Append completed legs to the telemetry file (header written on first use).
+    records: iterable of dicts with TELEMETRY_COLUMNS keys (city optional)
+    """
+    df = pd.DataFrame(list(records), columns=TELEMETRY_COLUMNS)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", newline="") as f:
+        df.to_csv(f, header=new_file, index=False)
+    return len(df)
+
+
+def iter_telemetry_chunks(path, offset=0, chunk_rows=config.TELEMETRY_CHUNK_ROWS):
+    """
+    Read complete rows appended after byte offset, chunk_rows at a time.
+    A trailing line without newline (a writer mid-append) is left for the next run.
+    Yields: (DataFrame chunk, byte offset after the chunk)
+    """
+    with open(path, "rb") as f:
+        if offset == 0:
+            f.readline()  # header
+        else:
+            f.seek(offset)
+        while True:
+            start = f.tell()
+            lines = []
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                lines.append(line)
+                if len(lines) >= chunk_rows:
+                    break
+            if not lines:
+                return
+            end = start + sum(len(line) for line in lines)
+            f.seek(end)
+            chunk = pd.read_csv(io.BytesIO(b"".join(lines)), names=TELEMETRY_COLUMNS, header=None)
+            yield chunk, end
+
+
+class Reservoir:
+    """
+    Uniform fixed-size sample (Algorithm R) over every row ever offered.
+    offset: byte offset of the telemetry file the sample covers; saved in the same file as the rows, so the
+    two can never disagree after a crash.
+    """
+    def __init__(self, capacity, n_columns, seed=0):
+        self.capacity = capacity
+        self.rows = np.empty((capacity, n_columns))
+        self.seen = 0
+        self.offset = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return min(self.seen, self.capacity)
+
+    def add(self, rows):
+        rows = np.asarray(rows, dtype=np.float64)
+        k = self.seen + np.arange(len(rows))  # global index of each incoming row
+        fill = k < self.capacity
+        self.rows[k[fill]] = rows[fill]
+        # row k replaces a random slot with probability capacity / (k + 1)
+        slot = self.rng.integers(0, k[~fill] + 1) if (~fill).any() else np.zeros(0, dtype=np.int64)
+        keep = slot < self.capacity
+        self.rows[slot[keep]] = rows[~fill][keep]
+        self.seen += len(rows)
+
+    def sample(self):
+        return self.rows[:len(self)]
+
+    def save(self, path):
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, rows=self.sample(), seen=self.seen, offset=self.offset,
+                 state=json.dumps(self.rng.bit_generator.state))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, capacity, n_columns):
+        reservoir = cls(capacity, n_columns)
+        if os.path.exists(path):
+            data = np.load(path)
+            rows = data["rows"][:capacity]
+            reservoir.rows[:len(rows)] = rows
+            reservoir.seen = int(data["seen"])
+            # files written before the offset moved here: the caller falls back to its own record
+            reservoir.offset = int(data["offset"]) if "offset" in data.files else None
+            reservoir.rng.bit_generator.state = json.loads(str(data["state"]))
+        return reservoir
+
+
+def publish_model(model, X_check, metadata=None, name=config.TRAVEL_TIME_MODEL_NAME):
+    """
+    Register the model as the new current version (model_registry): the pickle is written aside and
+    os.replace'd, and the compiled arrays are parity-checked against X_check and swapped in. Readers see
+    either the old or the new version, never a partial one; running agents hot-swap to it.
+    """
+    return get_registry().register(name, model, metadata, X_check)
+
+
+def fit_forest(sample, n_estimators=100, random_state=42):
+    X, y = sample[:, :len(TELEMETRY_FEATURES)], sample[:, len(TELEMETRY_FEATURES)]
+    model = RandomForestRegressor(
+        n_estimators=n_estimators,
+        min_samples_leaf=5,  # bounds tree size (and the compiled arrays) on large reservoirs
+        max_samples=min(len(X), 50000),
+        n_jobs=-1,
+        random_state=random_state,
+    )
+    return model.fit(pd.DataFrame(X, columns=TELEMETRY_FEATURES), y)
+
+
+def train_from_telemetry(path=config.TELEMETRY_FILE, state_path=config.TELEMETRY_STATE_FILE,
+                         model_name=config.TRAVEL_TIME_MODEL_NAME,
+                         reservoir_rows=config.TELEMETRY_RESERVOIR_ROWS, chunk_rows=config.TELEMETRY_CHUNK_ROWS,
+                         refit_rows=config.TELEMETRY_REFIT_ROWS):
+    """
+    Consume telemetry appended since the last run and publish refreshed models.
+    The reservoir and the byte offset it covers survive between runs in state_path + .reservoir.npz, written
+    with one os.replace; state_path (JSON) repeats the offset for reading and records the model version.
+    Returns: state dict {"offset", "seen", "version", "published_at"}
+    """
+    if not os.path.exists(path):
+        print(f"No telemetry at {path}")
+        return None
+    state = {"offset": 0, "seen": 0, "version": None, "published_at": None}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state.update(json.load(f))
+    reservoir_path = f"{state_path}.reservoir.npz"
+    columns = TELEMETRY_FEATURES + [TARGET]
+    reservoir = Reservoir.load(reservoir_path, reservoir_rows, len(columns))
+    if reservoir.offset is not None:
+        state["offset"] = reservoir.offset  # the reservoir file is authoritative; the JSON copy may be stale
+    reservoir.offset = state["offset"]
+
+    def save_state():
+        reservoir.offset = state["offset"]
+        reservoir.save(reservoir_path)
+        state["seen"] = reservoir.seen
+        tmp = f"{state_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, state_path)
+
+    def refit():
+        sample = reservoir.sample()
+        t0 = time.perf_counter()
+        model = fit_forest(sample)
+        state["version"] = publish_model(model, sample[:2000, :len(TELEMETRY_FEATURES)],
+                                         {"source": "telemetry", "rows": len(sample), "legs_seen": reservoir.seen,
+                                          "features": TELEMETRY_FEATURES}, model_name)
+        state["published_at"] = time.time()
+        print(f"Model v{state['version']} fitted on {len(sample)} of {reservoir.seen} legs in {time.perf_counter() - t0:.1f}s")
+
+    since_refit = 0
+    for chunk, offset in iter_telemetry_chunks(path, state["offset"], chunk_rows):
+        chunk = chunk.dropna(subset=columns)
+        reservoir.add(chunk[columns].to_numpy(dtype=np.float64))
+        since_refit += len(chunk)
+        state["offset"] = offset
+        if since_refit >= refit_rows:
+            refit()
+            since_refit = 0
+        save_state()
+    if since_refit:
+        refit()
+        save_state()
+    return state
+
+
+def simulate_telemetry(n, path=config.TELEMETRY_FILE, seed=None):
+    """
+    Append n synthetic legs (same generator as the sample model, plus hour and city) for demos.
+    """
+    rng = np.random.default_rng(seed)
+    df = generate_sample_training_data(n, seed=int(rng.integers(2**31)))
+    df["hour"] = rng.integers(0, 24, n)
+    df["city"] = rng.choice(list(config.locations), n)
+    return append_telemetry(df.to_dict("records"), path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming travel-time training from telemetry")
+    parser.add_argument("--telemetry", default=config.TELEMETRY_FILE)
+    parser.add_argument("--simulate", type=int, default=0, help="append this many synthetic legs first")
+    args = parser.parse_args()
+    if args.simulate:
+        simulate_telemetry(args.simulate, args.telemetry)
+    print(train_from_telemetry(args.telemetry))
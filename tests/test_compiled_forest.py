@@ -0,0 +1,130 @@
+# tests/test_compiled_forest.py
+"""
+Bit-exact parity of models.CompiledForest with sklearn, including rows that sit exactly on split thresholds
+and the memory-mapped save / load path.
+
+    python -m pytest -q tests
+"""
+import sys
+import numpy as np
+import pytest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+from models import CompiledForest, check_parity, export_compiled_model, load_model, compiled_model_dir
+
+
+def travel_data(n, n_features, seed):
+    """
+    Rows shaped like the travel-time features (distance_km, congestion, precip[, hour]) and a noisy target.
+    """
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.uniform(1, 40, n),
+        rng.uniform(0, 1, n),
+        rng.choice([0, 0.5, 1.0], n),
+        rng.integers(0, 24, n),
+    ])[:, :n_features]
+    y = X[:, 0] / (40 * (1 - 0.5 * X[:, 1]) * (1 - 0.3 * X[:, 2])) * 60 + rng.normal(0, 2, n)
+    return X, y
+
+
+def threshold_rows(model, X, n_rows=500, seed=0):
+    """
+    Copies of X where one feature is set exactly to a split threshold of the forest, or to the float32
+    neighbours of it (sklearn compares float32 features with float64 thresholds).
+    """
+    rng = np.random.default_rng(seed)
+    estimators = getattr(model, "estimators_", [model])
+    rows = []
+    for _ in range(n_rows):
+        tree = estimators[rng.integers(len(estimators))].tree_
+        internal = np.flatnonzero(tree.children_left >= 0)
+        if not len(internal):
+            continue
+        node = internal[rng.integers(len(internal))]
+        t = tree.threshold[node]
+        t32 = np.float32(t)
+        for value in (t, t32, np.nextafter(t32, np.float32(-np.inf)), np.nextafter(t32, np.float32(np.inf))):
+            row = X[rng.integers(len(X))].copy()
+            row[tree.feature[node]] = value
+            rows.append(row)
+    return np.array(rows)
+
+
+def edge_rows(n_features):
+    values = [0.0, -1.0, 1e-12, 1e30, -1e30, 24.0, 0.5]
+    return np.array([[v] * n_features for v in values])
+
+
+@pytest.mark.parametrize("n_features", [3, 4])
+@pytest.mark.parametrize("seed", [0, 1, 7])
+@pytest.mark.parametrize("max_depth", [None, 3, 12])
+def test_forest_parity(n_features, seed, max_depth):
+    X, y = travel_data(1500, n_features, seed)
+    model = RandomForestRegressor(n_estimators=25, max_depth=max_depth, random_state=seed, n_jobs=1).fit(X[:1000], y[:1000])
+    compiled = CompiledForest.from_sklearn(model)
+    for rows in (X[1000:], threshold_rows(model, X, seed=seed), edge_rows(n_features)):
+        assert np.array_equal(compiled.predict(rows), model.predict(rows))
+    assert np.array_equal(compiled.predict_per_tree(X[1000:]),
+                          np.column_stack([est.predict(X[1000:]) for est in model.estimators_]))
+
+
+@pytest.mark.parametrize("seed", [0, 3])
+def test_forest_parity_min_samples_leaf(seed):
+    # the telemetry trainer's settings (telemetry.fit_forest)
+    X, y = travel_data(3000, 4, seed)
+    model = RandomForestRegressor(n_estimators=20, min_samples_leaf=5, max_samples=2000, random_state=seed,
+                                  n_jobs=1).fit(X[:2500], y[:2500])
+    compiled = CompiledForest.from_sklearn(model)
+    for rows in (X[2500:], threshold_rows(model, X, seed=seed)):
+        assert np.array_equal(compiled.predict(rows), model.predict(rows))
+
+
+@pytest.mark.parametrize("n_features", [3, 4])
+def test_single_tree_parity(n_features):
+    X, y = travel_data(800, n_features, 5)
+    model = DecisionTreeRegressor(random_state=5).fit(X[:600], y[:600])
+    compiled = CompiledForest.from_sklearn(model)
+    for rows in (X[600:], threshold_rows(model, X), edge_rows(n_features)):
+        assert np.array_equal(compiled.predict(rows), model.predict(rows))
+
+
+@pytest.mark.parametrize("n_features", [3, 4])
+def test_save_load_memory_mapped(tmp_path, n_features):
+    X, y = travel_data(1200, n_features, 11)
+    model = RandomForestRegressor(n_estimators=15, random_state=11, n_jobs=1).fit(X[:900], y[:900])
+    directory = CompiledForest.from_sklearn(model).save(Path(tmp_path, "model.forest"))
+    loaded = CompiledForest.load(directory)
+    assert isinstance(loaded.threshold, np.memmap)
+    assert loaded.n_features_in_ == n_features
+    for rows in (X[900:], threshold_rows(model, X), edge_rows(n_features)):
+        assert np.array_equal(loaded.predict(rows), model.predict(rows))
+
+    # saving again swaps the directory in place
+    CompiledForest.from_sklearn(model).save(directory)
+    assert np.array_equal(CompiledForest.load(directory).predict(X[900:]), model.predict(X[900:]))
+
+
+def test_export_and_load_model_prefers_compiled(tmp_path):
+    import joblib
+
+    X, y = travel_data(1000, 4, 2)
+    model = RandomForestRegressor(n_estimators=10, random_state=2, n_jobs=1).fit(X[:800], y[:800])
+    path = Path(tmp_path, "travel_time_model.pkl")
+    joblib.dump(model, path)
+    export_compiled_model(model, compiled_model_dir(path), X[:800])
+    loaded = load_model(path)
+    assert isinstance(loaded, CompiledForest)
+    assert np.array_equal(loaded.predict(X[800:]), model.predict(X[800:]))
+
+
+def test_check_parity_rejects_mismatch():
+    X, y = travel_data(500, 3, 4)
+    model = RandomForestRegressor(n_estimators=5, random_state=4, n_jobs=1).fit(X, y)
+    compiled = CompiledForest.from_sklearn(model)
+    compiled.value = compiled.value + 1e-9
+    with pytest.raises(ValueError):
+        check_parity(model, compiled, X)
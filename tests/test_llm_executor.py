@@ -0,0 +1,126 @@
+# tests/test_llm_executor.py
+"""
+llm_executor against the offline chat models in fake_llm (native async and blocking-only): one result per
+prompt, stuck calls falling back at their deadline, calls refused when quota cannot free up in time, and cache
+hits that spend no quota.
+
+    python -m pytest -q tests
+"""
+import sys
+import time
+import pytest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from fake_llm import FakeChatModel, SyncFakeChatModel
+from llm_cache import LLMCache
+from llm_executor import LLMExecutor
+from agents import PlannerAgent
+
+CLIENTS = {"async": FakeChatModel, "sync": SyncFakeChatModel}
+
+
+def zone_jobs(n_zones, stops_per_zone=5):
+    """
+    One (deliveries, operator instructions) job per zone; zone z's ids are z*100 + stop.
+    """
+    return [([{"id": z * 100 + i, "lat": 22.5 + 0.01 * i, "lon": 88.3 + 0.01 * z,
+               "priority": ("high", "medium", "low")[i % 3], "package_size": "small"}
+              for i in range(stops_per_zone)], f"zone {z}")
+            for z in range(n_zones)]
+
+
+def prompts_for(jobs):
+    return [[{"role": "user", "content": PlannerAgent._llm_prompt(d, i)}] for d, i in jobs]
+
+
+def stuck_markers(names):
+    return [f"Operator instructions: {name}\n" for name in names]
+
+
+def make_executor(tmp_path, requests_per_min=600, max_concurrency=4, deadline_s=2.0):
+    return LLMExecutor(max_concurrency=max_concurrency, requests_per_min=requests_per_min,
+                       tokens_per_min=10**7, deadline_s=deadline_s, cache=LLMCache(tmp_path / "llm_cache.sqlite"))
+
+
+@pytest.mark.parametrize("client", CLIENTS)
+def test_one_result_per_prompt(tmp_path, client):
+    jobs = zone_jobs(8)
+    llm = CLIENTS[client](latency_s=0.05)
+    results = make_executor(tmp_path).invoke_all(llm, prompts_for(jobs))
+    assert len(results) == len(jobs)
+    for (deliveries, _), result in zip(jobs, results):
+        assert result["status"] == "ok"
+        assert PlannerAgent._parse_llm_order(result["text"]) == [d["id"] for d in deliveries][::-1]
+
+
+@pytest.mark.parametrize("client", CLIENTS)
+def test_stuck_calls_fall_back_at_deadline(tmp_path, client):
+    jobs = zone_jobs(6)
+    stuck = {"zone 0", "zone 1"}
+    deadline_s = 1.0
+    # blocking clients cannot be cancelled: keep their stuck threads short so the test exits promptly
+    llm = CLIENTS[client](latency_s=0.05, stuck_markers=stuck_markers(stuck), stuck_s=2 * deadline_s)
+    executor = make_executor(tmp_path, deadline_s=deadline_s)
+    t0 = time.perf_counter()
+    results = executor.invoke_all(llm, prompts_for(jobs))
+    assert time.perf_counter() - t0 < deadline_s + 0.5
+    for (_, instructions), result in zip(jobs, results):
+        if instructions in stuck:
+            assert result["status"] == "timeout"
+            assert result["text"] is None
+            assert result["elapsed_s"] <= deadline_s + 0.5
+        else:
+            assert result["status"] == "ok"
+
+    planner = PlannerAgent(method="llm", llm=llm, executor=executor)
+    for (deliveries, instructions), ordered in zip(jobs, planner.prioritize_llm_batch(jobs, use_cache=False)):
+        if instructions in stuck:
+            assert ordered == PlannerAgent._priority_sort(deliveries)
+        else:
+            assert ordered == [d["id"] for d in deliveries][::-1]
+
+
+def test_rate_limited_when_quota_misses_deadline(tmp_path):
+    jobs = zone_jobs(5)
+    llm = FakeChatModel(latency_s=0.05)
+    # two requests up front, then one every 30 s: the other three cannot start before a 1 s deadline
+    executor = make_executor(tmp_path, requests_per_min=2, deadline_s=1.0)
+    t0 = time.perf_counter()
+    results = executor.invoke_all(llm, prompts_for(jobs))
+    statuses = [r["status"] for r in results]
+    assert statuses.count("ok") == 2
+    assert statuses.count("rate_limited") == 3
+    assert len(llm.calls) == 2
+    # refused at once rather than after sleeping out the deadline
+    assert time.perf_counter() - t0 < 1.0
+    assert executor.stats()["rate_limited"] == 3
+
+
+def test_cache_hits_spend_no_quota(tmp_path):
+    jobs = zone_jobs(3)
+    llm = FakeChatModel(latency_s=0.05)
+    # exactly one request per prompt, refilled once every 20 s: a second round only fits if it is all cache hits
+    executor = make_executor(tmp_path, requests_per_min=3, deadline_s=1.0)
+    first = executor.invoke_all(llm, prompts_for(jobs))
+    assert [r["status"] for r in first] == ["ok"] * 3
+    second = executor.invoke_all(llm, prompts_for(jobs))
+    assert [r["status"] for r in second] == ["cached"] * 3
+    assert [r["text"] for r in second] == [r["text"] for r in first]
+    assert len(llm.calls) == 3
+    assert executor.stats()["rate_limited"] == 0
+
+
+def test_cache_is_keyed_on_the_client_model(tmp_path):
+    prompts = prompts_for(zone_jobs(2))
+    executor = make_executor(tmp_path)
+    default, other = FakeChatModel(latency_s=0.01), FakeChatModel(latency_s=0.01, model_name="other-chat")
+    executor.invoke_all(default, prompts)
+    # another model's client never gets the default model's answers, and vice versa
+    assert [r["status"] for r in executor.invoke_all(other, prompts)] == ["ok"] * 2
+    assert [r["status"] for r in executor.invoke_all(default, prompts)] == ["cached"] * 2
+    assert [r["status"] for r in executor.invoke_all(other, prompts)] == ["cached"] * 2
+    # a client that does not name its model is never cached
+    anonymous = FakeChatModel(latency_s=0.01, model_name=None)
+    assert [r["status"] for r in executor.invoke_all(anonymous, prompts)] == ["ok"] * 2
+    assert [r["status"] for r in executor.invoke_all(anonymous, prompts)] == ["ok"] * 2
@@ -1,14 +1,15 @@
 import math
 import json
-import folium
 import random
 import numpy as np
-import pandas as pd
-import streamlit as st
 from pathlib import Path
 from config import config
 from datetime import datetime
-from streamlit_folium import st_folium
+from spatial_index import SpatialIndex, build_location_index
+from routing_client import haversine_matrix
+
+# folium, pandas, scipy and streamlit are imported inside the functions that use them, so agents and
+# background workers that only need the geometry helpers start without loading them
 
 
 def load_json(path):
@@ -17,6 +18,7 @@ def load_json(path):
 
 
 def apply_css(file):
+    import streamlit as st
     CSS_FILE = Path(config.CSS_DIR, file)
     with open(CSS_FILE) as f:
         css = f.read()
@@ -25,6 +27,7 @@ def apply_css(file):
 
 def display_dict_in_streamlit_nested(data_dict: dict, indent: int = 2):
     """Display a dictionary (including nested ones) in a nicely formatted way in Streamlit."""
+    import streamlit as st
 
     if not data_dict:
         st.write("*:grey[(The dictionary is empty)]*")
@@ -86,6 +89,9 @@ def display_route_plan_streamlit(route_data: dict):
     Displays a delivery route plan using Folium inside Streamlit with numbered,
     priority-colored markers and connecting route lines.
     """
+    import folium
+    import streamlit as st
+    from streamlit_folium import st_folium
 
     try:
         if not route_data or "stops" not in route_data:
@@ -198,13 +204,15 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     c = 2 * math.asin(math.sqrt(a))
     return R * c
 
-def assign_nearest_depot_to_clusters(clusters, depots):
+def assign_nearest_depot_to_clusters(clusters, depots, location = None):
     """
     Assigns nearest depot to each delivery cluster based on centroid location.
 
     Parameters:
         clusters (dict): {cluster_id: [delivery_dicts]} from HDBSCAN output
-        depots (list[dict]): [{"name": "Depot A", "lat": 22.57, "lon": 88.36}, ...]
+        depots (list[tuple]): [(lat, lon), ...]
+        location (str): key of config.locations the depots belong to; its depot index is built once and
+            reused across calls (without it, an index is built for this call)
 
     Returns:
         list[dict]: cluster assignment info (cluster_id, centroid, depot, distance_km)
@@ -212,39 +220,156 @@ def assign_nearest_depot_to_clusters(clusters, depots):
 
     cluster_assignments = []
 
-    for cluster_id, deliveries in clusters.items():
-        # Skip outliers
-        if cluster_id == "Outlier" or len(deliveries) == 0:
-            continue
-
-        # --- Compute centroid of cluster ---
-        avg_lat = sum(d["lat"] for d in deliveries) / len(deliveries)
-        avg_lon = sum(d["lon"] for d in deliveries) / len(deliveries)
-
-        # --- Find nearest depot ---
-        nearest_depot = None
-        min_distance = float("inf")
-
-        for idx, (dep_lat, dep_lon) in enumerate(depots):
-            dist = haversine_distance(avg_lat, avg_lon, dep_lat, dep_lon)
-            if dist < min_distance:
-                min_distance = dist
-                nearest_depot = (dep_lat, dep_lon)
-                depot_index = idx + 1  # for labeling (Depot 1, Depot 2, etc.)
+    # Skip outliers
+    zones = [(cluster_id, deliveries) for cluster_id, deliveries in clusters.items()
+             if cluster_id != "Outlier" and len(deliveries) > 0]
+    if not zones or len(depots) == 0:
+        return cluster_assignments
+
+    # --- Compute centroid of each cluster ---
+    centroids = np.array([
+        (sum(d["lat"] for d in deliveries) / len(deliveries), sum(d["lon"] for d in deliveries) / len(deliveries))
+        for _, deliveries in zones
+    ])
+
+    # --- Find nearest depot for all clusters at once ---
+    if location in config.locations and np.array_equal(config.locations[location]["depots"], depots):
+        index = build_location_index(location)["depots"]
+    else:
+        index = SpatialIndex(depots)
+    dist, nearest = index.query_knn(centroids, k = 1)
 
+    for (cluster_id, _), (avg_lat, avg_lon), (idx,), (min_distance,) in zip(zones, centroids, nearest, dist):
+        nearest_depot = depots[idx]
         cluster_assignments.append({
             "cluster_id": cluster_id,
-            "centroid_lat": avg_lat,
-            "centroid_lon": avg_lon,
-            "nearest_depot_id": f"Depot_{depot_index}",
+            "centroid_lat": float(avg_lat),
+            "centroid_lon": float(avg_lon),
+            "nearest_depot_id": f"Depot_{idx + 1}",  # for labeling (Depot 1, Depot 2, etc.)
             "depot_lat": nearest_depot[0],
             "depot_lon": nearest_depot[1],
-            "distance_km": round(min_distance, 2)
+            "distance_km": round(float(min_distance), 2)
         })
 
     return cluster_assignments
 
 
+def solve_depot_assignment(cost, demands, capacities):
+    """
+    Min-cost assignment of items to depots with depot capacities (generalized assignment, solved as a MILP).
+
+    Parameters:
+        cost (ndarray): (n_items, n_depots) assignment cost, e.g. distance in km
+        demands (array-like): load each item puts on its depot
+        capacities (array-like): maximum load per depot
+
+    Returns:
+        ndarray: depot index per item, or None when total capacity cannot carry the demand
+    """
+    from scipy import sparse
+    from scipy.optimize import milp, LinearConstraint, Bounds
+
+    cost = np.asarray(cost, dtype = np.float64)
+    demands = np.asarray(demands, dtype = np.float64)
+    capacities = np.asarray(capacities, dtype = np.float64)
+    n, m = cost.shape
+    if demands.sum() > capacities.sum():
+        return None
+
+    def solve(rows, caps, integral):
+        k = len(rows)
+        # x[i, j] = 1 if item i goes to depot j (flattened row-major); sparse so thousands of orders stay cheap
+        one_depot_each = LinearConstraint(sparse.kron(sparse.eye(k), np.ones((1, m)), format = "csr"), lb = 1, ub = 1)
+        depot_capacity = LinearConstraint(sparse.kron(demands[rows][None, :], sparse.eye(m), format = "csr"), ub = caps)
+        res = milp(cost[rows].ravel(), constraints = [one_depot_each, depot_capacity],
+                   integrality = np.full(k*m, 1 if integral else 0), bounds = Bounds(0, 1))
+        return None if res.x is None else res.x.reshape(k, m)
+
+    # The LP relaxation leaves at most a handful of items split between depots (a basic solution has
+    # no more fractional items than depots); fix the integral ones and solve the rest exactly.
+    x = solve(np.arange(n), capacities, integral = False)
+    if x is None:
+        return None
+    choice = x.argmax(axis = 1)
+    fractional = np.flatnonzero(x.max(axis = 1) < 1 - 1e-6)
+    if len(fractional):
+        fixed = np.setdiff1d(np.arange(n), fractional)
+        residual = capacities - np.bincount(choice[fixed], weights = demands[fixed], minlength = m)
+        x_frac = solve(fractional, residual, integral = True)
+        if x_frac is None:
+            x_full = solve(np.arange(n), capacities, integral = True)
+            return None if x_full is None else x_full.argmax(axis = 1)
+        choice[fractional] = x_frac.argmax(axis = 1)
+    return choice
+
+
+def assign_depots_balanced(clusters, depots, depot_capacity = None, level = "order"):
+    """
+    Assigns work to depots by solving a global min-distance assignment under per-depot capacity,
+    instead of sending every cluster to its nearest depot.
+
+    Parameters:
+        clusters (dict): {cluster_id: [delivery_dicts]} from HDBSCAN output
+        depots (list[tuple]): [(lat, lon), ...]
+        depot_capacity (list[float]): load limit per depot in package_size units;
+            defaults to config.DEPOT_VEHICLES vehicles of config.VEHICLE_CAPACITY each
+        level (str): "order" assigns individual orders (a zone served by two depots is split into
+            "<zone>_D<k>" parts); "cluster" keeps zones whole
+
+    Returns:
+        tuple:
+            clusters (dict): {cluster_id: [delivery_dicts]} regrouped by depot ("Outlier" left as is)
+            list[dict]: cluster assignment info in the format of assign_nearest_depot_to_clusters
+    """
+    if depot_capacity is None:
+        depot_capacity = [config.DEPOT_VEHICLES * config.VEHICLE_CAPACITY] * len(depots)
+    size_units = config.PACKAGE_SIZE_UNITS
+
+    zones = {cid: ds for cid, ds in clusters.items() if cid != "Outlier" and ds}
+    if level == "order":
+        items = [(cid, [d]) for cid, ds in zones.items() for d in ds]
+    else:
+        items = list(zones.items())
+    if not items:
+        return clusters, []
+
+    points = np.array([(np.mean([d["lat"] for d in ds]), np.mean([d["lon"] for d in ds])) for _, ds in items])
+    demands = [sum(size_units.get(d.get("package_size", "medium"), 1) for d in ds) for _, ds in items]
+    cost = haversine_matrix(points, depots)
+    choice = solve_depot_assignment(cost, demands, depot_capacity)
+    if choice is None:
+        print(f"No depot assignment fits the depot capacities at {level} level; falling back to nearest depot")
+        choice = cost.argmin(axis = 1)
+
+    # --- Regroup by (zone, depot) ---
+    groups = {}
+    for (cid, ds), j in zip(items, choice):
+        groups.setdefault(cid, {}).setdefault(int(j), []).extend(ds)
+
+    balanced = {}
+    cluster_assignments = []
+    for cid, by_depot in groups.items():
+        for j, ds in by_depot.items():
+            part_id = cid if len(by_depot) == 1 else f"{cid}_D{j + 1}"
+            balanced[part_id] = ds
+            avg_lat = sum(d["lat"] for d in ds) / len(ds)
+            avg_lon = sum(d["lon"] for d in ds) / len(ds)
+            cluster_assignments.append({
+                "cluster_id": part_id,
+                "centroid_lat": avg_lat,
+                "centroid_lon": avg_lon,
+                "nearest_depot_id": f"Depot_{j + 1}",
+                "depot_lat": depots[j][0],
+                "depot_lon": depots[j][1],
+                "distance_km": round(float(haversine_matrix([(avg_lat, avg_lon)], [depots[j]])[0, 0]), 2),
+                "load": sum(size_units.get(d.get("package_size", "medium"), 1) for d in ds),
+            })
+    if "Outlier" in clusters:
+        balanced["Outlier"] = clusters["Outlier"]
+
+    return balanced, cluster_assignments
+
+
 
 def get_traffic_data(json_data):
     """
@@ -256,6 +381,8 @@ def get_traffic_data(json_data):
     Returns:
         pd.DataFrame: A DataFrame with structured tabular data.
     """
+    import pandas as pd
+
     # Parse if input is a JSON string
     if isinstance(json_data, str):
         json_data = json.loads(json_data)
@@ -298,6 +425,8 @@ def get_weather_data(data):
         ]
     }
     """
+    import pandas as pd
+
     # Convert list of locations to DataFrame
     if "locations" in data:
         df = pd.DataFrame(data["locations"])
@@ -313,6 +442,8 @@ def visualize_clusters_on_map(coordinates, cluster_labels):
     """
     Visualize clustered delivery points on a Folium map with color-coded markers.
     """
+    import folium
+
     # Center map around mean coordinates
     avg_lat = np.mean([lat for lat, lon in coordinates])
     avg_lon = np.mean([lon for lat, lon in coordinates])